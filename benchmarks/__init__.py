@@ -0,0 +1,68 @@
+"""
+Benchmarks for the messaging API.
+
+Each module is a script run from the project root, e.g.::
+
+    python -m benchmarks.error_handling
+
+The benchmarks run against a throwaway test database created from the configured
+``default`` database, so they never touch real data.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    """
+    Configure Django for a benchmark run.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """
+    Create a test database for the duration of the block, then destroy it.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, iterations):
+    """
+    Call ``func`` ``iterations`` times.
+
+    Returns:
+        The sorted list of the durations of the calls, in seconds.
+    """
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return durations
+
+
+def percentile(durations, fraction):
+    """
+    Return the given percentile of a sorted list of durations.
+    """
+    if not durations:
+        return 0.0
+    index = min(len(durations) - 1, int(round(fraction * (len(durations) - 1))))
+    return durations[index]
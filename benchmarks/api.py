@@ -0,0 +1,405 @@
+"""
+Load test of every endpoint of ``messaging/urls.py``.
+
+A test database is seeded with the ``seed_messages`` command, then each endpoint is
+measured twice: in-process through the Django test client, which measures the view,
+the ORM and the database, and over HTTP against a local threaded server with
+concurrent clients, which adds the WSGI request cycle and the sockets. The requests
+are authenticated with HTTP Basic as the most active user of the seeded data.
+
+For each endpoint it reports the throughput, the p50/p95/p99 latency and the number
+of unexpected responses. ``--output`` writes the results to a JSON file, to be
+compared with another run by ``benchmarks.compare``.
+
+Usage::
+
+    python -m benchmarks.api [--users N] [--messages N] [--requests N]
+        [--concurrency N] [--only NAME ...] [--output results.json]
+
+Run it against PostgreSQL by setting ``DATABASE_URL``; a test database is created on
+that server. Passwords are hashed with MD5 during the run so that the results measure
+the endpoints rather than the password hasher.
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import platform
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from . import percentile, setup_django, test_database
+
+USERNAME = "seed-user-0"
+PASSWORD = "password"
+
+# Endpoints deleting a message on each request, see ``Fixtures.disposable_id``.
+DELETIONS = {"delete-message", "bulk-delete-messages"}
+# Endpoints that cannot be measured as request/response pairs.
+SKIPPED = {
+    "async-message-stream": "long-lived event stream",
+    "metrics": "admin only, not an API endpoint",
+}
+
+
+@dataclass
+class Call:
+    """
+    A request to an endpoint, and the status codes of a successful response.
+    """
+
+    method: str
+    url_name: str
+    kwargs: dict = None
+    query: dict = field(default_factory=dict)
+    body: dict = None
+    expected: tuple = (200,)
+
+    @property
+    def url(self):
+        from django.urls import reverse
+
+        path = reverse(f"messaging:{self.url_name}", kwargs=self.kwargs)
+        return f"{path}?{urlencode(self.query)}" if self.query else path
+
+    @property
+    def data(self):
+        return b"" if self.body is None else json.dumps(self.body).encode()
+
+
+class Fixtures:
+    """
+    The objects of the seeded data used to build the requests of the scenarios.
+    """
+
+    def __init__(self, disposable):
+        from django.contrib.auth.models import User
+
+        from messaging.models import Message, ThreadMembership
+        from messaging.services import create_messages
+
+        self.user = User.objects.get(username=USERNAME)
+        self.others = list(
+            User.objects.exclude(pk=self.user.pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:10]
+        )
+        received = Message.objects.filter(receiver=self.user).order_by("-pk")
+        self.message_id = received.values_list("pk", flat=True).first()
+        self.read_ids = list(received.values_list("pk", flat=True)[:20])
+        self.thread_id = (
+            ThreadMembership.objects.filter(user=self.user)
+            .order_by("-last_message_at")
+            .values_list("thread", flat=True)
+            .first()
+        )
+        # Messages consumed by the deletion endpoints, one per request.
+        created = create_messages(
+            [
+                Message(
+                    sender_id=self.others[0],
+                    receiver=self.user,
+                    subject="To delete",
+                    message="Test message content",
+                )
+                for _ in range(disposable)
+            ]
+        )
+        self.disposable_ids = [message.pk for message in created]
+
+    def disposable_id(self):
+        # list.pop is atomic, so concurrent clients never delete the same message.
+        return self.disposable_ids.pop()
+
+
+def message_payload(fixtures):
+    return {
+        "sender": fixtures.user.pk,
+        "receiver": fixtures.others[0],
+        "subject": "Benchmark",
+        "message": "Test message content",
+    }
+
+
+SCENARIOS = {
+    "send-message": lambda f: Call(
+        "POST", "send-message", body=message_payload(f), expected=(201, 202)
+    ),
+    "bulk-send-messages": lambda f: Call(
+        "POST",
+        "bulk-send-messages",
+        body={"receivers": f.others, "subject": "Benchmark", "message": "Content"},
+        expected=(201,),
+    ),
+    "user-messages-list": lambda f: Call("GET", "user-messages-list"),
+    "unread-messages-list": lambda f: Call("GET", "unread-messages-list"),
+    "unread-count": lambda f: Call("GET", "unread-count"),
+    "export-messages": lambda f: Call("GET", "export-messages"),
+    "bulk-read-messages": lambda f: Call(
+        "POST", "bulk-read-messages", body={"ids": f.read_ids}
+    ),
+    "bulk-delete-messages": lambda f: Call(
+        "POST", "bulk-delete-messages", body={"ids": [f.disposable_id()]}
+    ),
+    "search-messages": lambda f: Call("GET", "search-messages", query={"q": "report"}),
+    "thread-list": lambda f: Call("GET", "thread-list"),
+    "thread-messages": lambda f: Call("GET", "thread-messages", {"pk": f.thread_id}),
+    "read-message": lambda f: Call("GET", "read-message", {"pk": f.message_id}),
+    "delete-message": lambda f: Call(
+        "DELETE", "delete-message", {"pk": f.disposable_id()}, expected=(204,)
+    ),
+    "async-user-messages-list": lambda f: Call("GET", "async-user-messages-list"),
+    "async-unread-messages-list": lambda f: Call("GET", "async-unread-messages-list"),
+    "async-send-message": lambda f: Call(
+        "POST", "async-send-message", body=message_payload(f), expected=(201, 202)
+    ),
+    "async-read-message": lambda f: Call(
+        "GET", "async-read-message", {"pk": f.message_id}
+    ),
+}
+
+
+def get_endpoint_names():
+    """
+    Return the names of the endpoints of ``messaging/urls.py``.
+
+    Raises:
+        SystemExit: If an endpoint has no scenario, so new endpoints are not
+            silently left out of the benchmarks.
+    """
+    from messaging import urls
+
+    names = [pattern.name for pattern in urls.urlpatterns]
+    missing = set(names) - set(SCENARIOS) - set(SKIPPED)
+    if missing:
+        raise SystemExit(f"No benchmark scenario for {sorted(missing)}")
+    return [name for name in names if name in SCENARIOS]
+
+
+def summarize(durations, errors, elapsed):
+    durations.sort()
+    return {
+        "requests": len(durations),
+        "errors": errors,
+        "requests/s": round(len(durations) / elapsed, 1) if elapsed else 0.0,
+        "p50 ms": round(percentile(durations, 0.5) * 1e3, 3),
+        "p95 ms": round(percentile(durations, 0.95) * 1e3, 3),
+        "p99 ms": round(percentile(durations, 0.99) * 1e3, 3),
+    }
+
+
+def run_client(name, fixtures, requests, headers):
+    """
+    Send the requests of a scenario in-process, one after the other.
+    """
+    from django.test import Client
+
+    client = Client(**headers)
+
+    def send():
+        call = SCENARIOS[name](fixtures)
+        response = client.generic(
+            call.method, call.url, call.data, content_type="application/json"
+        )
+        b"".join(response)  # consume the streaming responses
+        return response.status_code in call.expected
+
+    send()  # warm up
+    durations, errors = [], 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        ok = send()
+        durations.append(time.perf_counter() - start)
+        errors += not ok
+    return summarize(durations, errors, sum(durations))
+
+
+def run_server(name, fixtures, requests, concurrency, port, headers):
+    """
+    Send the requests of a scenario to the local server from concurrent clients.
+    """
+    headers = {"Authorization": headers["HTTP_AUTHORIZATION"]}
+    durations, errors = [], []
+    lock = threading.Lock()
+
+    def send():
+        call = SCENARIOS[name](fixtures)
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            connection.request(
+                call.method,
+                call.url,
+                body=call.data or None,
+                headers={**headers, "Content-Type": "application/json"},
+            )
+            response = connection.getresponse()
+            response.read()
+            return response.status in call.expected
+        finally:
+            connection.close()
+
+    def client(count):
+        timings, failures = [], 0
+        for _ in range(count):
+            start = time.perf_counter()
+            ok = send()
+            timings.append(time.perf_counter() - start)
+            failures += not ok
+        with lock:
+            durations.extend(timings)
+            errors.append(failures)
+
+    send()  # warm up
+    workers = [
+        threading.Thread(target=client, args=(count,))
+        for count in split(requests, concurrency)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return summarize(durations, sum(errors), time.perf_counter() - start)
+
+
+def split(total, parts):
+    """
+    Split ``total`` requests between ``parts`` clients.
+    """
+    return [total // parts + (index < total % parts) for index in range(parts)]
+
+
+class LocalServer:
+    """
+    A threaded WSGI server serving the project on a free local port.
+    """
+
+    def __enter__(self):
+        from django.db import connections
+        from django.test.testcases import LiveServerThread
+
+        # An in-memory SQLite test database only exists in its connection, which the
+        # server threads have to share.
+        connections_override = {
+            conn.alias: conn
+            for conn in connections.all()
+            if conn.vendor == "sqlite" and conn.is_in_memory_db()
+        }
+        for conn in connections_override.values():
+            conn.inc_thread_sharing()
+        self.connections_override = connections_override
+        self.thread = LiveServerThread(
+            "127.0.0.1", lambda handler: handler, connections_override
+        )
+        self.thread.daemon = True
+        self.thread.start()
+        self.thread.is_ready.wait()
+        if self.thread.error:
+            raise self.thread.error
+        return self.thread.port
+
+    def __exit__(self, *exc_info):
+        self.thread.terminate()
+        for conn in self.connections_override.values():
+            conn.dec_thread_sharing()
+
+
+def print_row(mode, name, result):
+    print(
+        f"{mode:<8}{name:<28}{result['requests/s']:>12.0f}{result['p50 ms']:>9.2f}"
+        f"{result['p95 ms']:>9.2f}{result['p99 ms']:>9.2f}{result['errors']:>8}"
+    )
+
+
+def run(args):
+    import django
+    from django.core.management import call_command
+    from django.db import connection
+
+    call_command(
+        "seed_messages",
+        users=args.users,
+        messages=args.messages,
+        password=PASSWORD,
+        seed=args.seed,
+        verbosity=0,
+    )
+    concurrency = args.concurrency
+    if connection.vendor == "sqlite":
+        # The server threads share the connection of the in-memory test database, so
+        # the transactions of concurrent clients would interleave.
+        concurrency = 1
+    names = get_endpoint_names()
+    if args.only:
+        names = [name for name in names if name in args.only]
+    # The deletion scenarios consume a message per request, in both modes.
+    fixtures = Fixtures(2 * (args.requests + 1) * len(DELETIONS.intersection(names)))
+    credentials = base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+    headers = {"HTTP_AUTHORIZATION": f"Basic {credentials}"}
+
+    print(
+        f"{args.users} users, {args.messages} messages on {connection.vendor}, "
+        f"{args.requests} requests per endpoint, {concurrency} server clients"
+    )
+    print(
+        f"{'mode':<8}{'endpoint':<28}{'requests/s':>12}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'errors':>8}"
+    )
+    results = {"client": {}, "server": {}}
+    for name in names:
+        results["client"][name] = run_client(name, fixtures, args.requests, headers)
+        print_row("client", name, results["client"][name])
+    with LocalServer() as port:
+        for name in names:
+            results["server"][name] = run_server(
+                name, fixtures, args.requests, concurrency, port, headers
+            )
+            print_row("server", name, results["server"][name])
+
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "database": connection.vendor,
+            "django": django.get_version(),
+            "python": platform.python_version(),
+            "users": args.users,
+            "messages": args.messages,
+            "requests": args.requests,
+            "concurrency": concurrency,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="Names of the endpoints to run.")
+    parser.add_argument("--output", help="Path of the JSON file of the results.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+
+    with test_database(), override_settings(
+        ALLOWED_HOSTS=["127.0.0.1", "testserver"],
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    ):
+        report = run(args)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Compare two result files of ``benchmarks.api`` and fail on regressions.
+
+An endpoint regresses when its latency grows, or its throughput drops, by more than
+``--threshold`` (a fraction of the baseline). Latency changes smaller than
+``--min-delta`` milliseconds are ignored, so that sub-millisecond noise on the fast
+endpoints does not fail the comparison. Endpoints missing from one of the files are
+reported but never fail it.
+
+The exit status is 1 when a regression is found, so a CI job can run::
+
+    python -m benchmarks.api --output current.json
+    python -m benchmarks.compare baseline.json current.json --threshold 0.2
+
+Usage::
+
+    python -m benchmarks.compare BASELINE CURRENT [--threshold F] [--min-delta MS]
+        [--metric NAME ...]
+"""
+
+import argparse
+import json
+import sys
+
+LATENCY_METRICS = ("p50 ms", "p95 ms", "p99 ms")
+THROUGHPUT_METRICS = ("requests/s",)
+
+
+def compare_metric(metric, baseline, current, threshold, min_delta):
+    """
+    Return the relative change of a metric and whether it is a regression.
+
+    The change is positive when the endpoint got slower.
+    """
+    if not baseline:
+        return 0.0, False
+    if metric in THROUGHPUT_METRICS:
+        change = (baseline - current) / baseline
+        return change, change > threshold
+    change = (current - baseline) / baseline
+    return change, change > threshold and current - baseline > min_delta
+
+
+def compare(baseline, current, metrics, threshold, min_delta):
+    """
+    Compare the results of two runs.
+
+    Returns:
+        A list of ``(mode, endpoint, metric, baseline, current, change, regressed)``
+        tuples, and the list of the ``(mode, endpoint)`` present in only one run.
+    """
+    rows, missing = [], []
+    for mode in sorted(set(baseline["results"]) | set(current["results"])):
+        before = baseline["results"].get(mode, {})
+        after = current["results"].get(mode, {})
+        for name in sorted(set(before) | set(after)):
+            if name not in before or name not in after:
+                missing.append((mode, name))
+                continue
+            for metric in metrics:
+                change, regressed = compare_metric(
+                    metric,
+                    before[name][metric],
+                    after[name][metric],
+                    threshold,
+                    min_delta,
+                )
+                rows.append(
+                    (
+                        mode,
+                        name,
+                        metric,
+                        before[name][metric],
+                        after[name][metric],
+                        change,
+                        regressed,
+                    )
+                )
+            if after[name].get("errors"):
+                rows.append((mode, name, "errors", 0, after[name]["errors"], 0, True))
+    return rows, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--min-delta", type=float, default=1.0)
+    parser.add_argument(
+        "--metric",
+        nargs="+",
+        default=["p95 ms", "requests/s"],
+        choices=LATENCY_METRICS + THROUGHPUT_METRICS,
+    )
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline, open(args.current) as current:
+        rows, missing = compare(
+            json.load(baseline),
+            json.load(current),
+            args.metric,
+            args.threshold,
+            args.min_delta,
+        )
+
+    print(
+        f"{'mode':<8}{'endpoint':<28}{'metric':<12}{'baseline':>10}{'current':>10}"
+        f"{'change':>9}"
+    )
+    for mode, name, metric, before, after, change, regressed in rows:
+        print(
+            f"{mode:<8}{name:<28}{metric:<12}{before:>10.2f}{after:>10.2f}"
+            f"{change:>+9.0%}{'  REGRESSION' if regressed else ''}"
+        )
+    for mode, name in missing:
+        print(f"{mode:<8}{name:<28}only in one of the runs")
+
+    regressions = sum(row[-1] for row in rows)
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0%}: {regressions}")
+        sys.exit(1)
+    print(f"No regression beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Load test of the database connection settings: concurrent clients poll the mailbox
+endpoints through the full WSGI request cycle, so connections are opened, reused,
+health checked and closed exactly as under gunicorn threads.
+
+For each configuration it reports the throughput, the p50/p99 latency, the number of
+connections opened by Django and, on PostgreSQL, the peak number of server
+connections seen in ``pg_stat_activity``.
+
+Usage::
+
+    python -m benchmarks.connections [--threads N] [--requests N]
+        [--pgbouncer HOST:PORT]
+
+Run it against PostgreSQL by setting ``DATABASE_URL``; a test database is created on
+that server. Passwords are hashed with MD5 during the run so that the results measure
+the database connections rather than the password hasher. On SQLite, the in-memory
+test database is never closed, so only the latency is meaningful.
+
+With ``--pgbouncer``, a configuration connects through a PgBouncer in transaction
+pooling mode in front of the same server, with the settings of
+``DATABASE_PGBOUNCER``. PgBouncer must serve the test database, e.g. with a ``*``
+entry in its ``[databases]`` section.
+"""
+
+import argparse
+import base64
+import threading
+import time
+
+from . import percentile, setup_django, test_database
+
+CONFIGURATIONS = {
+    "close after request": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False},
+    "persistent": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": False},
+    "persistent + checks": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True},
+}
+
+
+def create_mailbox():
+    from django.contrib.auth.models import User
+
+    from messaging.models import Message, MessageBody
+
+    sender = User.objects.create_user("bench-sender", password="password")
+    receiver = User.objects.create_user("bench-receiver", password="password")
+    messages = [
+        Message(
+            sender=sender,
+            receiver=receiver,
+            subject=f"Subject {index}",
+            message="Test message content",
+        )
+        for index in range(200)
+    ]
+    MessageBody.attach(messages)
+    Message.objects.bulk_create(messages)
+    return receiver
+
+
+class ServerConnectionsMonitor(threading.Thread):
+    """
+    Sample the number of server connections to the database, on PostgreSQL.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        from django.db import connections
+
+        connection = connections.create_connection("default")
+        if connection.vendor != "postgresql":
+            return
+        try:
+            with connection.cursor() as cursor:
+                while not self.stopped.wait(0.05):
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database()"
+                    )
+                    self.peak = max(self.peak or 0, cursor.fetchone()[0] - 1)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_configuration(overrides, threads, requests):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from django.test import RequestFactory
+    from django.urls import reverse
+
+    connections.settings["default"].update(overrides)
+    handler = WSGIHandler()
+    credentials = base64.b64encode(b"bench-receiver:password").decode()
+    paths = [
+        reverse("messaging:unread-count"),
+        reverse("messaging:user-messages-list"),
+    ]
+    opened = []
+    durations = []
+    lock = threading.Lock()
+
+    def on_connection_created(sender, connection, **kwargs):
+        with lock:
+            opened.append(connection.alias)
+
+    def client():
+        factory = RequestFactory(HTTP_AUTHORIZATION=f"Basic {credentials}")
+        timings = []
+        try:
+            for index in range(requests):
+                environ = factory.get(paths[index % len(paths)]).environ
+                start = time.perf_counter()
+                response = handler(environ, lambda status, headers: None)
+                b"".join(response)
+                response.close()
+                timings.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+        with lock:
+            durations.extend(timings)
+
+    connection_created.connect(on_connection_created)
+    monitor = ServerConnectionsMonitor()
+    monitor.start()
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    monitor.stop()
+    connection_created.disconnect(on_connection_created)
+
+    durations.sort()
+    return {
+        "requests/s": len(durations) / elapsed,
+        "p50 ms": percentile(durations, 0.5) * 1e3,
+        "p99 ms": percentile(durations, 0.99) * 1e3,
+        "opened": len(opened),
+        "server peak": monitor.peak,
+    }
+
+
+def get_configurations(pgbouncer=None):
+    """
+    Return the configurations to compare, with PgBouncer at ``HOST:PORT`` if given.
+    """
+    configurations = dict(CONFIGURATIONS)
+    if pgbouncer:
+        host, _, port = pgbouncer.rpartition(":")
+        configurations["pgbouncer"] = {
+            "HOST": host,
+            "PORT": port,
+            "CONN_MAX_AGE": 0,
+            "CONN_HEALTH_CHECKS": False,
+            "DISABLE_SERVER_SIDE_CURSORS": True,
+        }
+    return configurations
+
+
+def run(threads, requests, pgbouncer=None):
+    from django.db import connection, connections
+
+    create_mailbox()
+    connection.close()
+    print(
+        f"{threads} clients x {requests} requests on {connection.vendor}\n"
+        f"{'configuration':<22}{'requests/s':>12}{'p50 ms':>9}{'p99 ms':>9}"
+        f"{'opened':>9}{'server peak':>13}"
+    )
+    settings = connections.settings["default"]
+    original = dict(settings)
+    for name, overrides in get_configurations(pgbouncer).items():
+        # Each configuration starts from the settings of the test database.
+        settings.clear()
+        settings.update(original)
+        result = run_configuration(overrides, threads, requests)
+        peak = result["server peak"]
+        print(
+            f"{name:<22}{result['requests/s']:>12.0f}{result['p50 ms']:>9.1f}"
+            f"{result['p99 ms']:>9.1f}{result['opened']:>9}"
+            f"{'n/a' if peak is None else peak:>13}"
+        )
+    settings.clear()
+    settings.update(original)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--pgbouncer", help="HOST:PORT of a PgBouncer to compare")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+
+    with test_database(), override_settings(
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+    ):
+        run(args.threads, args.requests, args.pgbouncer)
+
+
+if __name__ == "__main__":
+    main()
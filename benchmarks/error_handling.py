@@ -0,0 +1,158 @@
+"""
+Compare the per-request overhead of the former ``ErrorMiddleware`` with the DRF
+exception handler that replaced it.
+
+Usage::
+
+    python -m benchmarks.error_handling [--iterations N]
+"""
+
+import argparse
+
+from . import measure, percentile, setup_django, test_database
+
+
+class LegacyErrorMiddleware:
+    """
+    Copy of the former ``messaging.error_middleware.ErrorMiddleware``, kept here as
+    the baseline of the comparison.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from django.http import JsonResponse
+
+        response = self.get_response(request)
+        if response.status_code in [400, 404, 500]:
+            if response.status_code == 400:
+                error_message = "Invalid data"
+                try:
+                    error_details = response.data
+                except AttributeError:
+                    error_details = "Error validating data."
+            else:
+                error_message = response.reason_phrase
+                error_details = None
+            return JsonResponse(
+                {
+                    "status": response.status_code,
+                    "error": error_message,
+                    "details": error_details,
+                },
+                status=response.status_code,
+            )
+        return response
+
+
+def run_layer(iterations):
+    """
+    Time the error handling layer alone, without the rest of the request cycle.
+    """
+    from django.test import RequestFactory
+    from rest_framework import exceptions
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.response import Response
+    from rest_framework.views import exception_handler as drf_exception_handler
+
+    from messaging.errors import exception_handler
+
+    request = RequestFactory().get("/")
+    errors = {"subject": ["The subject cannot be empty or composed of only spaces."]}
+
+    def rendered(response):
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = "application/json"
+        response.renderer_context = {}
+        return response.render()
+
+    success = rendered(Response({"unread_count": 1}))
+    legacy = LegacyErrorMiddleware(lambda request: success)
+
+    def legacy_bad_request():
+        response = drf_exception_handler(exceptions.ValidationError(errors), {})
+        LegacyErrorMiddleware(lambda request: rendered(response))(request)
+
+    def bad_request():
+        rendered(exception_handler(exceptions.ValidationError(errors), {}))
+
+    timings = {
+        ("before (middleware)", "success"): lambda: legacy(request),
+        ("after (exception handler)", "success"): lambda: None,
+        ("before (middleware)", "bad request"): legacy_bad_request,
+        ("after (exception handler)", "bad request"): bad_request,
+    }
+    print("Error handling layer only")
+    print(f"{'configuration':<28}{'request':<14}{'mean µs':>10}{'p50 µs':>10}")
+    for (name, label), func in timings.items():
+        measure(func, 100)  # warm up
+        durations = measure(func, iterations)
+        mean = sum(durations) / len(durations)
+        print(
+            f"{name:<28}{label:<14}"
+            f"{mean * 1e6:>10.2f}{percentile(durations, 0.5) * 1e6:>10.2f}"
+        )
+    print()
+
+
+def run(iterations):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    sender = User.objects.create_user("bench-sender", password="password")
+    receiver = User.objects.create_user("bench-receiver", password="password")
+    client = APIClient()
+    client.force_authenticate(user=sender)
+
+    requests = {
+        "success": lambda: client.get(reverse("messaging:unread-count")),
+        "bad request": lambda: client.post(
+            reverse("messaging:send-message"),
+            {"sender": sender.pk, "receiver": receiver.pk, "subject": " "},
+        ),
+        "not found": lambda: client.get(
+            reverse("messaging:read-message", kwargs={"pk": 999999})
+        ),
+    }
+    configurations = {
+        "before (middleware)": {
+            "MIDDLEWARE": [f"{__name__}.LegacyErrorMiddleware", *settings.MIDDLEWARE],
+            "REST_FRAMEWORK": {
+                **settings.REST_FRAMEWORK,
+                "EXCEPTION_HANDLER": "rest_framework.views.exception_handler",
+            },
+        },
+        "after (exception handler)": {},
+    }
+
+    print("Full request cycle")
+    print(f"{'configuration':<28}{'request':<14}{'mean µs':>10}{'p50 µs':>10}")
+    for name, overrides in configurations.items():
+        with override_settings(**overrides):
+            for label, request in requests.items():
+                measure(request, 50)  # warm up
+                durations = measure(request, iterations)
+                mean = sum(durations) / len(durations)
+                print(
+                    f"{name:<28}{label:<14}"
+                    f"{mean * 1e6:>10.1f}{percentile(durations, 0.5) * 1e6:>10.1f}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    run_layer(args.iterations * 10)
+    with test_database():
+        run(args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare the encode time of the DRF ``JSONRenderer`` with ``ORJSONRenderer`` on
+mailbox list responses, and the decode time of the matching parsers.
+
+Usage::
+
+    python -m benchmarks.renderers [--iterations N]
+"""
+
+import argparse
+import io
+from datetime import datetime, timedelta, timezone
+
+from . import measure, percentile, setup_django
+
+
+def mailbox_response(page_size):
+    """
+    Return a mailbox list response with ``page_size`` messages in each stream.
+    """
+    from messaging.serializers import MessageRowSerializer
+
+    columns = MessageRowSerializer.get_columns()
+    serializer = MessageRowSerializer(columns)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def stream(sender_id, receiver_id):
+        rows = []
+        for index in range(page_size):
+            values = {
+                "id": index,
+                "sender_id": sender_id,
+                "receiver_id": receiver_id,
+                "subject": f"Subject {index}",
+                "body__text": "Lorem ipsum dolor sit amet. " * 8,
+                "body__compressed_text": None,
+                "creation_date": start - timedelta(minutes=index),
+                "is_read": bool(index % 3),
+            }
+            rows.append(tuple(values[column] for column in columns))
+        return serializer.serialize(rows)
+
+    return {
+        "sent_messages": stream(1, 2),
+        "received_messages": stream(2, 1),
+        "next_cursors": {"sent": "MjAyNC0wMS0wMXwxMjM=", "received": None},
+    }
+
+
+def run(iterations):
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from messaging.renderers import ORJSONParser, ORJSONRenderer
+
+    print(f"{'payload':<22}{'implementation':<16}{'p50 µs':>10}{'p95 µs':>10}")
+    for page_size in (50, 500):
+        data = mailbox_response(page_size)
+        body = JSONRenderer().render(data)
+        if ORJSONRenderer().render(data) != body:
+            raise SystemExit("ORJSONRenderer output differs from JSONRenderer")
+
+        timings = {
+            ("encode", "json"): lambda: JSONRenderer().render(data),
+            ("encode", "orjson"): lambda: ORJSONRenderer().render(data),
+            ("decode", "json"): lambda: JSONParser().parse(io.BytesIO(body)),
+            ("decode", "orjson"): lambda: ORJSONParser().parse(io.BytesIO(body)),
+        }
+        for (operation, name), func in timings.items():
+            measure(func, 10)  # warm up
+            durations = measure(func, iterations)
+            label = f"{operation} {page_size}x2 msgs"
+            print(
+                f"{label:<22}{name:<16}"
+                f"{percentile(durations, 0.5) * 1e6:>10.0f}"
+                f"{percentile(durations, 0.95) * 1e6:>10.0f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    run(args.iterations)
+
+
+if __name__ == "__main__":
+    main()
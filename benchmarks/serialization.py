@@ -0,0 +1,96 @@
+"""
+Compare the throughput of ``MessageSerializer`` with the ``MessageRowSerializer``
+fast path on a large mailbox.
+
+Usage::
+
+    python -m benchmarks.serialization [--messages N] [--iterations N]
+"""
+
+import argparse
+
+from . import measure, percentile, setup_django, test_database
+
+
+def create_mailbox(count):
+    """
+    Create a user with ``count`` received messages.
+    """
+    from django.contrib.auth.models import User
+
+    from messaging.models import Message, MessageBody
+
+    sender = User.objects.create_user("bench-sender", password="password")
+    receiver = User.objects.create_user("bench-receiver", password="password")
+    messages = [
+        Message(
+            sender=sender,
+            receiver=receiver,
+            subject=f"Subject {index}",
+            message="Lorem ipsum dolor sit amet. " * 8,
+            is_read=bool(index % 3),
+        )
+        for index in range(count)
+    ]
+    MessageBody.attach(messages)
+    Message.objects.bulk_create(messages, batch_size=1000)
+    return receiver
+
+
+def run(count, iterations):
+    from rest_framework.renderers import JSONRenderer
+
+    from messaging.models import Message
+    from messaging.serializers import MessageRowSerializer, MessageSerializer
+
+    receiver = create_mailbox(count)
+    queryset = (
+        Message.objects.filter(receiver=receiver)
+        .select_related("body")
+        .order_by("-creation_date")
+    )
+    columns = MessageRowSerializer.get_columns()
+    instances = list(queryset)
+    rows = list(queryset.values_list(*columns))
+
+    serializer = MessageRowSerializer(columns)
+    expected = JSONRenderer().render(MessageSerializer(instances, many=True).data)
+    if JSONRenderer().render(serializer.serialize(rows)) != expected:
+        raise SystemExit("MessageRowSerializer output differs from MessageSerializer")
+
+    timings = {
+        ("MessageSerializer", "serialize"): lambda: MessageSerializer(
+            instances, many=True
+        ).data,
+        ("MessageRowSerializer", "serialize"): lambda: MessageRowSerializer(
+            columns
+        ).serialize(rows),
+        ("MessageSerializer", "fetch + serialize"): lambda: MessageSerializer(
+            list(queryset), many=True
+        ).data,
+        ("MessageRowSerializer", "fetch + serialize"): lambda: MessageRowSerializer(
+            columns
+        ).serialize(queryset.values_list(*columns)),
+    }
+    print(f"Mailbox of {count} messages")
+    print(f"{'serializer':<24}{'work':<20}{'p50 ms':>10}{'rows/s':>12}")
+    for (name, label), func in timings.items():
+        func()  # warm up
+        durations = measure(func, iterations)
+        median = percentile(durations, 0.5)
+        print(f"{name:<24}{label:<20}{median * 1e3:>10.1f}{count / median:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        run(args.messages, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
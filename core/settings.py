@@ -14,6 +14,8 @@ import os
 from pathlib import Path
 from typing import Any, Dict, List, cast
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,7 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    "messaging.error_middleware.ErrorMiddleware",
+    # Removed from the chain at startup unless MESSAGING_INSTRUMENTATION is enabled.
+    "messaging.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -89,12 +92,149 @@ DATABASES = {
         "NAME": BASE_DIR / "db.sqlite3",
     }
 }
-if "DATABASE_URL" in os.environ:
+
+# Connections to PostgreSQL are configured from the environment, so each
+# deployment can size them against the max_connections of its server:
+# - DATABASE_CONN_MAX_AGE: seconds a connection is kept open between requests
+#   (0 closes it after each request).
+# - DATABASE_CONN_HEALTH_CHECKS: check persistent connections before reusing
+#   them, so a connection broken by a failover is replaced instead of failing
+#   the request.
+# - DATABASE_PGBOUNCER: the database URLs point to PgBouncer in transaction
+#   pooling mode, which shares a few server connections between all the
+#   processes. Each transaction may run on another server connection, so no
+#   state is kept between transactions: connections to PgBouncer are closed after
+#   each request and server-side cursors are disabled. LISTEN needs a session, so
+#   the pub/sub listener connects to DATABASE_DIRECT_URL, bypassing PgBouncer.
+DATABASE_CONN_MAX_AGE = int(os.environ.get("DATABASE_CONN_MAX_AGE", 600))
+DATABASE_CONN_HEALTH_CHECKS = os.environ.get(
+    "DATABASE_CONN_HEALTH_CHECKS", "true"
+).lower() in ("1", "true", "yes")
+DATABASE_PGBOUNCER = os.environ.get("DATABASE_PGBOUNCER", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+
+def database_config(url, pgbouncer=False):
+    """
+    Return the settings of the PostgreSQL database at ``url``.
+
+    Args:
+        url: The URL of the database.
+        pgbouncer: Whether the URL points to PgBouncer in transaction pooling mode.
+    """
     import dj_database_url
 
-    DATABASES["default"] = cast(
-        Dict[str, Any], dj_database_url.config(conn_max_age=600, ssl_require=True)
+    config = cast(
+        Dict[str, Any],
+        dj_database_url.parse(
+            url,
+            conn_max_age=0 if pgbouncer else DATABASE_CONN_MAX_AGE,
+            conn_health_checks=DATABASE_CONN_HEALTH_CHECKS,
+            ssl_require=True,
+            disable_server_side_cursors=pgbouncer,
+        ),
     )
+    return config
+
+
+# Read replicas, as a comma separated list of database URLs in
+# DATABASE_REPLICA_URLS. The mailbox read endpoints are served from them, see
+# messaging.routers.ReplicaRouter.
+DATABASE_REPLICAS: List[str] = []
+if "DATABASE_URL" in os.environ:
+    DATABASES["default"] = database_config(
+        os.environ["DATABASE_URL"], DATABASE_PGBOUNCER
+    )
+    replica_urls = os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+    for index, url in enumerate(filter(None, replica_urls)):
+        alias = f"replica{index + 1}"
+        DATABASES[alias] = database_config(url, DATABASE_PGBOUNCER)
+        DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+        DATABASE_REPLICAS.append(alias)
+    if os.environ.get("DATABASE_DIRECT_URL"):
+        DATABASES["direct"] = database_config(os.environ["DATABASE_DIRECT_URL"])
+        DATABASES["direct"]["TEST"] = {"MIRROR": "default"}
+
+DATABASE_ROUTERS = ["messaging.routers.ReplicaRouter"]
+
+# Cache shared by all the processes serving the API, a Redis server at CACHE_URL
+# (requires the redis package). The users reading their own writes from the
+# primary are recorded in it, see messaging.routers.pin_to_primary.
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+if os.environ.get("CACHE_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["CACHE_URL"],
+    }
+
+# Caches that each process keeps to itself.
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def check_replica_cache(caches, messaging):
+    """
+    Refuse to read from replicas with the read-your-writes pins in a cache local to
+    each process: a request served by another process would miss the pin of its user
+    and read a lagging replica.
+    """
+    if (
+        messaging["READ_REPLICAS"]
+        and messaging["REPLICA_STICKINESS"]
+        and caches["default"]["BACKEND"] in PROCESS_LOCAL_CACHES
+    ):
+        raise ImproperlyConfigured(
+            "DATABASE_REPLICA_URLS requires a shared cache: set CACHE_URL, or "
+            "MESSAGING_REPLICA_STICKINESS=0 to read from the replicas right after "
+            "a write."
+        )
+
+
+# The broker pushing new messages to the streams of the ASGI workers, see
+# messaging.pubsub. The messages sent by any process reach every worker through
+# PostgreSQL; the in-process broker only suits a single process, in development.
+DEFAULT_PUBSUB_BACKEND = (
+    "messaging.pubsub.PostgresBroker"
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql"
+    else "messaging.pubsub.InProcessBroker"
+)
+
+
+def check_pubsub_backend(messaging, environ):
+    """
+    Refuse the in-process broker when the web server runs several workers: the
+    messages sent through one worker would never reach the streams of the others.
+    """
+    if (
+        messaging["PUBSUB_BACKEND"] == "messaging.pubsub.InProcessBroker"
+        and int(environ.get("WEB_CONCURRENCY") or 1) > 1
+    ):
+        raise ImproperlyConfigured(
+            "messaging.pubsub.InProcessBroker only delivers messages within one "
+            "process: set MESSAGING_PUBSUB_BACKEND=messaging.pubsub.PostgresBroker, "
+            "or WEB_CONCURRENCY=1."
+        )
+
+
+def check_pubsub_database(messaging, pgbouncer):
+    """
+    Refuse to listen for the events of the PostgreSQL broker through PgBouncer in
+    transaction pooling mode, which does not support ``LISTEN``.
+    """
+    if (
+        pgbouncer
+        and messaging["PUBSUB_BACKEND"] == "messaging.pubsub.PostgresBroker"
+        and messaging["PUBSUB_DATABASE"] == "default"
+    ):
+        raise ImproperlyConfigured(
+            "messaging.pubsub.PostgresBroker cannot LISTEN through PgBouncer: set "
+            "DATABASE_DIRECT_URL to a direct connection to the primary database."
+        )
 
 
 # Password validation
@@ -147,4 +287,61 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
     ],
+    "EXCEPTION_HANDLER": "messaging.errors.exception_handler",
+    # orjson based, with the same output as the DRF JSON renderer and parser.
+    "DEFAULT_RENDERER_CLASSES": [
+        "messaging.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "messaging.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
+
+# Messaging
+MESSAGING = {
+    "EXPORT_CHUNK_SIZE": 2000,
+    "BULK_SEND_BATCH_SIZE": 1000,
+    "BULK_SEND_MAX_ITEMS": 10000,
+    "PUBSUB_BACKEND": os.environ.get(
+        "MESSAGING_PUBSUB_BACKEND", DEFAULT_PUBSUB_BACKEND
+    ),
+    "PUBSUB_DATABASE": "direct" if "direct" in DATABASES else "default",
+    "READ_REPLICAS": DATABASE_REPLICAS,
+    "REPLICA_STICKINESS": int(os.environ.get("MESSAGING_REPLICA_STICKINESS", 5)),
+    "ASYNC_SEND": os.environ.get("MESSAGING_ASYNC_SEND", "false").lower()
+    in ("1", "true", "yes"),
+    "OUTBOX_BATCH_SIZE": int(os.environ.get("MESSAGING_OUTBOX_BATCH_SIZE", 500)),
+    "ARCHIVE_AFTER_MONTHS": (
+        int(os.environ["MESSAGING_ARCHIVE_AFTER_MONTHS"])
+        if os.environ.get("MESSAGING_ARCHIVE_AFTER_MONTHS")
+        else None
+    ),
+    "BODY_COMPRESSION_THRESHOLD": int(
+        os.environ.get("MESSAGING_BODY_COMPRESSION_THRESHOLD", 1024)
+    ),
+    "INSTRUMENTATION": os.environ.get("MESSAGING_INSTRUMENTATION", "false").lower()
+    in ("1", "true", "yes"),
+}
+check_replica_cache(CACHES, MESSAGING)
+check_pubsub_backend(MESSAGING, os.environ)
+check_pubsub_database(MESSAGING, DATABASE_PGBOUNCER)
+
+# The instrumentation of the requests logs a line per request at the INFO level.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "messaging.instrumentation": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
 }
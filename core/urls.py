@@ -5,3 +5,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/messaging/", include("messaging.urls")),
 ]
+
+handler400 = "messaging.errors.bad_request"
+handler404 = "messaging.errors.page_not_found"
+handler500 = "messaging.errors.server_error"
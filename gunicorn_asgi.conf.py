@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration serving the project over ASGI with uvicorn workers.
+
+Usage (e.g. as the ``web`` process of the Procfile)::
+
+    gunicorn core.asgi:application -c gunicorn_asgi.conf.py
+
+Each worker runs an event loop, so the asynchronous views (``/api/messaging/async/``)
+hold idle and long-polling connections without pinning a worker each. The DRF views
+keep working and run in a thread pool.
+"""
+
+import multiprocessing
+import os
+
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2))
+
+# Long-polling requests stay open much longer than regular API calls.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 75
+
+# Persistent connections are kept per thread, and ASGI runs synchronous code in
+# short-lived threads, so keeping them open would leak database connections. Set
+# DATABASE_PGBOUNCER to share server connections between the workers instead.
+# The number of workers is passed on to the settings, which refuse a pub/sub
+# broker that cannot reach the other workers.
+raw_env = ["DATABASE_CONN_MAX_AGE=0", f"WEB_CONCURRENCY={workers}"]
+
+accesslog = "-"
+errorlog = "-"
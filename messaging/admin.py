@@ -1,5 +1,58 @@
+from django import forms
 from django.contrib import admin
 
-from .models import Message
+from .models import ArchivedMessage, Message
 
-admin.site.register(Message)
+
+class MessageAdminForm(forms.ModelForm):
+    """
+    Edit the text of a message instead of its ``body`` foreign key.
+
+    The text is bound to the ``message`` attribute of the message, so saving an
+    edited text stores its body like the API does.
+    """
+
+    message = forms.CharField(widget=forms.Textarea)
+
+    class Meta:
+        model = Message
+        fields = ("thread", "sender", "receiver", "subject", "message", "is_read")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.body_id is not None:
+            self.initial.setdefault("message", self.instance.message)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if "message" in cleaned_data and (
+            self.instance.body_id is None
+            or cleaned_data["message"] != self.instance.message
+        ):
+            self.instance.message = cleaned_data["message"]
+        return cleaned_data
+
+
+@admin.register(Message)
+class MessageAdmin(admin.ModelAdmin):
+    form = MessageAdminForm
+    list_display = ("subject", "sender", "receiver", "creation_date", "is_read")
+    list_select_related = ("sender", "receiver")
+    raw_id_fields = ("thread", "sender", "receiver")
+    readonly_fields = ("body",)
+
+
+@admin.register(ArchivedMessage)
+class ArchivedMessageAdmin(admin.ModelAdmin):
+    """
+    Archived messages are only moved by the ``partition_messages`` command, so their
+    content is read-only.
+    """
+
+    list_display = ("subject", "sender", "receiver", "creation_date", "is_read")
+    list_select_related = ("sender", "receiver")
+    raw_id_fields = ("thread", "sender", "receiver")
+    readonly_fields = ("body", "message", "creation_date")
+
+    def has_add_permission(self, request):
+        return False
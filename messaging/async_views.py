@@ -0,0 +1,333 @@
+import asyncio
+import base64
+import binascii
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import classonlymethod
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    SessionAuthentication,
+    get_authorization_header,
+)
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+from .conditional import get_mailbox_validators, set_mailbox_validator_headers
+from .conf import get_setting
+from .errors import ENVELOPED_STATUS_CODES, build_error_payload
+from .instrumentation import timer
+from .mailbox import MailboxQuerysetMixin, aget_mailbox_state
+from .models import Message
+from .pagination import MessageKeysetPagination
+from .pubsub import get_broker, message_event
+from .routers import ause_replicas, read_from_primary, read_from_replicas
+from .serializers import (
+    MessageRowSerializer,
+    MessageSerializer,
+    OutboxMessageSerializer,
+)
+from .services import enqueue_message, read_message, save_message
+
+
+class AsyncAPIView(View):
+    """
+    Base class of the asynchronous messaging views.
+
+    These views run natively on an ASGI server: while a request waits on the database
+    the worker keeps serving other connections. They mirror the DRF views of
+    ``messaging.views``: the user is authenticated with HTTP Basic or the session
+    (with the same CSRF check as DRF), only authenticated users are allowed, and
+    errors are rendered with the API error envelope.
+    """
+
+    # Serve the reads of safe requests from the replicas, see ``ReplicaReadMixin``.
+    read_from_replicas = False
+    # Maximum number of queries of a request, see ``InstrumentedViewMixin``.
+    query_budget = None
+    # The JSON renderer of the DRF views.
+    renderer_class = api_settings.DEFAULT_RENDERER_CLASSES[0]
+    json_dumps_params = {"ensure_ascii": False, "separators": (",", ":")}
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Like DRF, rely on the CSRF check of session authentication only.
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            with timer("auth"):
+                user = await self.authenticate(request)
+            if user is None:
+                raise exceptions.NotAuthenticated()
+            request.user = user
+            if self.read_from_replicas and await ause_replicas(request):
+                with read_from_replicas():
+                    response = await super().dispatch(request, *args, **kwargs)
+            else:
+                response = await super().dispatch(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            response = self.handle_exception(exc)
+        return response
+
+    async def authenticate(self, request):
+        """
+        Return the authenticated user of the request, or None.
+
+        Raises:
+            AuthenticationFailed: If Basic credentials are given but invalid.
+            PermissionDenied: If a session authenticated request fails the CSRF check.
+        """
+        auth = get_authorization_header(request).split()
+        if auth and auth[0].lower() == b"basic":
+            try:
+                username, _, password = (
+                    base64.b64decode(auth[1]).decode("utf-8").partition(":")
+                )
+            except (IndexError, binascii.Error, UnicodeDecodeError):
+                raise exceptions.AuthenticationFailed("Invalid basic header.")
+            user = await aauthenticate(request, username=username, password=password)
+            if user is None or not user.is_active:
+                raise exceptions.AuthenticationFailed("Invalid username/password.")
+            return user
+
+        user = await request.auser()
+        if not user.is_authenticated:
+            return None
+        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"):
+            SessionAuthentication().enforce_csrf(request)
+        return user
+
+    def handle_exception(self, exc):
+        """
+        Render an API exception the same way as the DRF views.
+        """
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound()
+        if isinstance(
+            exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+        ):
+            # Session authentication comes first and has no WWW-Authenticate
+            # challenge, so DRF answers 403 rather than 401.
+            exc.status_code = 403
+        if exc.status_code in ENVELOPED_STATUS_CODES:
+            data = build_error_payload(exc.status_code, exc.detail)
+        elif isinstance(exc.detail, (dict, list)):
+            data = exc.detail
+        else:
+            data = {"detail": exc.detail}
+        return self.render(data, status=exc.status_code)
+
+    def render(self, data, status=200):
+        renderer = self.renderer_class()
+        return HttpResponse(
+            renderer.render(data), status=status, content_type=renderer.media_type
+        )
+
+    def get_data(self, request):
+        """
+        Return the parsed JSON or form body of the request.
+        """
+        if request.content_type == "application/json":
+            try:
+                return json.loads(request.body or b"{}")
+            except ValueError as exc:
+                raise exceptions.ParseError(f"JSON parse error - {exc}")
+        return request.POST
+
+
+class AsyncMailboxListView(MailboxQuerysetMixin, AsyncAPIView):
+    """
+    Asynchronous version of ``MailboxListView``.
+    """
+
+    query_budget = 4
+    pagination_class = MessageKeysetPagination
+    read_from_replicas = True
+
+    async def get(self, request, *args, **kwargs):
+        user = request.user
+        etag, last_modified = get_mailbox_validators(
+            request, user, await aget_mailbox_state(user)
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            columns = self.get_columns(request)
+            pages = await self.pagination_class().apaginate_rows(
+                self.get_mailbox_querysets(request), request, columns, view=self
+            )
+            sent_messages, sent_cursor = pages.get("sent", ([], None))
+            received_messages, received_cursor = pages.get("received", ([], None))
+            serializer = MessageRowSerializer(columns, self.get_fields(request))
+            with timer("serialize"):
+                data = {
+                    "sent_messages": serializer.serialize(sent_messages),
+                    "received_messages": serializer.serialize(received_messages),
+                    "next_cursors": {
+                        "sent": sent_cursor,
+                        "received": received_cursor,
+                    },
+                }
+            response = self.render(data)
+        return set_mailbox_validator_headers(response, etag, last_modified)
+
+
+class AsyncUserMessagesListView(AsyncMailboxListView):
+    """
+    Asynchronous version of ``UserMessagesListView``.
+    """
+
+
+class AsyncUnreadMessagesListView(AsyncMailboxListView):
+    """
+    Asynchronous version of ``UnreadMessagesListView``.
+    """
+
+    unread_only = True
+
+
+class AsyncReadMessageView(AsyncAPIView):
+    """
+    Asynchronous version of ``ReadMessageView``.
+    """
+
+    query_budget = 10
+    read_from_replicas = True
+
+    async def get(self, request, pk):
+        user = request.user
+        # The ORM does not support transactions in async code yet, so the message is
+        # read and marked, and the counters written, in a synchronous transaction.
+        message, marked = await sync_to_async(read_message)(user, pk)
+        if message is None:
+            raise Http404
+
+        if message.receiver_id != user.pk and message.sender_id != user.pk:
+            return self.render(
+                {"message": "You can only read messages sent to or by you."},
+                status=403,
+            )
+
+        if marked:
+            # A replica may not have the change yet.
+            with read_from_primary():
+                state = await aget_mailbox_state(user)
+            etag, last_modified = get_mailbox_validators(request, user, state)
+            response = None
+        else:
+            etag, last_modified = get_mailbox_validators(
+                request, user, await aget_mailbox_state(user)
+            )
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+        if response is None:
+            with timer("serialize"):
+                data = MessageSerializer(message).data
+            response = self.render(data)
+        return set_mailbox_validator_headers(response, etag, last_modified)
+
+
+class AsyncSendMessageView(AsyncAPIView):
+    """
+    Asynchronous version of ``SendMessageView``.
+    """
+
+    query_budget = 17
+
+    async def post(self, request):
+        serializer = MessageSerializer(data=self.get_data(request))
+        # Validation resolves the sender and receiver with the synchronous ORM.
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        if get_setting("ASYNC_SEND"):
+            queued = await sync_to_async(enqueue_message)(serializer, request.user)
+            return self.render(OutboxMessageSerializer(queued).data, status=202)
+        await sync_to_async(save_message)(serializer, request.user)
+        return self.render(serializer.data, status=201)
+
+
+class StreamUnavailable(exceptions.APIException):
+    status_code = 501
+    default_detail = "The message stream is only served over ASGI."
+    default_code = "stream_unavailable"
+
+
+class AsyncMessageStreamView(AsyncAPIView):
+    """
+    Server-Sent Events stream pushing new messages to their receiver.
+
+    Each new message received by the user is sent as a ``message`` event holding its
+    summary, with the message id as event id. A client reconnecting with the
+    ``Last-Event-ID`` header first receives the messages it missed. Keep-alive comments
+    are sent on idle streams, and streams are closed after ``STREAM_MAX_DURATION``
+    seconds; EventSource clients reconnect automatically.
+
+    The stream is only served over ASGI: a WSGI worker would be held by a single
+    stream for its whole duration.
+    """
+
+    # Maximum number of missed messages replayed on reconnection.
+    replay_limit = 100
+    # Reconnection delay advertised to the client, in milliseconds.
+    retry = 3000
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            raise StreamUnavailable()
+        try:
+            last_event_id = int(request.headers.get("Last-Event-ID", ""))
+        except ValueError:
+            last_event_id = None
+
+        response = StreamingHttpResponse(
+            self.stream(request.user, last_event_id),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self, user, last_event_id=None):
+        """
+        Yield the events of the stream of the user.
+        """
+        heartbeat = get_setting("STREAM_HEARTBEAT_INTERVAL")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + get_setting("STREAM_MAX_DURATION")
+
+        # Subscribe before replaying, so no message falls between the two.
+        subscription = get_broker().subscribe(user.pk)
+        try:
+            yield f"retry: {self.retry}\n\n"
+            if last_event_id is not None:
+                missed = Message.objects.filter(
+                    receiver=user, pk__gt=last_event_id
+                ).order_by("pk")[: self.replay_limit]
+                async for message in missed:
+                    last_event_id = message.pk
+                    yield self.format_event(message_event(message))
+
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    event = await subscription.get(timeout=min(heartbeat, remaining))
+                except (TimeoutError, asyncio.TimeoutError):
+                    yield ": keep-alive\n\n"
+                    continue
+                if last_event_id is not None and event["id"] <= last_event_id:
+                    continue
+                yield self.format_event(event)
+        finally:
+            subscription.close()
+
+    def format_event(self, event):
+        data = json.dumps(event, cls=encoders.JSONEncoder, **self.json_dumps_params)
+        return f"id: {event['id']}\nevent: message\ndata: {data}\n\n"
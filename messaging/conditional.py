@@ -0,0 +1,83 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .mailbox import get_mailbox_state
+
+
+def get_mailbox_validators(request, user, state):
+    """
+    Return the ``(etag, last_modified)`` validators of a response.
+
+    Args:
+        request: The incoming request. Its path and query string select the
+            representation (message, page...).
+        user: The authenticated user.
+        state: The MailboxCounter of the user.
+
+    Returns:
+        A weak ETag and the last modification time as a timestamp, or None.
+    """
+    key = f"{request.get_full_path()}|{user.pk}|{state.version}"
+    etag = f'W/"{hashlib.md5(key.encode("utf-8")).hexdigest()}"'
+    last_modified = (
+        int(state.last_modified.timestamp()) if state.last_modified else None
+    )
+    return etag, last_modified
+
+
+def set_mailbox_validator_headers(response, etag, last_modified):
+    """
+    Set the ``ETag`` and ``Last-Modified`` headers of a 200 or 304 response.
+    """
+    if etag and response.status_code in (200, 304):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ("Authorization", "Cookie"))
+    return response
+
+
+class ConditionalMailboxMixin:
+    """
+    Answer GET requests with ``304 Not Modified`` when the mailbox has not changed.
+
+    The validators are derived from the version of the user's mailbox, which is
+    incremented on every change to the messages sent or received by the user. A view
+    calls ``check_not_modified`` before running its queries and returns the 304 response
+    when there is one; the ``ETag`` and ``Last-Modified`` headers are then added to the
+    response in ``finalize_response``.
+    """
+
+    mailbox_etag = None
+    mailbox_last_modified = None
+
+    def set_mailbox_validators(self, request, state):
+        """
+        Compute the validators of the response from the state of the mailbox.
+        """
+        self.mailbox_etag, self.mailbox_last_modified = get_mailbox_validators(
+            request, request.user, state
+        )
+
+    def check_not_modified(self, request, state=None):
+        """
+        Return a 304 response if the client's copy is up to date, None otherwise.
+
+        Args:
+            request: The incoming request.
+            state: The MailboxCounter of the user. Fetched if not given.
+        """
+        if state is None:
+            state = get_mailbox_state(request.user)
+        self.set_mailbox_validators(request, state)
+        return get_conditional_response(
+            request, etag=self.mailbox_etag, last_modified=self.mailbox_last_modified
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return set_mailbox_validator_headers(
+            response, self.mailbox_etag, self.mailbox_last_modified
+        )
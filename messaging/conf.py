@@ -0,0 +1,42 @@
+from django.conf import settings
+
+DEFAULTS = {
+    # Number of rows fetched per round trip when streaming a mailbox export.
+    "EXPORT_CHUNK_SIZE": 2000,
+    # Number of rows inserted per INSERT statement by the bulk send endpoint.
+    "BULK_SEND_BATCH_SIZE": 1000,
+    # Maximum number of messages accepted in a single bulk send request.
+    "BULK_SEND_MAX_ITEMS": 10000,
+    # Dotted path of the publish/subscribe broker pushing new messages to clients.
+    "PUBSUB_BACKEND": "messaging.pubsub.InProcessBroker",
+    # Alias of the database the PostgreSQL broker listens on, outside of any pooler.
+    "PUBSUB_DATABASE": "default",
+    # Seconds between two keep-alive comments on an idle event stream.
+    "STREAM_HEARTBEAT_INTERVAL": 15,
+    # Seconds after which an event stream is closed; clients reconnect automatically.
+    "STREAM_MAX_DURATION": 300,
+    # Aliases of the databases serving the reads of the mailbox read endpoints.
+    "READ_REPLICAS": [],
+    # Seconds during which a user's reads go to the primary after a write.
+    "REPLICA_STICKINESS": 5,
+    # Queue the messages of the send endpoints in the outbox instead of inserting them.
+    "ASYNC_SEND": False,
+    # Number of queued messages sent per transaction by the drain_outbox command.
+    "OUTBOX_BATCH_SIZE": 500,
+    # Size in bytes above which the bodies of the messages are compressed.
+    "BODY_COMPRESSION_THRESHOLD": 1024,
+    # Age in months after which partition_messages archives the messages, or None.
+    "ARCHIVE_AFTER_MONTHS": None,
+    # Time the phases of the requests, see messaging.instrumentation.
+    "INSTRUMENTATION": False,
+}
+
+
+def get_setting(name):
+    """
+    Return the value of a messaging setting.
+
+    Settings are read from the ``MESSAGING`` dictionary of the Django settings and
+    fall back to the defaults defined in this module.
+    """
+    return getattr(settings, "MESSAGING", {}).get(name, DEFAULTS[name])
@@ -0,0 +1,60 @@
+from http import HTTPStatus
+
+from django.http import JsonResponse
+from rest_framework.views import exception_handler as drf_exception_handler
+
+# Status codes whose responses are rendered with the error envelope.
+ENVELOPED_STATUS_CODES = (400, 404, 500)
+
+
+def build_error_payload(status_code, details=None):
+    """
+    Build the JSON error envelope returned by the API.
+
+    Args:
+        status_code: The HTTP status code of the response.
+        details: The details of the error. Only kept for 400 responses.
+
+    Returns:
+        A dict with the ``status``, ``error`` and ``details`` keys.
+    """
+    if status_code == 400:
+        error = "Invalid data"
+    else:
+        error = HTTPStatus(status_code).phrase
+        details = None
+    return {"status": status_code, "error": error, "details": details}
+
+
+def exception_handler(exc, context):
+    """
+    DRF exception handler rendering 400, 404 and 500 errors with the error envelope.
+
+    Other errors (401, 403...) keep the default DRF representation. The envelope is
+    built before the response is rendered, so an error is serialized only once.
+    """
+    response = drf_exception_handler(exc, context)
+    if response is not None and response.status_code in ENVELOPED_STATUS_CODES:
+        response.data = build_error_payload(response.status_code, response.data)
+    return response
+
+
+def bad_request(request, exception):
+    """
+    Django ``handler400`` rendering the error envelope.
+    """
+    return JsonResponse(build_error_payload(400, str(exception) or None), status=400)
+
+
+def page_not_found(request, exception):
+    """
+    Django ``handler404`` rendering the error envelope.
+    """
+    return JsonResponse(build_error_payload(404), status=404)
+
+
+def server_error(request):
+    """
+    Django ``handler500`` rendering the error envelope.
+    """
+    return JsonResponse(build_error_payload(500), status=500)
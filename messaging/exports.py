@@ -0,0 +1,117 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from rest_framework.utils import encoders
+
+from .conf import get_setting
+from .serializers import MessageRowSerializer
+
+
+def _dumps(data):
+    return json.dumps(
+        data, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(",", ":")
+    )
+
+
+def _iter_rows(queryset, chunk_size):
+    """
+    Yield the serialized messages of the queryset, one dict per row.
+
+    The queryset is iterated with ``.iterator()`` so rows are fetched from a
+    server-side cursor ``chunk_size`` at a time and never cached on the queryset.
+    When the database disables server-side cursors, behind PgBouncer, the driver
+    would fetch the whole result at once: the rows are read with a keyset query per
+    chunk instead. Rows are read as tuples and serialized with
+    ``MessageRowSerializer``.
+    """
+    columns = MessageRowSerializer.get_columns()
+    serializer = MessageRowSerializer(columns)
+    rows = queryset.values_list(*columns)
+    if connections[queryset.db].settings_dict.get("DISABLE_SERVER_SIDE_CURSORS"):
+        rows = _iter_keyset_chunks(rows, columns.index("id"), chunk_size)
+    else:
+        rows = rows.iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield serializer.to_representation(row)
+
+
+def _iter_keyset_chunks(rows, pk_index, chunk_size):
+    """
+    Yield the rows of a ``values_list()`` queryset, newest first, fetching
+    ``chunk_size`` rows per query.
+    """
+    rows = rows.order_by("-pk")
+    chunk = list(rows[:chunk_size])
+    while chunk:
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        chunk = list(rows.filter(pk__lt=chunk[-1][pk_index])[:chunk_size])
+
+
+def iter_ndjson(streams, chunk_size=None):
+    """
+    Yield the messages of each stream as newline-delimited JSON.
+
+    Args:
+        streams: An iterable of ``(name, queryset)`` pairs.
+        chunk_size: The number of rows fetched and written at a time.
+
+    Yields:
+        Encoded chunks of at most ``chunk_size`` lines.
+    """
+    chunk_size = chunk_size or get_setting("EXPORT_CHUNK_SIZE")
+    for _, queryset in streams:
+        lines = []
+        for data in _iter_rows(queryset, chunk_size):
+            lines.append(_dumps(data))
+            if len(lines) >= chunk_size:
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+                lines = []
+        if lines:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_json(streams, chunk_size=None):
+    """
+    Yield the messages of each stream as a single JSON object, written incrementally.
+
+    The output has the same shape as the mailbox list views: one key per stream,
+    holding the list of its messages.
+    """
+    chunk_size = chunk_size or get_setting("EXPORT_CHUNK_SIZE")
+    yield b"{"
+    for index, (name, queryset) in enumerate(streams):
+        prefix = "," if index else ""
+        yield f"{prefix}{_dumps(name)}:[".encode("utf-8")
+        items = []
+        first = True
+        for data in _iter_rows(queryset, chunk_size):
+            items.append(_dumps(data))
+            if len(items) >= chunk_size:
+                yield (("" if first else ",") + ",".join(items)).encode("utf-8")
+                items = []
+                first = False
+        if items:
+            yield (("" if first else ",") + ",".join(items)).encode("utf-8")
+        yield b"]"
+    yield b"}"
+
+
+async def aiter_chunks(chunks):
+    """
+    Yield the chunks of an export generator asynchronously, to stream it over ASGI.
+
+    Django's ASGI handler reads a synchronous iterator into a list before sending
+    it, which would hold the whole export in memory. Each chunk is read instead in
+    the thread running the synchronous code of the request, where the database
+    cursor lives, and sent before the next one is read.
+    """
+    read_chunk = sync_to_async(next)
+    try:
+        while (chunk := await read_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Close the cursor even when the client disconnects mid-export.
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,287 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .conf import get_setting
+
+logger = logging.getLogger(__name__)
+
+# The timings of the request being served, None when it is not instrumented.
+_current_timings = ContextVar("messaging_request_timings", default=None)
+
+# Phases of a request timed by the hooks of the views, in Server-Timing order.
+PHASES = ("auth", "db", "serialize", "render")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestTimings:
+    """
+    The time spent in each phase of a request, and the number of database queries.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+
+    def add(self, phase, duration):
+        self.durations[phase] += duration
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper timing the queries, see ``execute_wrapper``.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations["db"] += time.perf_counter() - start
+            self.queries += 1
+
+
+@contextmanager
+def timer(phase):
+    """
+    Add the time spent in the block to a phase of the current request.
+
+    Costs a context variable lookup when the request is not instrumented.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+class InstrumentedViewMixin:
+    """
+    Time the authentication of the requests of a DRF view.
+
+    Views declare the maximum number of database queries of a request in
+    ``query_budget``, authentication and transaction statements included. The
+    budgets are enforced by the tests at several mailbox sizes and, when the
+    instrumentation is enabled, a request exceeding the budget of its view is logged
+    as a warning.
+    """
+
+    query_budget = None
+
+    def perform_authentication(self, request):
+        with timer("auth"):
+            super().perform_authentication(request)
+
+
+class Histogram:
+    """
+    A Prometheus histogram with labels, aggregated in the memory of the process.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def collect(self):
+        """
+        Return the lines of the histogram in the Prometheus text format.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            snapshot = [
+                (labels, list(counts), count, total)
+                for labels, (counts, count, total) in sorted(self.series.items())
+            ]
+        for labels, counts, count, total in snapshot:
+            pairs = [
+                f'{name}="{escape_label(value)}"'
+                for name, value in zip(self.labelnames, labels)
+            ]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = ",".join([*pairs, f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {cumulative}")
+            le = ",".join([*pairs, 'le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{le}}} {count}")
+            labels = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+REQUEST_DURATION = Histogram(
+    "messaging_request_duration_seconds",
+    "Duration of the API requests.",
+    ("view", "method"),
+    DURATION_BUCKETS,
+)
+PHASE_DURATION = Histogram(
+    "messaging_request_phase_duration_seconds",
+    "Time spent in each phase of the API requests.",
+    ("view", "phase"),
+    DURATION_BUCKETS,
+)
+QUERY_COUNT = Histogram(
+    "messaging_request_db_queries",
+    "Number of database queries of the API requests.",
+    ("view",),
+    QUERY_COUNT_BUCKETS,
+)
+HISTOGRAMS = (REQUEST_DURATION, PHASE_DURATION, QUERY_COUNT)
+
+
+def render_metrics():
+    """
+    Return the metrics of the process in the Prometheus text format.
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.collect())
+    return "\n".join(lines) + "\n"
+
+
+def get_query_budget(match):
+    """
+    Return the query budget of the view of a resolved URL, or None.
+    """
+    view_class = getattr(match.func, "view_class", None) if match else None
+    return getattr(view_class, "query_budget", None)
+
+
+class InstrumentationMiddleware:
+    """
+    Measure the requests: total time, time spent in each phase and database queries.
+
+    The measures are sent back in a ``Server-Timing`` header, logged on the
+    ``messaging.instrumentation`` logger and aggregated in the histograms exposed by
+    the metrics endpoint. Requests exceeding the ``query_budget`` of their view are
+    logged as warnings. Database queries are timed with an execute wrapper on every
+    database connection. The other phases are timed by ``timer`` blocks in the views
+    and the renderer. The queries of a streaming response run after the headers are
+    sent, so they are not measured.
+
+    The middleware is only installed when the ``INSTRUMENTATION`` setting is enabled.
+    Otherwise it is removed from the middleware chain at startup and the timers of
+    the views cost a context variable lookup.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_setting("INSTRUMENTATION"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            with self.wrap_databases(timings):
+                response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        self.finish(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            with self.wrap_databases(timings):
+                response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        self.finish(request, response, timings)
+        return response
+
+    def wrap_databases(self, timings):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings.record_query))
+        return stack
+
+    def finish(self, request, response, timings):
+        total = time.perf_counter() - timings.start
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+
+        metrics = [
+            f"{phase};dur={duration * 1e3:.2f}"
+            for phase, duration in timings.durations.items()
+        ]
+        metrics[PHASES.index("db")] += f';desc="{timings.queries} queries"'
+        metrics.append(f"total;dur={total * 1e3:.2f}")
+        response["Server-Timing"] = ", ".join(metrics)
+        logger.info(
+            "view=%s method=%s status=%s total_ms=%.2f queries=%d %s",
+            view,
+            request.method,
+            response.status_code,
+            total * 1e3,
+            timings.queries,
+            " ".join(
+                f"{phase}_ms={duration * 1e3:.2f}"
+                for phase, duration in timings.durations.items()
+            ),
+            extra={
+                "view": view,
+                "method": request.method,
+                "status": response.status_code,
+                "total": total,
+                "queries": timings.queries,
+                "durations": timings.durations,
+            },
+        )
+        budget = get_query_budget(match)
+        if budget is not None and timings.queries > budget:
+            logger.warning(
+                "view=%s exceeded its query budget: %d queries, budget %d",
+                view,
+                timings.queries,
+                budget,
+                extra={"view": view, "queries": timings.queries, "budget": budget},
+            )
+        REQUEST_DURATION.observe(total, view, request.method)
+        QUERY_COUNT.observe(timings.queries, view)
+        for phase, duration in timings.durations.items():
+            PHASE_DURATION.observe(duration, view, phase)
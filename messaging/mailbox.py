@@ -0,0 +1,231 @@
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import MailboxCounter, Message
+from .routers import pin_to_primary
+from .serializers import MessageRowSerializer, MessageSerializer
+
+
+class MailboxQuerysetMixin:
+    """
+    Querysets of the ``sent`` and ``received`` streams listed by a mailbox view.
+
+    Clients can restrict the listing to one of the streams with the ``direction``
+    query parameter, and to some of the fields of the messages with the ``fields``
+    query parameter (see ``MessageSerializer.parse_fields``).
+    """
+
+    directions = ("sent", "received")
+    direction_query_param = "direction"
+    fields_query_param = "fields"
+    unread_only = False
+
+    def get_fields(self, request):
+        """
+        Return the list of requested fields, or None for all the fields.
+        """
+        return MessageSerializer.parse_fields(request.GET.get(self.fields_query_param))
+
+    def get_columns(self, request):
+        """
+        Return the columns read from the database to list the requested fields.
+        """
+        return MessageRowSerializer.get_columns(self.get_fields(request))
+
+    def get_sent_queryset(self, user):
+        queryset = Message.objects.filter(sender=user)
+        return queryset.filter(is_read=False) if self.unread_only else queryset
+
+    def get_received_queryset(self, user):
+        queryset = Message.objects.filter(receiver=user)
+        return queryset.filter(is_read=False) if self.unread_only else queryset
+
+    def get_directions(self, request):
+        direction = request.GET.get(self.direction_query_param)
+        if direction is None:
+            return self.directions
+        if direction not in self.directions:
+            raise ValidationError(
+                {
+                    self.direction_query_param: (
+                        f"Unknown direction, expected one of {list(self.directions)}."
+                    )
+                }
+            )
+        return (direction,)
+
+    def get_mailbox_querysets(self, request):
+        """
+        Return a mapping of stream name to the queryset of the requested streams.
+        """
+        getters = {
+            "sent": self.get_sent_queryset,
+            "received": self.get_received_queryset,
+        }
+        return {
+            direction: getters[direction](request.user)
+            for direction in self.get_directions(request)
+        }
+
+
+def get_unread_count(user):
+    """
+    Return the number of unread messages received by the user.
+    """
+    count = (
+        MailboxCounter.objects.filter(user=user)
+        .values_list("unread_count", flat=True)
+        .first()
+    )
+    return count or 0
+
+
+def get_mailbox_state(user):
+    """
+    Return the MailboxCounter of the user.
+
+    An unsaved counter at version 0 is returned if the user has no counter yet.
+    """
+    state = MailboxCounter.objects.filter(user=user).first()
+    return state or MailboxCounter(user=user)
+
+
+async def aget_mailbox_state(user):
+    """
+    Asynchronous version of ``get_mailbox_state``.
+    """
+    state = await MailboxCounter.objects.filter(user=user).afirst()
+    return state or MailboxCounter(user=user)
+
+
+def record_mailbox_changes(user_ids=(), unread_deltas=None):
+    """
+    Record a change to the mailboxes of several users.
+
+    The version of every mailbox is incremented and the given deltas are atomically
+    added to the unread counters. Users sharing the same delta are updated with a
+    single UPDATE. Counters that do not exist yet are created from the messages, so
+    this must be called after the change has been written, in the same transaction.
+
+    Once the transaction is committed, the users are pinned to the primary database
+    for a while, so that they read the change even if the replicas lag behind.
+
+    Args:
+        user_ids: The ids of the users whose sent or received messages changed.
+        unread_deltas: A mapping of user id to the change of its unread count.
+    """
+    unread_deltas = unread_deltas or {}
+    by_delta = defaultdict(set)
+    all_ids = set(user_ids) | set(unread_deltas)
+    for user_id in all_ids:
+        by_delta[unread_deltas.get(user_id, 0)].add(user_id)
+    transaction.on_commit(partial(pin_to_primary, all_ids))
+
+    now = timezone.now()
+    for delta, ids in by_delta.items():
+        counters = MailboxCounter.objects.filter(user_id__in=ids)
+        updated = counters.update(
+            unread_count=F("unread_count") + delta,
+            version=F("version") + 1,
+            last_modified=now,
+        )
+        if updated < len(ids):
+            # The change has already been written, so counting the messages of the
+            # users without a counter yields their up to date value.
+            missing = ids - set(counters.values_list("user_id", flat=True))
+            rebuild_unread_counts(missing)
+
+
+def count_unread_by_receiver(queryset):
+    """
+    Return a mapping of receiver id to the number of unread messages in the queryset.
+    """
+    return dict(
+        queryset.filter(is_read=False)
+        .order_by()
+        .values("receiver")
+        .annotate(count=Count("pk"))
+        .values_list("receiver", "count")
+    )
+
+
+def summarize_messages(queryset):
+    """
+    Return the users and threads affected by a change to the messages of the queryset.
+
+    Returns:
+        A ``(user_ids, unread_by_receiver, unread_by_thread)`` tuple: the ids of every
+        sender and receiver of the messages, the number of unread messages per
+        receiver, and per ``(thread_id, receiver_id)``.
+    """
+    user_ids = set()
+    unread_by_receiver = defaultdict(int)
+    unread_by_thread = defaultdict(int)
+    rows = (
+        queryset.order_by()
+        .values("sender", "receiver", "thread")
+        .annotate(unread=Count("pk", filter=Q(is_read=False)))
+        .values_list("sender", "receiver", "thread", "unread")
+    )
+    for sender_id, receiver_id, thread_id, unread in rows:
+        user_ids.update((sender_id, receiver_id))
+        if unread:
+            unread_by_receiver[receiver_id] += unread
+            unread_by_thread[thread_id, receiver_id] += unread
+    return user_ids, dict(unread_by_receiver), dict(unread_by_thread)
+
+
+def rebuild_unread_counts(user_ids=None):
+    """
+    Recompute the unread counters from the messages.
+
+    Counters created by the rebuild start at version 1, so that they never match a
+    version computed while they did not exist.
+
+    Args:
+        user_ids: Restrict the rebuild to these users. All counters are rebuilt if None.
+
+    Returns:
+        The number of counters created or corrected.
+    """
+    messages = Message.objects.all()
+    counters = MailboxCounter.objects.all()
+    if user_ids is not None:
+        messages = messages.filter(receiver__in=user_ids)
+        counters = counters.filter(user__in=user_ids)
+
+    now = timezone.now()
+    with transaction.atomic():
+        counts = count_unread_by_receiver(messages)
+        changed = (
+            counters.exclude(user__in=list(counts))
+            .exclude(unread_count=0)
+            .update(unread_count=0)
+        )
+        if user_ids is not None:
+            counts = {user_id: counts.get(user_id, 0) for user_id in user_ids}
+        current = dict(
+            counters.filter(user__in=list(counts)).values_list("user", "unread_count")
+        )
+        stale = {
+            user_id: count
+            for user_id, count in counts.items()
+            if current.get(user_id) != count
+        }
+        MailboxCounter.objects.bulk_create(
+            [
+                MailboxCounter(
+                    user_id=user_id, unread_count=count, version=1, last_modified=now
+                )
+                for user_id, count in stale.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["unread_count"],
+        )
+    return changed + len(stale)
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from messaging.services import drain_outbox
+
+
+class Command(BaseCommand):
+    """
+    Send the messages queued by the send endpoints in asynchronous send mode.
+
+    Each batch is sent in its own transaction with ``bulk_create``. By default the
+    command exits once the outbox is empty, so it can run from a scheduler; with
+    ``--loop`` it keeps polling the outbox, as a long running worker.
+    """
+
+    help = "Send the messages queued in the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Number of messages sent per transaction.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox once it is empty.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds between two polls of an empty outbox, with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        sent = 0
+        try:
+            while True:
+                count = drain_outbox(options["batch_size"])
+                sent += count
+                if count:
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} queued messages."))
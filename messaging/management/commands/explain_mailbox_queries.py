@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.query import RawQuerySet
+from django.test import RequestFactory
+
+from messaging.models import Message
+from messaging.services import get_read_message_query
+from messaging.views import UnreadMessagesListView, UserMessagesListView
+
+
+class Command(BaseCommand):
+    """
+    Print the query plan of every query run by the mailbox list views.
+
+    The plans are printed for the single query fetching the pages of both streams,
+    and for the first page and a page reached through a cursor of each stream, so a
+    missing or unused index shows up as a sequential scan or an explicit sort in the
+    output. On PostgreSQL, the statement fetching and marking a message as read is
+    explained on the last message received by the user; with ``--analyze`` its
+    update is rolled back.
+    """
+
+    help = "Print EXPLAIN plans for the queries run by the messaging views."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            help="Username of the mailbox to explain. Defaults to the first user.",
+        )
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run EXPLAIN ANALYZE (PostgreSQL only).",
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["user"])
+        explain_options = {}
+        if options["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyze is only supported on PostgreSQL.")
+            explain_options = {"analyze": True, "buffers": True}
+
+        for name, queryset in self.get_querysets(user):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(str(queryset.query))
+            if isinstance(queryset, RawQuerySet):
+                self.stdout.write(self.explain_raw(queryset, explain_options))
+            else:
+                self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
+
+    def explain_raw(self, queryset, explain_options):
+        prefix = connection.ops.explain_query_prefix(**explain_options)
+        # EXPLAIN ANALYZE runs the statement, which may write.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {queryset.raw_query}", queryset.params)
+            transaction.set_rollback(True)
+            return "\n".join(" ".join(map(str, row)) for row in cursor.fetchall())
+
+    def get_user(self, username):
+        User = get_user_model()
+        users = User.objects.order_by("pk")
+        if username:
+            users = users.filter(username=username)
+        user = users.first()
+        if user is None:
+            raise CommandError("No matching user found.")
+        return user
+
+    def get_querysets(self, user):
+        """
+        Yield ``(name, queryset)`` pairs for each query shape used by the views.
+        """
+        for view_class in (UserMessagesListView, UnreadMessagesListView):
+            view = view_class()
+            paginator = view.paginator
+
+            request = RequestFactory().get("/")
+            request.user = user
+            rows, _ = paginator.get_union_rows(
+                view.get_mailbox_querysets(request),
+                request,
+                view.get_columns(request),
+            )
+            yield f"{view_class.__name__}, single query", rows
+
+            streams = (
+                ("sent", view.get_sent_queryset(user)),
+                ("received", view.get_received_queryset(user)),
+            )
+            for stream, queryset in streams:
+                queryset = queryset.order_by(*paginator.ordering)
+                name = f"{view_class.__name__} ({stream})"
+                yield f"{name}, first page", queryset[: paginator.page_size + 1]
+
+                last = queryset.first()
+                if last is not None:
+                    position = (last.creation_date, last.pk)
+                    yield f"{name}, next page", paginator.filter_after(
+                        queryset, position
+                    )[: paginator.page_size + 1]
+
+        yield "ReadMessageView", Message.objects.filter(pk=0)
+        if connection.vendor == "postgresql":
+            last = user.received_messages.order_by("-pk").first()
+            yield "ReadMessageView, fetch and mark", get_read_message_query(
+                user, last.pk if last else 0, connection.alias
+            )
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+from django.utils import timezone
+
+from messaging.conf import get_setting
+from messaging.models import Message
+from messaging.partitions import (
+    add_months,
+    create_partitions,
+    is_partitioned,
+    month_start,
+    partition_messages_table,
+)
+from messaging.services import archive_messages
+
+
+class Command(BaseCommand):
+    """
+    Maintain the monthly partitions of the messages and archive the old messages.
+
+    On PostgreSQL, ``--setup`` converts the messages table to a table partitioned by
+    month of creation, once. Every run then creates the partitions of the upcoming
+    months, and moves the months older than ``--archive-after`` to the archive,
+    detaching and dropping their partitions, so the indexes of the recent messages
+    stay small. Run it from a scheduler, at least monthly.
+
+    The other databases cannot be partitioned; the command only archives the old
+    messages there.
+    """
+
+    help = "Create the upcoming partitions of the messages and archive the old ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--setup",
+            action="store_true",
+            help="Convert the messages table to a partitioned table (PostgreSQL).",
+        )
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="Number of months after the current one to create partitions for.",
+        )
+        parser.add_argument(
+            "--archive-after",
+            type=int,
+            default=None,
+            help=(
+                "Archive the messages older than this number of months. Defaults to "
+                "the ARCHIVE_AFTER_MONTHS setting; nothing is archived if unset."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[router.db_for_write(Message)]
+        month = month_start(timezone.now())
+
+        if options["setup"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("Partitioning requires PostgreSQL.")
+            if is_partitioned(connection):
+                self.stdout.write("The messages table is already partitioned.")
+            else:
+                count = partition_messages_table(connection, options["months_ahead"])
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Partitioned the messages table into {count} partitions."
+                    )
+                )
+
+        if is_partitioned(connection):
+            created = create_partitions(
+                connection, month, add_months(month, options["months_ahead"])
+            )
+            self.stdout.write(self.style.SUCCESS(f"Created {len(created)} partitions."))
+
+        archive_after = options["archive_after"]
+        if archive_after is None:
+            archive_after = get_setting("ARCHIVE_AFTER_MONTHS")
+        if archive_after is not None:
+            archived = archive_messages(add_months(month, -archive_after))
+            self.stdout.write(self.style.SUCCESS(f"Archived {archived} messages."))
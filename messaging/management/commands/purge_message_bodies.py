@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from messaging.services import delete_unused_bodies
+
+
+class Command(BaseCommand):
+    """
+    Delete the message bodies left unused by deleted messages.
+
+    Messages share their bodies, so deleting a message keeps its body, which may be
+    used by other messages. Run this command from a scheduler; it skips the bodies
+    of the sends in progress.
+    """
+
+    help = "Delete the message bodies no longer used by any message."
+
+    def handle(self, *args, **options):
+        deleted = delete_unused_bodies()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unused bodies."))
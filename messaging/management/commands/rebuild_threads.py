@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from messaging.threads import rebuild_threads
+
+
+class Command(BaseCommand):
+    """
+    Assign their thread to the messages without one and recompute the state of the
+    threads from the messages.
+
+    The threads are maintained by the API, but messages written outside of it (admin,
+    shell, raw SQL) have no thread and make the unread counts drift.
+    """
+
+    help = "Rebuild the conversation threads and their unread counts."
+
+    def handle(self, *args, **options):
+        assigned = rebuild_threads()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt threads ({assigned} messages assigned).")
+        )
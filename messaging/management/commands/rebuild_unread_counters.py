@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from messaging.mailbox import rebuild_unread_counts
+from messaging.threads import rebuild_thread_unread_counts
+
+
+class Command(BaseCommand):
+    """
+    Recompute the unread counters of the mailboxes and of the threads from the
+    messages.
+
+    The counters are maintained by the API, but writes made outside of it (admin,
+    shell, raw SQL) make them drift. Running this command brings them back in sync.
+    Messages without a thread are only counted in the mailboxes: run
+    ``rebuild_threads`` to assign them their thread.
+    """
+
+    help = "Rebuild the per-user and per-thread unread message counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user-id",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Only rebuild the counters of this user. Can be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            mailboxes = rebuild_unread_counts(options["user_ids"])
+            threads = rebuild_thread_unread_counts(options["user_ids"])
+        if not mailboxes and not threads:
+            self.stdout.write("The unread counters are up to date.")
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Corrected {mailboxes} mailbox and {threads} thread unread counters."
+            )
+        )
@@ -0,0 +1,119 @@
+import random
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging.models import Message
+from messaging.services import create_messages
+
+# Vocabulary of the generated messages.
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua report meeting invoice project "
+    "schedule update review budget deadline team release customer order payment"
+).split()
+
+
+class Command(BaseCommand):
+    """
+    Seed the database with users exchanging messages, for load tests and benchmarks.
+
+    Real mailboxes are skewed: a few users send and receive most of the messages.
+    The senders and the receivers are drawn from a Zipf distribution over the users,
+    so the first users get large mailboxes and most users small ones. The messages
+    are inserted with ``create_messages``, so the counters and the threads are
+    consistent with the messages.
+    """
+
+    help = "Create users and messages with a skewed distribution."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--messages", type=int, default=10000)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Exponent of the Zipf distribution of the users (0 is uniform).",
+        )
+        parser.add_argument(
+            "--read-ratio",
+            type=float,
+            default=0.7,
+            help="Fraction of the messages that are already read.",
+        )
+        parser.add_argument("--prefix", default="seed-user-")
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["users"] < 2:
+            raise CommandError("At least 2 users are needed to exchange messages.")
+        rng = random.Random(options["seed"])
+        user_ids = self.create_users(
+            options["prefix"], options["users"], options["password"]
+        )
+        # Cumulative weights of the users, the most active first.
+        weights = list(
+            accumulate(
+                1 / (rank ** options["skew"]) for rank in range(1, len(user_ids) + 1)
+            )
+        )
+
+        remaining = options["messages"]
+        while remaining:
+            batch = []
+            for index in range(min(options["batch_size"], remaining)):
+                sender_id, receiver_id = rng.choices(user_ids, cum_weights=weights, k=2)
+                while receiver_id == sender_id:
+                    receiver_id = rng.choices(user_ids, cum_weights=weights)[0]
+                batch.append(
+                    Message(
+                        sender_id=sender_id,
+                        receiver_id=receiver_id,
+                        subject=f"Subject {remaining - index}",
+                        message=" ".join(rng.choices(WORDS, k=rng.randint(5, 80))),
+                        is_read=rng.random() < options["read_ratio"],
+                    )
+                )
+            create_messages(batch, options["batch_size"])
+            remaining -= len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {options['messages']} messages between "
+                f"{len(user_ids)} users."
+            )
+        )
+
+    def create_users(self, prefix, count, password):
+        """
+        Create the missing users ``<prefix>0`` to ``<prefix><count - 1>``.
+
+        Returns:
+            The ids of the users, in order.
+        """
+        User = get_user_model()
+        usernames = [f"{prefix}{index}" for index in range(count)]
+        existing = set(
+            User.objects.filter(username__in=usernames).values_list(
+                "username", flat=True
+            )
+        )
+        # Hash the password once: hashing it for each user would dominate the run.
+        password = make_password(password)
+        User.objects.bulk_create(
+            [
+                User(username=username, password=password)
+                for username in usernames
+                if username not in existing
+            ],
+            batch_size=1000,
+        )
+        ids = dict(
+            User.objects.filter(username__in=usernames).values_list("username", "pk")
+        )
+        return [ids[username] for username in usernames]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_unread_counts(apps, schema_editor):
+    Message = apps.get_model("messaging", "Message")
+    MailboxCounter = apps.get_model("messaging", "MailboxCounter")
+    counts = (
+        Message.objects.filter(is_read=False)
+        .order_by()
+        .values("receiver")
+        .annotate(count=Count("pk"))
+        .values_list("receiver", "count")
+    )
+    MailboxCounter.objects.bulk_create(
+        [
+            MailboxCounter(user_id=user_id, unread_count=count)
+            for user_id, count in counts
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0002_message_mailbox_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailboxCounter",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="mailbox_counter",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("unread_count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
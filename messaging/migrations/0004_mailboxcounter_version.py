@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0003_mailboxcounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailboxcounter",
+            name="last_modified",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="mailboxcounter",
+            name="version",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,175 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest, Least
+
+
+def backfill_threads(apps, schema_editor):
+    Message = apps.get_model("messaging", "Message")
+    Thread = apps.get_model("messaging", "Thread")
+    ThreadMembership = apps.get_model("messaging", "ThreadMembership")
+
+    pairs = Message.objects.order_by().values_list("sender", "receiver").distinct()
+    keys = {(min(pair), max(pair)) for pair in pairs}
+    Thread.objects.bulk_create(
+        [Thread(user_low_id=low, user_high_id=high) for low, high in keys],
+        batch_size=1000,
+    )
+    Message.objects.update(
+        thread=Subquery(
+            Thread.objects.filter(
+                user_low=Least(OuterRef("sender"), OuterRef("receiver")),
+                user_high=Greatest(OuterRef("sender"), OuterRef("receiver")),
+            ).values("pk")[:1]
+        )
+    )
+    Thread.objects.update(
+        last_message_at=Subquery(
+            Message.objects.filter(thread=OuterRef("pk"))
+            .order_by("-creation_date")
+            .values("creation_date")[:1]
+        )
+    )
+    ThreadMembership.objects.bulk_create(
+        [
+            ThreadMembership(
+                thread_id=thread_id, user_id=user_id, last_message_at=last_message_at
+            )
+            for thread_id, low, high, last_message_at in Thread.objects.values_list(
+                "pk", "user_low", "user_high", "last_message_at"
+            ).iterator()
+            for user_id in {low, high}
+        ],
+        batch_size=1000,
+    )
+    ThreadMembership.objects.update(
+        unread_count=Coalesce(
+            Subquery(
+                Message.objects.filter(
+                    thread=OuterRef("thread"), receiver=OuterRef("user"), is_read=False
+                )
+                .order_by()
+                .values("thread")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0004_mailboxcounter_version"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThreadMembership",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("unread_count", models.IntegerField(default=0)),
+                ("last_message_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Thread",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_message_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user_high",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user_low",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="thread",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="messages",
+                to="messaging.thread",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["thread", "-creation_date", "-id"],
+                name="message_thread_date_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="threadmembership",
+            name="thread",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="memberships",
+                to="messaging.thread",
+            ),
+        ),
+        migrations.AddField(
+            model_name="threadmembership",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="thread_memberships",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="thread",
+            constraint=models.UniqueConstraint(
+                fields=("user_low", "user_high"), name="thread_participants_unique"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="threadmembership",
+            index=models.Index(
+                fields=["user", "-last_message_at", "-id"],
+                name="membership_activity_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="threadmembership",
+            constraint=models.UniqueConstraint(
+                fields=("thread", "user"), name="thread_membership_unique"
+            ),
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:37
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The text search configuration must match messaging.search.SEARCH_CONFIG.
+CREATE_SEARCH_VECTOR = """
+CREATE FUNCTION messaging_message_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.subject, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.message, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER messaging_message_search_vector
+BEFORE INSERT OR UPDATE OF subject, message ON messaging_message
+FOR EACH ROW EXECUTE FUNCTION messaging_message_search_vector();
+
+UPDATE messaging_message SET search_vector =
+    setweight(to_tsvector('simple', coalesce(subject, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(message, '')), 'B');
+
+CREATE INDEX message_search_vector_idx ON messaging_message
+USING gin (search_vector);
+"""
+
+DROP_SEARCH_VECTOR = """
+DROP INDEX IF EXISTS message_search_vector_idx;
+DROP TRIGGER IF EXISTS messaging_message_search_vector ON messaging_message;
+DROP FUNCTION IF EXISTS messaging_message_search_vector();
+"""
+
+
+def create_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_SEARCH_VECTOR)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SEARCH_VECTOR)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0005_threads"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,60 @@
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0008_archivedmessage"),
+    ]
+
+    operations = [
+        # The message column is dropped by migration 0011, once copied to the bodies.
+        migrations.AlterField(
+            model_name="message",
+            name="message",
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="archivedmessage",
+            name="message",
+            field=models.TextField(null=True),
+        ),
+        migrations.CreateModel(
+            name="MessageBody",
+            fields=[
+                (
+                    "digest",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("text", models.TextField(blank=True, null=True)),
+                ("compressed_text", models.BinaryField(blank=True, null=True)),
+                (
+                    "search_vector",
+                    django.contrib.postgres.search.SearchVectorField(
+                        editable=False, null=True
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="body",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="messaging.messagebody",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedmessage",
+            name="body",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="messaging.messagebody",
+            ),
+        ),
+    ]
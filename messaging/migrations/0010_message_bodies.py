@@ -0,0 +1,137 @@
+import hashlib
+import zlib
+from collections import defaultdict
+
+from django.db import migrations
+
+# The bodies of the existing messages are stored uncompressed on PostgreSQL, which
+# compresses long values itself (TOAST), so they can be built with set-based queries.
+# The digests must match MessageBody.from_text.
+COPY_BODIES = """
+SET CONSTRAINTS ALL IMMEDIATE;
+
+INSERT INTO messaging_messagebody (digest, text, search_vector)
+SELECT DISTINCT ON (digest)
+    digest, message, setweight(to_tsvector('simple', message), 'B')
+FROM (
+    SELECT encode(sha256(convert_to(message, 'UTF8')), 'hex') AS digest, message
+    FROM messaging_message
+    UNION ALL
+    SELECT encode(sha256(convert_to(message, 'UTF8')), 'hex') AS digest, message
+    FROM messaging_archivedmessage
+) AS bodies
+ON CONFLICT (digest) DO NOTHING;
+
+UPDATE messaging_message
+SET body_id = encode(sha256(convert_to(message, 'UTF8')), 'hex');
+UPDATE messaging_archivedmessage
+SET body_id = encode(sha256(convert_to(message, 'UTF8')), 'hex');
+"""
+
+# The search trigger of migration 0006, reading the words of the message from its
+# body. The text search configuration must match messaging.search.SEARCH_CONFIG.
+CREATE_SEARCH_VECTOR = """
+CREATE OR REPLACE FUNCTION messaging_message_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.subject, '')), 'A') ||
+        coalesce(
+            (SELECT search_vector FROM messaging_messagebody
+             WHERE digest = NEW.body_id),
+            ''::tsvector
+        );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS messaging_message_search_vector ON messaging_message;
+CREATE TRIGGER messaging_message_search_vector
+BEFORE INSERT OR UPDATE OF subject, body_id ON messaging_message
+FOR EACH ROW EXECUTE FUNCTION messaging_message_search_vector();
+"""
+
+# Migration 0006 trigger, reading the words of the message column.
+DROP_SEARCH_VECTOR = """
+CREATE OR REPLACE FUNCTION messaging_message_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.subject, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.message, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS messaging_message_search_vector ON messaging_message;
+CREATE TRIGGER messaging_message_search_vector
+BEFORE INSERT OR UPDATE OF subject, message ON messaging_message
+FOR EACH ROW EXECUTE FUNCTION messaging_message_search_vector();
+"""
+
+BATCH_SIZE = 1000
+COMPRESSION_THRESHOLD = 1024
+
+
+def encode_body(text):
+    """
+    Return the ``(digest, text, compressed_text)`` of a body, like
+    MessageBody.from_text with the default compression threshold.
+    """
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    if len(data) > COMPRESSION_THRESHOLD:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            return digest, None, compressed
+    return digest, text, None
+
+
+def copy_bodies(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(COPY_BODIES)
+        schema_editor.execute(CREATE_SEARCH_VECTOR)
+        return
+    MessageBody = apps.get_model("messaging", "MessageBody")
+    for model_name in ("Message", "ArchivedMessage"):
+        model = apps.get_model("messaging", model_name)
+        queryset = model.objects.order_by("pk").values_list("pk", "message")
+        last_pk = None
+        while True:
+            batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(batch[:BATCH_SIZE])
+            if not rows:
+                break
+            bodies, pks = {}, defaultdict(list)
+            for pk, text in rows:
+                digest, plain, compressed = encode_body(text)
+                bodies[digest] = MessageBody(
+                    digest=digest, text=plain, compressed_text=compressed
+                )
+                pks[digest].append(pk)
+            MessageBody.objects.bulk_create(bodies.values(), ignore_conflicts=True)
+            for digest, ids in pks.items():
+                model.objects.filter(pk__in=ids).update(body_id=digest)
+            last_pk = rows[-1][0]
+
+
+def restore_messages(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SEARCH_VECTOR)
+    MessageBody = apps.get_model("messaging", "MessageBody")
+    for body in MessageBody.objects.iterator():
+        if body.compressed_text is None:
+            text = body.text
+        else:
+            text = zlib.decompress(body.compressed_text).decode("utf-8")
+        for model_name in ("Message", "ArchivedMessage"):
+            model = apps.get_model("messaging", model_name)
+            model.objects.filter(body_id=body.digest).update(message=text)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0009_messagebody"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_bodies, restore_messages),
+    ]
@@ -0,0 +1,37 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0010_message_bodies"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="message",
+            name="message",
+        ),
+        migrations.RemoveField(
+            model_name="archivedmessage",
+            name="message",
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="body",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="messaging.messagebody",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="archivedmessage",
+            name="body",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="messaging.messagebody",
+            ),
+        ),
+    ]
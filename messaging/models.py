@@ -1,21 +1,278 @@
+import hashlib
+import zlib
+
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connections, models, router, transaction
+from django.db.models import Value
 from django.forms import ValidationError
 
+from .conf import get_setting
+from .search import SEARCH_CONFIG
+
+
+class Thread(models.Model):
+    """
+    A conversation between two users, holding the messages they exchanged.
+
+    The participants are stored ordered by id, so each pair of users has a single
+    thread. A user writing to themself has a thread with the same user on both sides.
+
+    Attributes:
+        user_low (User): The participant with the lowest id.
+        user_high (User): The participant with the highest id.
+        created_at (datetime): The date and time when the thread was created.
+        last_message_at (datetime): The date and time of the last message.
+    """
+
+    user_low = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="+", on_delete=models.CASCADE
+    )
+    user_high = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="+", on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_low", "user_high"], name="thread_participants_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Thread between {self.user_low_id} and {self.user_high_id}"
+
+    @staticmethod
+    def get_key(user_id, other_user_id):
+        """
+        Return the ``(user_low_id, user_high_id)`` key of the thread of two users.
+        """
+        return min(user_id, other_user_id), max(user_id, other_user_id)
+
+    @property
+    def participant_ids(self):
+        return sorted({self.user_low_id, self.user_high_id})
+
+
+class ThreadMembership(models.Model):
+    """
+    A participant of a thread, with the state of the thread seen by this user.
+
+    Listing the threads of a user by recent activity is an index scan over its
+    memberships, which carry a copy of the date of the last message of the thread.
+
+    Attributes:
+        thread (Thread): The thread.
+        user (User): The participant.
+        unread_count (int): The number of unread messages received by the user in the
+            thread.
+        last_message_at (datetime): The date and time of the last message of the thread.
+    """
+
+    thread = models.ForeignKey(
+        Thread, related_name="memberships", on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name="thread_memberships",
+        on_delete=models.CASCADE,
+    )
+    unread_count = models.IntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["thread", "user"], name="thread_membership_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-last_message_at", "-id"],
+                name="membership_activity_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} in {self.thread} - {self.unread_count} unread"
+
+
+# Conflicts with the FOR UPDATE lock and the DELETE of delete_unused_bodies, not
+# with the other senders.
+LOCK_BODIES_SQL = "SELECT digest FROM {table} WHERE digest = ANY(%s) FOR KEY SHARE"
+
+
+class MessageBody(models.Model):
+    """
+    The body of one or several messages, stored once per distinct text.
+
+    Bodies are keyed by the SHA-256 digest of their text, so the same message sent to
+    thousands of users is stored once, and the message rows only hold the digest.
+    Texts longer than the ``BODY_COMPRESSION_THRESHOLD`` setting are compressed with
+    zlib when that makes them smaller.
+
+    Attributes:
+        digest (str): The hexadecimal SHA-256 digest of the UTF-8 text.
+        text (str): The text, if it is not compressed.
+        compressed_text (bytes): The zlib compressed UTF-8 text, if it is compressed.
+        search_vector (SearchVector): The words of the text, with weight B, computed
+            when the body is stored on PostgreSQL. The search trigger of the messages
+            combines it with the words of their subject, see migration 0010.
+    """
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    text = models.TextField(null=True, blank=True)
+    compressed_text = models.BinaryField(null=True, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    def __str__(self):
+        return f"Message body {self.digest}"
+
+    @staticmethod
+    def decode(text, compressed_text):
+        """
+        Return the text of a body from its ``text`` and ``compressed_text`` columns.
+        """
+        if compressed_text is None:
+            return text
+        return zlib.decompress(bytes(compressed_text)).decode("utf-8")
+
+    def get_text(self):
+        return self.decode(self.text, self.compressed_text)
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Return the unsaved body of a text, compressed if it is long enough.
+        """
+        data = text.encode("utf-8")
+        body = cls(digest=hashlib.sha256(data).hexdigest())
+        if len(data) > get_setting("BODY_COMPRESSION_THRESHOLD"):
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                body.compressed_text = compressed
+                return body
+        body.text = text
+        return body
+
+    @classmethod
+    def store(cls, texts):
+        """
+        Insert the bodies of the given texts that do not exist yet, with one query.
+
+        On PostgreSQL, the bodies are then locked with ``FOR KEY SHARE`` until the end
+        of the transaction, so ``delete_unused_bodies`` skips the bodies about to be
+        used by the messages of the transaction. The bodies deleted between their
+        insert and their lock are inserted again.
+
+        Must be called in a transaction.
+
+        Returns:
+            A mapping of text to the digest of its body.
+        """
+        bodies = {text: cls.from_text(text) for text in set(texts)}
+        connection = connections[router.db_for_write(cls)]
+        if connection.vendor == "postgresql":
+            for text, body in bodies.items():
+                body.search_vector = SearchVector(
+                    Value(text), config=SEARCH_CONFIG, weight="B"
+                )
+        missing = bodies
+        while missing:
+            cls.objects.bulk_create(missing.values(), ignore_conflicts=True)
+            if connection.vendor != "postgresql":
+                break
+            locked = cls.lock(connection, [body.pk for body in missing.values()])
+            missing = {
+                text: body for text, body in missing.items() if body.pk not in locked
+            }
+        return {text: body.pk for text, body in bodies.items()}
+
+    @classmethod
+    def lock(cls, connection, digests):
+        """
+        Lock the bodies of the given digests against deletion, on PostgreSQL.
+
+        Returns:
+            The set of the digests of the locked bodies, which still exist.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                LOCK_BODIES_SQL.format(
+                    table=connection.ops.quote_name(cls._meta.db_table)
+                ),
+                [digests],
+            )
+            return {digest for (digest,) in cursor.fetchall()}
+
+    @classmethod
+    def attach(cls, messages):
+        """
+        Store the bodies of unsaved messages and set their ``body`` foreign key.
+        """
+        pending = [message for message in messages if message.body_id is None]
+        digests = cls.store(message._message for message in pending)
+        for message in pending:
+            message.body_id = digests[message._message]
+
+
+class MessageBodyMixin:
+    """
+    The text of the ``body`` of a message, as its ``message`` attribute.
+
+    The text is read from the body the first time it is accessed, which costs a
+    query unless the body was fetched with ``select_related``. Setting the text
+    detaches the message from its body; a new body is stored on save.
+    """
+
+    _message = None
+
+    @property
+    def message(self):
+        if self._message is None:
+            self._message = self.body.get_text()
+        return self._message
+
+    @message.setter
+    def message(self, value):
+        self._message = value
+        self.body_id = None
 
-class Message(models.Model):
+    def save(self, *args, **kwargs):
+        if self.body_id is None and self._message is not None:
+            with transaction.atomic(using=router.db_for_write(MessageBody)):
+                MessageBody.attach([self])
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+
+
+class Message(MessageBodyMixin, models.Model):
     """
     Represents a message sent between users.
 
     Attributes:
+        thread (Thread): The conversation between the sender and the receiver.
         sender (User): The user who sent the message.
         receiver (User): The user who received the message.
         subject (str): The subject of the message.
-        message (str): The content of the message.
+        body (MessageBody): The content of the message, shared with the messages of
+            the same content. Read and written through the ``message`` attribute.
         creation_date (datetime): The date and time when the message was created.
         is_read (bool): Indicates whether the message has been read or not.
+        search_vector (SearchVector): The words of the subject and the message, used by
+            the full-text search on PostgreSQL.
     """
 
+    thread = models.ForeignKey(
+        Thread,
+        related_name="messages",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
     sender = models.ForeignKey(
         settings.AUTH_USER_MODEL, related_name="sent_messages", on_delete=models.CASCADE
     )
@@ -25,15 +282,38 @@ class Message(models.Model):
         on_delete=models.CASCADE,
     )
     subject = models.CharField(max_length=255, blank=False)
-    message = models.TextField(blank=False)
+    body = models.ForeignKey(MessageBody, related_name="+", on_delete=models.PROTECT)
     creation_date = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    # Maintained by a trigger and indexed with GIN on PostgreSQL, see migrations 0006
+    # and 0010.
+    # Always empty on the other databases, which search with a fallback.
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return f"Message from {self.sender} to {self.receiver} - {self.subject}"
 
     class Meta:
         ordering = ["-creation_date"]
+        indexes = [
+            models.Index(
+                fields=["receiver", "-creation_date", "-id"],
+                name="message_receiver_date_idx",
+            ),
+            models.Index(
+                fields=["sender", "-creation_date", "-id"],
+                name="message_sender_date_idx",
+            ),
+            models.Index(
+                fields=["receiver", "-creation_date", "-id"],
+                condition=models.Q(is_read=False),
+                name="message_receiver_unread_idx",
+            ),
+            models.Index(
+                fields=["thread", "-creation_date", "-id"],
+                name="message_thread_date_idx",
+            ),
+        ]
 
     def clean(self):
         self.subject = self.subject.strip()
@@ -49,3 +329,114 @@ class Message(models.Model):
             )
 
         super().clean()
+
+
+class ArchivedMessage(MessageBodyMixin, models.Model):
+    """
+    A message moved out of the ``Message`` table by the ``partition_messages``
+    command, once older than the ``ARCHIVE_AFTER_MONTHS`` setting.
+
+    Archived messages keep their id, so the read endpoints serve them transparently,
+    with a second lookup when the message is not found in ``Message``. They are no
+    longer listed, searched, counted as unread or marked as read, and the API cannot
+    delete them: they are only managed in the admin. The export includes them.
+
+    Attributes:
+        thread (Thread): The conversation between the sender and the receiver.
+        sender (User): The user who sent the message.
+        receiver (User): The user who received the message.
+        subject (str): The subject of the message.
+        body (MessageBody): The content of the message.
+        creation_date (datetime): The date and time when the message was created.
+        is_read (bool): Whether the message had been read when it was archived.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    thread = models.ForeignKey(
+        Thread, related_name="+", null=True, blank=True, on_delete=models.CASCADE
+    )
+    sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="+", on_delete=models.CASCADE
+    )
+    receiver = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="+", on_delete=models.CASCADE
+    )
+    subject = models.CharField(max_length=255)
+    body = models.ForeignKey(MessageBody, related_name="+", on_delete=models.PROTECT)
+    creation_date = models.DateTimeField()
+    is_read = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Archived message from {self.sender_id} to {self.receiver_id}"
+
+
+class MailboxCounter(models.Model):
+    """
+    Denormalized counters of a user's mailbox.
+
+    The counters are maintained by the write paths of the messaging views, so reading
+    them costs a single primary key lookup. They can be rebuilt from the messages with
+    the ``rebuild_unread_counters`` management command if they ever drift.
+
+    Attributes:
+        user (User): The owner of the mailbox.
+        unread_count (int): The number of unread messages received by the user.
+        version (int): Incremented on every change to the messages sent or received
+            by the user. Used to answer conditional requests.
+        last_modified (datetime): The date and time of the last change to the mailbox.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        related_name="mailbox_counter",
+        on_delete=models.CASCADE,
+    )
+    unread_count = models.IntegerField(default=0)
+    version = models.BigIntegerField(default=0)
+    last_modified = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Mailbox of {self.user} - {self.unread_count} unread"
+
+
+class OutboxMessage(models.Model):
+    """
+    A validated message waiting to be sent by the ``drain_outbox`` worker.
+
+    When the ``ASYNC_SEND`` setting is enabled, the send endpoints only insert the
+    message in this table, a narrow table without secondary indexes, and answer
+    ``202 Accepted``. The worker moves the queued messages to ``Message`` in batches,
+    updating the counters and the threads like a bulk send.
+
+    Attributes:
+        sender (User): The user who sent the message.
+        receiver (User): The user who will receive the message.
+        subject (str): The subject of the message.
+        message (str): The content of the message.
+        queued_at (datetime): The date and time when the message was queued.
+    """
+
+    sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="+", on_delete=models.CASCADE
+    )
+    receiver = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="+", on_delete=models.CASCADE
+    )
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Queued message from {self.sender_id} to {self.receiver_id}"
+
+    def to_message(self):
+        """
+        Return the unsaved message to create from this queued message.
+        """
+        return Message(
+            sender_id=self.sender_id,
+            receiver_id=self.receiver_id,
+            subject=self.subject,
+            message=self.message,
+        )
@@ -0,0 +1,299 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import Q, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for message streams.
+
+    Pages are ordered by ``(-creation_date, -id)`` and the next page is fetched
+    with a ``WHERE creation_date <= last_date AND (creation_date < last_date OR id <
+    last_id)`` filter instead of an OFFSET. The first condition is a range on the
+    date the indexes can seek to, so the cost of a page does not depend on how deep
+    it is. Subclasses can paginate on another ``(date, id)`` pair by changing
+    ``ordering``.
+
+    A view can paginate several independent streams of the same request, each
+    stream reading its own cursor from the ``<prefix>_cursor`` query parameter.
+    ``paginate_querysets`` fetches the pages of all the streams in a single query, and
+    ``paginate_rows`` does the same for read-only rows instead of model instances.
+    """
+
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    cursor_query_param_suffix = "_cursor"
+    invalid_cursor_message = "Invalid cursor"
+    ordering = ("-creation_date", "-id")
+
+    def get_page_size(self, request):
+        """
+        Return the page size requested by the client, capped to ``max_page_size``.
+        """
+        try:
+            return _positive_int(
+                request.GET[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_cursor_query_param(self, prefix):
+        if not prefix:
+            return self.cursor_query_param
+        return f"{prefix}{self.cursor_query_param_suffix}"
+
+    def get_position_fields(self):
+        """
+        Return the names of the date and id fields of the ordering.
+        """
+        return tuple(field.lstrip("-") for field in self.ordering)
+
+    def encode_cursor(self, message):
+        """
+        Encode the position of the given message into an opaque cursor.
+        """
+        date_field, id_field = self.get_position_fields()
+        position = (
+            f"{getattr(message, date_field).isoformat()}|{getattr(message, id_field)}"
+        )
+        return urlsafe_b64encode(position.encode("ascii")).decode("ascii")
+
+    def decode_cursor(self, encoded):
+        """
+        Decode a cursor into a ``(date, id)`` tuple.
+
+        Raises:
+            NotFound: If the cursor cannot be decoded.
+        """
+        try:
+            position = urlsafe_b64decode(encoded.encode("ascii")).decode("ascii")
+            creation_date, pk = position.rsplit("|", 1)
+            return datetime.fromisoformat(creation_date), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def filter_after(self, queryset, position):
+        """
+        Restrict the queryset to the messages ordered after the given position.
+
+        The ``<=`` bound is implied by the other condition, but unlike it, it can be
+        used as the range of an index scan.
+        """
+        date, pk = position
+        date_field, id_field = self.get_position_fields()
+        return queryset.filter(
+            Q(**{f"{date_field}__lte": date}),
+            Q(**{f"{date_field}__lt": date}) | Q(**{f"{id_field}__lt": pk}),
+        )
+
+    def get_page_queryset(self, queryset, request, prefix=""):
+        """
+        Return the queryset of the requested page and the page size.
+
+        The returned queryset holds one extra row, used to know whether there is a
+        next page.
+        """
+        page_size = self.get_page_size(request)
+        encoded = request.GET.get(self.get_cursor_query_param(prefix))
+
+        queryset = queryset.order_by(*self.ordering)
+        if encoded:
+            queryset = self.filter_after(queryset, self.decode_cursor(encoded))
+        return queryset[: page_size + 1], page_size
+
+    def split_page(self, messages, page_size):
+        """
+        Split the rows fetched for a page into the page and the cursor of the next one.
+
+        The rows are messages or named tuples with ``id`` and ``creation_date``.
+        """
+        if len(messages) <= page_size:
+            return messages, None
+        messages = messages[:page_size]
+        return messages, self.encode_cursor(messages[-1])
+
+    def paginate_queryset(self, queryset, request, view=None, prefix=""):
+        """
+        Return a page of the queryset and the cursor of the next page.
+
+        Args:
+            queryset: The queryset of messages to paginate.
+            request: The incoming request, used to read the cursor and page size.
+            view: The view paginating the queryset.
+            prefix: The name of the stream, used to build the cursor query parameter.
+
+        Returns:
+            A ``(messages, next_cursor)`` tuple. ``next_cursor`` is None on the last page.
+        """
+        queryset, page_size = self.get_page_queryset(queryset, request, prefix)
+        return self.split_page(list(queryset), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None, prefix=""):
+        """
+        Asynchronous version of ``paginate_queryset``.
+        """
+        queryset, page_size = self.get_page_queryset(queryset, request, prefix)
+        return self.split_page([message async for message in queryset], page_size)
+
+    def get_union_query(self, querysets, request):
+        """
+        Build a ``UNION ALL`` of the pages of several streams.
+
+        Each page is wrapped in a derived table, so its ORDER BY and LIMIT apply on
+        every backend, and is tagged with the name of its stream in a ``stream`` column.
+
+        Args:
+            querysets: A mapping of stream name to queryset. Every queryset must be
+                on the same model and database.
+            request: The incoming request, used to read the cursors and page size.
+
+        Returns:
+            A ``(raw_queryset, page_size)`` tuple.
+        """
+        parts, params = [], []
+        page_size = self.get_page_size(request)
+        model = using = None
+        for prefix, queryset in querysets.items():
+            page, page_size = self.get_page_queryset(queryset, request, prefix)
+            page = page.annotate(stream=Value(prefix))
+            model, using = page.model, page.db
+            sql, page_params = page.query.get_compiler(using=using).as_sql()
+            parts.append(f"SELECT * FROM ({sql}) AS {prefix}_page")
+            params.extend(page_params)
+        return (
+            model._default_manager.raw(" UNION ALL ".join(parts), params, using=using),
+            page_size,
+        )
+
+    def split_streams(self, querysets, rows, page_size):
+        """
+        Group the rows of a union query by stream and split each one into a page.
+        """
+        by_stream = {prefix: [] for prefix in querysets}
+        for row in rows:
+            by_stream[row.stream].append(row)
+        pages = {}
+        for prefix, messages in by_stream.items():
+            # UNION ALL does not guarantee that the order of each branch is kept.
+            messages.sort(key=lambda m: (m.creation_date, m.id), reverse=True)
+            pages[prefix] = self.split_page(messages, page_size)
+        return pages
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+        Return a page of each of several querysets, fetched in one round trip.
+
+        Args:
+            querysets: A mapping of stream name to queryset. The names are also the
+                prefixes of the cursor query parameters.
+            request: The incoming request, used to read the cursors and page size.
+            view: The view paginating the querysets.
+
+        Returns:
+            A mapping of stream name to ``(messages, next_cursor)`` tuple.
+        """
+        if not querysets:
+            return {}
+        rows, page_size = self.get_union_query(querysets, request)
+        return self.split_streams(querysets, list(rows), page_size)
+
+    async def apaginate_querysets(self, querysets, request, view=None):
+        """
+        Asynchronous version of ``paginate_querysets``.
+        """
+        if not querysets:
+            return {}
+        rows, page_size = self.get_union_query(querysets, request)
+        return self.split_streams(querysets, [row async for row in rows], page_size)
+
+    def get_union_rows(self, querysets, request, columns):
+        """
+        Build a ``UNION ALL`` of the pages of several streams, fetching the given
+        columns of the rows rather than model instances.
+
+        Returns:
+            A ``(raw_queryset, page_size)`` tuple. Iterate over the raw queryset with
+            ``iter_raw_rows``.
+        """
+        return self.get_union_query(
+            {
+                prefix: queryset.values_list(*columns)
+                for prefix, queryset in querysets.items()
+            },
+            request,
+        )
+
+    def paginate_rows(self, querysets, request, columns, view=None):
+        """
+        Version of ``paginate_querysets`` returning named tuples of the given
+        columns, for read-only listings.
+
+        Args:
+            querysets: A mapping of stream name to queryset.
+            request: The incoming request, used to read the cursors and page size.
+            columns: The columns to fetch. Must include ``id`` and ``creation_date``.
+            view: The view paginating the querysets.
+
+        Returns:
+            A mapping of stream name to ``(rows, next_cursor)`` tuple.
+        """
+        if not querysets:
+            return {}
+        rows, page_size = self.get_union_rows(querysets, request, columns)
+        return self.split_streams(querysets, list(iter_raw_rows(rows)), page_size)
+
+    async def apaginate_rows(self, querysets, request, columns, view=None):
+        """
+        Asynchronous version of ``paginate_rows``.
+        """
+        if not querysets:
+            return {}
+        rows, page_size = self.get_union_rows(querysets, request, columns)
+        rows = await sync_to_async(lambda: list(iter_raw_rows(rows)))()
+        return self.split_streams(querysets, rows, page_size)
+
+
+class ThreadKeysetPagination(MessageKeysetPagination):
+    """
+    Keyset pagination of the thread memberships of a user, by recent activity.
+    """
+
+    ordering = ("-last_message_at", "-id")
+
+
+def iter_raw_rows(raw_queryset):
+    """
+    Iterate over the rows of a raw queryset as named tuples, without building model
+    instances.
+
+    The values are converted from the database like the fields of the model, and the
+    tuples are named after the columns of the query.
+    """
+    connection = connections[raw_queryset.db]
+    compiler = connection.ops.compiler("SQLCompiler")(
+        raw_queryset.query, connection, raw_queryset.db
+    )
+    # Executes the query; the columns are then read from the cursor.
+    rows = iter(raw_queryset.query)
+    columns = raw_queryset.columns
+    fields = [raw_queryset.model_fields.get(column) for column in columns]
+    converters = compiler.get_converters(
+        [
+            field.get_col(field.model._meta.db_table) if field else None
+            for field in fields
+        ]
+    )
+    if converters:
+        rows = compiler.apply_converters(rows, converters)
+    row_class = namedtuple("Row", columns)
+    return map(row_class._make, rows)
@@ -0,0 +1,227 @@
+from datetime import datetime, timezone
+
+from django.db import transaction
+
+from .models import Message
+
+# Replaces the messages table with a table partitioned by creation date, with the
+# same columns. The primary key of a partitioned table must contain the partition
+# key; the ids stay unique as they come from a single sequence.
+CREATE_PARTITIONED_TABLE = """
+ALTER TABLE {table} RENAME TO {old_table};
+CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS)
+PARTITION BY RANGE (creation_date);
+ALTER TABLE {table} ALTER COLUMN id DROP DEFAULT;
+ALTER TABLE {table} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY;
+ALTER TABLE {table} ADD PRIMARY KEY (id, creation_date);
+"""
+
+# Moves the messages to the partitioned table, then drops the old table with its
+# indexes, constraints and trigger.
+COPY_MESSAGES = """
+INSERT INTO {table} SELECT * FROM {old_table};
+SELECT setval(
+    pg_get_serial_sequence('{table}', 'id'),
+    (SELECT coalesce(max(id), 0) + 1 FROM {table}),
+    false
+);
+DROP TABLE {old_table};
+"""
+
+# The trigger and the index of migrations 0006 and 0010, recreated on the
+# partitioned table.
+CREATE_SEARCH_VECTOR = """
+CREATE TRIGGER messaging_message_search_vector
+BEFORE INSERT OR UPDATE OF subject, body_id ON {table}
+FOR EACH ROW EXECUTE FUNCTION messaging_message_search_vector();
+
+CREATE INDEX message_search_vector_idx ON {table} USING gin (search_vector);
+"""
+
+ADD_FOREIGN_KEY = """
+ALTER TABLE {table} ADD CONSTRAINT {constraint}
+FOREIGN KEY ({column}) REFERENCES {target_table} ({target_column})
+DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX {index} ON {table} ({column});
+"""
+
+CREATE_PARTITION = """
+CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table}
+FOR VALUES FROM (%s) TO (%s)
+"""
+
+# Catches the rows outside of the monthly partitions. It should stay empty: a month
+# cannot be partitioned once the default partition holds some of its rows.
+CREATE_DEFAULT_PARTITION = "CREATE TABLE {partition} PARTITION OF {table} DEFAULT"
+
+DROP_PARTITION = """
+ALTER TABLE {table} DETACH PARTITION {partition};
+DROP TABLE {partition};
+"""
+
+
+def month_start(date):
+    """
+    Return the first instant of the month of a date, in UTC.
+    """
+    date = date.astimezone(timezone.utc)
+    return datetime(date.year, date.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    """
+    Return the start of the month ``count`` months after the start of a month.
+    """
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def get_partition_name(month):
+    """
+    Return the name of the partition of the messages of a month: ``<table>_pYYYY_MM``.
+    """
+    return f"{Message._meta.db_table}_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(connection):
+    """
+    Whether the messages table is partitioned. Only PostgreSQL tables can be.
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [Message._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def get_partitions(connection):
+    """
+    Return a mapping of month start to the name of the monthly partition, oldest
+    first. The default partition is left out.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits"
+            " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " WHERE pg_inherits.inhparent = %s::regclass",
+            [Message._meta.db_table],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        try:
+            month = datetime.strptime(
+                name.removeprefix(f"{Message._meta.db_table}_p"), "%Y_%m"
+            )
+        except ValueError:
+            continue
+        partitions[month.replace(tzinfo=timezone.utc)] = name
+    return dict(sorted(partitions.items()))
+
+
+def create_partitions(connection, first_month, last_month):
+    """
+    Create the missing monthly partitions from ``first_month`` to ``last_month``.
+
+    Returns:
+        The names of the partitions created.
+    """
+    existing = get_partitions(connection)
+    quote_name = connection.ops.quote_name
+    created = []
+    month = first_month
+    with connection.cursor() as cursor:
+        while month <= last_month:
+            if month not in existing:
+                name = get_partition_name(month)
+                cursor.execute(
+                    CREATE_PARTITION.format(
+                        partition=quote_name(name),
+                        table=quote_name(Message._meta.db_table),
+                    ),
+                    [month, add_months(month, 1)],
+                )
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+def drop_partition(connection, name):
+    """
+    Detach a partition from the messages table and drop it.
+
+    Must be called in a transaction, once its messages have been archived.
+    """
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            DROP_PARTITION.format(
+                table=quote_name(Message._meta.db_table),
+                partition=quote_name(name),
+            )
+        )
+
+
+def partition_messages_table(connection, months_ahead):
+    """
+    Convert the messages table to a table partitioned by month of creation.
+
+    The messages are copied to monthly partitions, from the month of the oldest
+    message to ``months_ahead`` months after the current one, in a single
+    transaction holding an exclusive lock on the table: run it during a maintenance
+    window. The foreign keys, the indexes and the search trigger are recreated on the
+    partitioned table, and thus on every partition. Requires PostgreSQL 13 or later.
+
+    Returns:
+        The number of partitions created.
+    """
+    table = Message._meta.db_table
+    quote_name = connection.ops.quote_name
+    names = {
+        "table": quote_name(table),
+        "old_table": quote_name(f"{table}_unpartitioned"),
+    }
+    now = month_start(datetime.now(timezone.utc))
+    with transaction.atomic(using=connection.alias):
+        oldest = (
+            Message.objects.using(connection.alias)
+            .order_by("creation_date")
+            .values_list("creation_date", flat=True)
+            .first()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_PARTITIONED_TABLE.format(**names))
+            cursor.execute(
+                CREATE_DEFAULT_PARTITION.format(
+                    partition=quote_name(f"{table}_default"), table=names["table"]
+                )
+            )
+        created = create_partitions(
+            connection,
+            month_start(oldest) if oldest else now,
+            add_months(now, months_ahead),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(COPY_MESSAGES.format(**names))
+            for field in Message._meta.concrete_fields:
+                if field.remote_field is None:
+                    continue
+                target = field.target_field
+                cursor.execute(
+                    ADD_FOREIGN_KEY.format(
+                        table=names["table"],
+                        constraint=quote_name(f"{table}_{field.column}_fk"),
+                        column=quote_name(field.column),
+                        target_table=quote_name(target.model._meta.db_table),
+                        target_column=quote_name(target.column),
+                        index=quote_name(f"{table}_{field.column}_idx"),
+                    )
+                )
+            cursor.execute(CREATE_SEARCH_VECTOR.format(**names))
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for index in Message._meta.indexes:
+                schema_editor.add_index(Message, index)
+    return len(created)
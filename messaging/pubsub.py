@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.db import connections
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.utils import encoders
+
+from .conf import get_setting
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    The events published to one user, consumed by a single asyncio task.
+
+    Events are handed over from any thread with ``loop.call_soon_threadsafe``. When
+    the consumer falls ``maxsize`` events behind, new events are dropped rather than
+    buffered without bound; the client catches up from the mailbox endpoints.
+    """
+
+    def __init__(self, broker, user_id, maxsize=100):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        """
+        Queue an event. Can be called from any thread.
+        """
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Dropping event for slow subscriber %s", self.user_id)
+
+    async def get(self, timeout=None):
+        """
+        Wait for the next event.
+
+        Raises:
+            TimeoutError: If no event was published within ``timeout`` seconds.
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Publish/subscribe broker delivering events to the subscribers of this process.
+
+    It is enough when a single process serves the streaming endpoint. Deployments with
+    several processes or nodes use a broker that relays events between them, such as
+    ``PostgresBroker``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        """
+        Subscribe to the events of a user. Must be called from a running event loop.
+        """
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, events):
+        """
+        Publish events to their users.
+
+        Args:
+            events: An iterable of ``(user_id, event)`` pairs. Events are JSON
+                serializable dicts.
+        """
+        self.deliver(events)
+
+    def deliver(self, events):
+        """
+        Hand events over to the local subscribers of their users.
+        """
+        with self._lock:
+            targets = [
+                (tuple(self._subscribers.get(user_id, ())), event)
+                for user_id, event in events
+            ]
+        for subscribers, event in targets:
+            for subscription in subscribers:
+                subscription.put(event)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Broker relaying events between processes with PostgreSQL ``LISTEN``/``NOTIFY``.
+
+    Events are published with ``pg_notify`` on the ``default`` database, and each
+    process runs a listener thread, started with the first subscription, that delivers
+    the notifications to its local subscribers. The listener connects to the
+    ``PUBSUB_DATABASE`` setting, a direct connection to the primary when ``default``
+    goes through PgBouncer.
+    """
+
+    channel = "messaging_events"
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, events):
+        payloads = [
+            json.dumps({"user": user_id, "event": event}, cls=encoders.JSONEncoder)
+            for user_id, event in events
+        ]
+        if not payloads:
+            return
+        with connections["default"].cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                [self.channel, payloads],
+            )
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self.listen, name="messaging-pubsub", daemon=True
+                )
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def listen(self):
+        """
+        Deliver the notifications of the channel to the local subscribers, forever.
+        """
+        # A dedicated connection: it must stay in autocommit and never be shared.
+        connection = connections.create_connection(get_setting("PUBSUB_DATABASE"))
+        connection.ensure_connection()
+        raw = connection.connection
+        raw.autocommit = True
+        with raw.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        try:
+            while True:
+                if select.select([raw], [], [], 5) == ([], [], []):
+                    continue
+                raw.poll()
+                events = []
+                while raw.notifies:
+                    payload = json.loads(raw.notifies.pop(0).payload)
+                    events.append((payload["user"], payload["event"]))
+                self.deliver(events)
+        except Exception:
+            logger.exception("The messaging pub/sub listener stopped")
+        finally:
+            connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """
+    Return the broker configured by the ``PUBSUB_BACKEND`` setting.
+    """
+    return import_string(get_setting("PUBSUB_BACKEND"))()
+
+
+def message_event(message):
+    """
+    Return the summary of a new message pushed to its receiver.
+    """
+    return {
+        "id": message.pk,
+        "sender": message.sender_id,
+        "receiver": message.receiver_id,
+        "subject": message.subject,
+        "creation_date": serializers.DateTimeField().to_representation(
+            message.creation_date
+        ),
+    }
+
+
+def publish_new_messages(messages):
+    """
+    Push a summary of each new message to its receiver.
+    """
+    get_broker().publish(
+        (message.receiver_id, message_event(message)) for message in messages
+    )
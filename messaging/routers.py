@@ -0,0 +1,132 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .conf import get_setting
+
+# Whether the reads of the current request may be served by a replica.
+_read_from_replicas = ContextVar("messaging_read_from_replicas", default=False)
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of the mailbox read endpoints to replicas.
+
+    Only the code running under ``read_from_replicas()`` reads from the databases
+    listed in the ``READ_REPLICAS`` setting, picked at random. Everything else,
+    including the reads of a transaction on the primary, uses the ``default``
+    database, which receives all the writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _read_from_replicas.get():
+            return None
+        replicas = get_setting("READ_REPLICAS")
+        if not replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Also for instances read from a replica, which Django would save there.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_setting("READ_REPLICAS")}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_setting("READ_REPLICAS"):
+            return False
+        return None
+
+
+@contextmanager
+def read_from_replicas(enabled=True):
+    """
+    Serve the reads of the block from the replicas, or from the primary when
+    ``enabled`` is false.
+    """
+    token = _read_from_replicas.set(enabled)
+    try:
+        yield
+    finally:
+        _read_from_replicas.reset(token)
+
+
+def read_from_primary():
+    """
+    Serve the reads of the block from the primary.
+    """
+    return read_from_replicas(False)
+
+
+def _pinned_key(user_id):
+    return f"messaging:pinned-to-primary:{user_id}"
+
+
+def pin_to_primary(user_ids):
+    """
+    Serve the reads of the given users from the primary for ``REPLICA_STICKINESS``
+    seconds, so they read their own writes rather than a lagging replica.
+
+    The pins are kept in the default cache, which must be shared by all the
+    processes serving the API.
+    """
+    timeout = get_setting("REPLICA_STICKINESS")
+    if timeout and get_setting("READ_REPLICAS"):
+        cache.set_many({_pinned_key(user_id): True for user_id in user_ids}, timeout)
+
+
+def is_pinned_to_primary(user):
+    return bool(cache.get(_pinned_key(user.pk)))
+
+
+async def ais_pinned_to_primary(user):
+    return bool(await cache.aget(_pinned_key(user.pk)))
+
+
+def use_replicas(request):
+    """
+    Whether the reads of an authenticated request may be served by a replica.
+    """
+    return (
+        request.method in SAFE_METHODS
+        and bool(get_setting("READ_REPLICAS"))
+        and not is_pinned_to_primary(request.user)
+    )
+
+
+async def ause_replicas(request):
+    """
+    Asynchronous version of ``use_replicas``.
+    """
+    return (
+        request.method in SAFE_METHODS
+        and bool(get_setting("READ_REPLICAS"))
+        and not await ais_pinned_to_primary(request.user)
+    )
+
+
+class ReplicaReadMixin:
+    """
+    Serve the reads of the safe requests of a DRF view from the replicas, once the
+    user is authenticated, unless the user has just written to the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if use_replicas(request):
+            self._replica_token = _read_from_replicas.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            _read_from_replicas.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
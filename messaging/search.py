@@ -0,0 +1,48 @@
+from django.contrib.postgres.search import SearchQuery
+from django.db import connections
+from django.db.models import Q
+
+# Text search configuration of the search vectors, see migrations 0006 and 0010. The "simple"
+# configuration does not stem or drop stop words, so it works for any language.
+SEARCH_CONFIG = "simple"
+
+
+def search_messages(queryset, query):
+    """
+    Restrict a queryset of messages to the messages matching a search query.
+
+    On PostgreSQL, the query uses the web search syntax (quoted phrases, ``or``,
+    ``-word``) and is matched against the GIN-indexed ``search_vector`` of the
+    messages. The other databases, used for local development and tests, fall back
+    to a case-insensitive match of every word of the query in the subject or the
+    message. The compressed messages are decompressed and matched in Python, which
+    reads every compressed body of the queryset.
+
+    Args:
+        queryset: The queryset of messages to search.
+        query: The search query, as typed by the user.
+    """
+    if connections[queryset.db].vendor == "postgresql":
+        return queryset.filter(
+            search_vector=SearchQuery(
+                query, config=SEARCH_CONFIG, search_type="websearch"
+            )
+        )
+    # The body model, without importing the models which import this module.
+    body_model = queryset.model._meta.get_field("body").related_model
+    compressed = {
+        digest: body_model.decode(None, compressed_text).lower()
+        for digest, compressed_text in body_model.objects.using(queryset.db)
+        .filter(compressed_text__isnull=False, pk__in=queryset.values("body_id"))
+        .values_list("pk", "compressed_text")
+    }
+    for word in query.split():
+        matching = [
+            digest for digest, text in compressed.items() if word.lower() in text
+        ]
+        queryset = queryset.filter(
+            Q(subject__icontains=word)
+            | Q(body__text__icontains=word)
+            | Q(body_id__in=matching)
+        )
+    return queryset
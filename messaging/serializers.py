@@ -1,17 +1,65 @@
-from rest_framework import serializers
+from operator import itemgetter
 
-from .models import Message
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 
+from .models import Message, MessageBody, OutboxMessage, ThreadMembership
 
-class MessageSerializer(serializers.ModelSerializer):
+
+class NotEmptyValidationMixin:
+    """
+    Validation of the subject and message fields shared by the message serializers.
+    """
+
+    def validate_not_empty(self, value, field_name):
+        """
+        Validate that the field is not empty or composed of only spaces.
+        """
+        if value.isspace() or not value:
+            raise serializers.ValidationError(
+                f"The {field_name} cannot be empty or composed of only spaces."
+            )
+        return value
+
+    def validate_subject(self, value):
+        """
+        Validate that the subject is not empty or composed of only spaces.
+        """
+        return self.validate_not_empty(value, "subject")
+
+    def validate_message(self, value):
+        """
+        Validate that the message is not empty or composed of only spaces.
+        """
+        return self.validate_not_empty(value, "message")
+
+
+class MessageSerializer(NotEmptyValidationMixin, serializers.ModelSerializer):
     """
     Serializer for the Message model.
 
     This serializer is used to convert Message objects into JSON representation and vice versa.
     It defines the fields that should be included in the serialized output and provides validation
     for the subject and message fields to ensure they are not empty or composed of only spaces.
+
+    The output can be restricted to a subset of the fields with the ``fields`` argument.
     """
 
+    # Stored in a MessageBody, see ``Message.message``.
+    message = serializers.CharField()
+
+    # Compact representation for inbox listings, without the message body.
+    summary_fields = [
+        "id",
+        "sender",
+        "receiver",
+        "subject",
+        "creation_date",
+        "is_read",
+    ]
+
     class Meta:
         model = Message
         fields = [
@@ -24,24 +72,313 @@ class MessageSerializer(serializers.ModelSerializer):
             "is_read",
         ]
 
-    def validate_not_empty(self, value, field_name):
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def parse_fields(cls, value):
         """
-        Validate that the field is not empty or composed of only spaces.
+        Parse the value of a ``fields`` query parameter.
+
+        Args:
+            value: A comma separated list of field names, or ``summary`` for the
+                summary fields. An empty value selects all the fields.
+
+        Returns:
+            The list of selected fields, or None for all the fields.
+
+        Raises:
+            ValidationError: If an unknown field is requested.
         """
-        if value.isspace() or not value:
+        if not value:
+            return None
+        if value == "summary":
+            return list(cls.summary_fields)
+        names = {name.strip() for name in value.split(",") if name.strip()}
+        unknown = names - set(cls.Meta.fields)
+        if unknown:
             raise serializers.ValidationError(
-                f"The {field_name} cannot be empty or composed of only spaces."
+                {"fields": f"Unknown fields: {', '.join(sorted(unknown))}."}
             )
-        return value
+        return [name for name in cls.Meta.fields if name in names]
 
-    def validate_subject(self, value):
+
+class MessageRowSerializer:
+    """
+    Read-only fast path of ``MessageSerializer`` for large listings.
+
+    It serializes rows fetched with ``values_list()`` instead of model instances:
+    each dict is built straight from the row tuple with accessors precomputed once
+    per serializer, rather than by running every field of a ``ModelSerializer``. The
+    output is identical to ``MessageSerializer``.
+
+    Args:
+        columns: The columns of the rows, as model attribute names (``sender_id``).
+        fields: The fields to output, or None for all the fields.
+    """
+
+    # Columns of the text of the message, read from its body with a join. They are
+    # only fetched when the ``message`` field is output.
+    body_columns = ("body__text", "body__compressed_text")
+
+    def __init__(self, columns, fields=None):
+        if fields is None:
+            fields = MessageSerializer.Meta.fields
+        format_datetime = self.get_datetime_formatter()
+        self.accessors = []
+        for name in fields:
+            if name == "message":
+                getter = self.get_body_getter(columns)
+            else:
+                getter = itemgetter(
+                    columns.index(Message._meta.get_field(name).attname)
+                )
+            if name == "creation_date":
+                getter = self.compose(format_datetime, getter)
+            self.accessors.append((name, getter))
+
+    @classmethod
+    def get_field_columns(cls, name):
+        if name == "message":
+            return cls.body_columns
+        return (Message._meta.get_field(name).attname,)
+
+    @classmethod
+    def get_columns(cls, fields=None, required=("id", "creation_date")):
         """
-        Validate that the subject is not empty or composed of only spaces.
+        Return the columns to fetch with ``values_list()`` to serialize the fields.
+
+        Args:
+            fields: The fields to output, or None for all the fields.
+            required: Fields fetched even if they are not output.
         """
-        return self.validate_not_empty(value, "subject")
+        if fields is None:
+            fields = MessageSerializer.Meta.fields
+        selected = {*required, *fields}
+        return [
+            column
+            for name in MessageSerializer.Meta.fields
+            if name in selected
+            for column in cls.get_field_columns(name)
+        ]
 
-    def validate_message(self, value):
+    @classmethod
+    def get_body_getter(cls, columns):
         """
-        Validate that the message is not empty or composed of only spaces.
+        Return a function reading the text of the message of a row.
         """
-        return self.validate_not_empty(value, "message")
+        text, compressed_text = (columns.index(column) for column in cls.body_columns)
+
+        def get_body(row):
+            if row[compressed_text] is None:
+                return row[text]
+            return MessageBody.decode(row[text], row[compressed_text])
+
+        return get_body
+
+    @staticmethod
+    def compose(outer, inner):
+        return lambda row: outer(inner(row))
+
+    @staticmethod
+    def get_datetime_formatter():
+        """
+        Return a function formatting datetimes like ``serializers.DateTimeField``.
+
+        The ISO 8601 format of DRF is inlined, the field is used for other formats.
+        """
+        if api_settings.DATETIME_FORMAT != ISO_8601 or not settings.USE_TZ:
+            return serializers.DateTimeField().to_representation
+        tz = timezone.get_current_timezone()
+
+        def format_datetime(value):
+            value = value.astimezone(tz).isoformat()
+            if value.endswith("+00:00"):
+                value = value[:-6] + "Z"
+            return value
+
+        return format_datetime
+
+    def to_representation(self, row):
+        return {name: getter(row) for name, getter in self.accessors}
+
+    def serialize(self, rows):
+        """
+        Return the list of the serialized rows.
+        """
+        accessors = self.accessors
+        return [{name: getter(row) for name, getter in accessors} for row in rows]
+
+
+class ThreadSerializer(serializers.ModelSerializer):
+    """
+    Serializer of a thread, as seen by one of its participants.
+
+    It serializes the ``ThreadMembership`` of the user, with the thread selected.
+    """
+
+    id = serializers.IntegerField(source="thread_id", read_only=True)
+    participants = serializers.ListField(
+        source="thread.participant_ids",
+        child=serializers.IntegerField(),
+        read_only=True,
+    )
+
+    class Meta:
+        model = ThreadMembership
+        fields = ["id", "participants", "last_message_at", "unread_count"]
+        read_only_fields = fields
+
+
+class OutboxMessageSerializer(serializers.ModelSerializer):
+    """
+    Serializer of a message queued by a send endpoint in asynchronous send mode.
+    """
+
+    class Meta:
+        model = OutboxMessage
+        fields = ["id", "sender", "receiver", "subject", "message", "queued_at"]
+        read_only_fields = fields
+
+
+class BulkMessageItemSerializer(NotEmptyValidationMixin, serializers.Serializer):
+    """
+    Serializer for one message of a bulk send.
+
+    The receiver is validated as a plain id so a batch can be validated without a
+    query per item; receivers are resolved for the whole batch at once.
+    """
+
+    receiver = serializers.IntegerField(min_value=1)
+    subject = serializers.CharField(max_length=255)
+    message = serializers.CharField()
+
+
+class BulkSendSerializer(NotEmptyValidationMixin, serializers.Serializer):
+    """
+    Serializer for the envelope of a bulk send.
+
+    Accepts either a list of ``receivers`` sharing one ``subject`` and ``message``,
+    or a list of ``messages``, each with its own receiver, subject and message.
+    The items themselves are validated one by one by the view, so that one invalid
+    item does not reject the whole batch.
+    """
+
+    receivers = serializers.ListField(child=serializers.JSONField(), required=False)
+    subject = serializers.CharField(max_length=255, required=False)
+    message = serializers.CharField(required=False)
+    messages = serializers.ListField(child=serializers.JSONField(), required=False)
+
+    def validate(self, attrs):
+        if ("receivers" in attrs) == ("messages" in attrs):
+            raise serializers.ValidationError(
+                "Provide either a list of receivers or a list of messages."
+            )
+        if "receivers" in attrs:
+            missing = {"subject", "message"} - set(attrs)
+            if missing:
+                raise serializers.ValidationError(
+                    {field: "This field is required." for field in missing}
+                )
+        items = attrs.get("receivers", attrs.get("messages"))
+        max_items = self.context.get("max_items")
+        if max_items is not None and len(items) > max_items:
+            raise serializers.ValidationError(
+                f"A bulk send cannot contain more than {max_items} messages."
+            )
+        return attrs
+
+    def get_items(self):
+        """
+        Validate the items of the batch.
+
+        Returns:
+            A ``(items, errors)`` tuple. ``items`` is a list of ``(index, data)`` pairs
+            for the valid items and ``errors`` a list of ``{"index", "errors"}`` dicts
+            for the invalid ones, ``index`` being the position of the item in the batch.
+        """
+        data = self.validated_data
+        items, errors = [], []
+
+        if "messages" in data:
+            for index, payload in enumerate(data["messages"]):
+                item = BulkMessageItemSerializer(data=payload)
+                if item.is_valid():
+                    items.append((index, item.validated_data))
+                else:
+                    errors.append({"index": index, "errors": item.errors})
+            return items, errors
+
+        # The subject and message are shared, so they are validated only once.
+        receiver_field = BulkMessageItemSerializer().fields["receiver"]
+        for index, receiver in enumerate(data["receivers"]):
+            try:
+                receiver = receiver_field.run_validation(receiver)
+            except serializers.ValidationError as exc:
+                errors.append({"index": index, "errors": {"receiver": exc.detail}})
+                continue
+            items.append(
+                (
+                    index,
+                    {
+                        "receiver": receiver,
+                        "subject": data["subject"],
+                        "message": data["message"],
+                    },
+                )
+            )
+        return items, errors
+
+
+class BulkSelectionSerializer(serializers.Serializer):
+    """
+    Serializer for the selection of messages affected by a bulk operation.
+
+    Messages are selected by a list of ``ids``, by a ``before`` date, or both. The
+    selection is always restricted to the messages of the authenticated user.
+    Unknown parameters are rejected rather than ignored, so a filter the operation
+    does not support never widens the selection silently.
+    """
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, max_length=10000
+    )
+    before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        unknown = set(self.initial_data) - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError(
+                {name: "This parameter is not supported." for name in sorted(unknown)}
+            )
+        if "ids" not in attrs and "before" not in attrs:
+            raise serializers.ValidationError(
+                "Select messages with a list of ids, a before date, or both."
+            )
+        return attrs
+
+
+class BulkDeleteSelectionSerializer(BulkSelectionSerializer):
+    """
+    Serializer for the selection of messages to delete, which can be narrowed to
+    one ``direction`` and to the unread messages.
+    """
+
+    unread_only = serializers.BooleanField(required=False, default=False)
+    direction = serializers.ChoiceField(
+        choices=["sent", "received", "all"], required=False, default="all"
+    )
+
+
+class MessageSearchSerializer(serializers.Serializer):
+    """
+    Serializer for the query parameters of the message search.
+    """
+
+    q = serializers.CharField(max_length=200)
+    direction = serializers.ChoiceField(
+        choices=["sent", "received", "all"], required=False, default="all"
+    )
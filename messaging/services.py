@@ -0,0 +1,443 @@
+from collections import Counter
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .conf import get_setting
+from .mailbox import record_mailbox_changes, summarize_messages
+from .models import ArchivedMessage, Message, MessageBody, OutboxMessage, Thread
+from .partitions import add_months, drop_partition, get_partitions, is_partitioned
+from .pubsub import publish_new_messages
+from .threads import assign_threads, get_threads, record_thread_changes
+
+
+def get_existing_user_ids(user_ids):
+    """
+    Return the subset of the given user ids that exist, using a single query.
+    """
+    User = get_user_model()
+    return set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+
+
+def create_messages(messages, batch_size=None):
+    """
+    Insert the given unsaved messages with ``bulk_create``.
+
+    Their bodies are stored first, with one query: messages with the same text share
+    a single body.
+
+    Args:
+        messages: A list of unsaved Message instances.
+        batch_size: The number of rows inserted per INSERT statement. Defaults to the
+            ``BULK_SEND_BATCH_SIZE`` setting.
+
+    Returns:
+        The list of created messages.
+    """
+    batch_size = batch_size or get_setting("BULK_SEND_BATCH_SIZE")
+    with transaction.atomic():
+        assign_threads(messages)
+        MessageBody.attach(messages)
+        messages = Message.objects.bulk_create(messages, batch_size=batch_size)
+        messages_created(messages)
+    return messages
+
+
+def save_message(serializer, sender):
+    """
+    Save a validated MessageSerializer and update the mailbox counters.
+
+    Returns:
+        The created message.
+    """
+    receiver = serializer.validated_data["receiver"]
+    with transaction.atomic():
+        threads = get_threads([(sender.pk, receiver.pk)])
+        message = serializer.save(
+            sender=sender, thread_id=threads[Thread.get_key(sender.pk, receiver.pk)]
+        )
+        messages_created([message])
+    return message
+
+
+def enqueue_message(serializer, sender):
+    """
+    Queue a validated MessageSerializer in the outbox, to be sent by ``drain_outbox``.
+
+    Returns:
+        The queued message.
+    """
+    data = serializer.validated_data
+    return OutboxMessage.objects.create(
+        sender=sender,
+        receiver=data["receiver"],
+        subject=data["subject"],
+        message=data["message"],
+    )
+
+
+def drain_outbox(batch_size=None):
+    """
+    Send a batch of queued messages, oldest first, in a single transaction.
+
+    The batch is locked with ``SKIP LOCKED`` on the databases supporting it, so
+    several workers can drain the outbox concurrently. The messages are created with
+    ``create_messages`` and get their creation date when they are sent.
+
+    Args:
+        batch_size: The maximum number of messages to send. Defaults to the
+            ``OUTBOX_BATCH_SIZE`` setting.
+
+    Returns:
+        The number of messages sent.
+    """
+    batch_size = batch_size or get_setting("OUTBOX_BATCH_SIZE")
+    with transaction.atomic():
+        queryset = OutboxMessage.objects.select_for_update(skip_locked=True)
+        queued = list(queryset.order_by("pk")[:batch_size])
+        if queued:
+            create_messages([item.to_message() for item in queued])
+            OutboxMessage.objects.filter(pk__in=[item.pk for item in queued]).delete()
+    return len(queued)
+
+
+# Marks a message as read if the user is its receiver and fetches it with its body,
+# in a single statement. All the parts of a statement see the same snapshot, so the SELECT reads
+# the row as it was before the UPDATE.
+READ_MESSAGE_SQL = """
+    WITH updated AS (
+        UPDATE {table} SET is_read = true
+        WHERE id = %s AND receiver_id = %s AND NOT is_read
+        RETURNING id
+    )
+    SELECT
+        {columns},
+        b.text AS body_text,
+        b.compressed_text AS body_compressed_text,
+        updated.id IS NOT NULL AS marked
+    FROM {table} m
+    JOIN {body_table} b ON b.digest = m.body_id
+    LEFT JOIN updated ON updated.id = m.id
+    WHERE m.id = %s
+"""
+
+
+def get_read_message_query(user, pk, using):
+    """
+    Return the raw queryset fetching a message and marking it as read with
+    ``READ_MESSAGE_SQL``, on PostgreSQL.
+    """
+    quote_name = connections[using].ops.quote_name
+    columns = ", ".join(
+        f"m.{quote_name(field.column)}"
+        for field in Message._meta.concrete_fields
+        if field.name != "search_vector"
+    )
+    sql = READ_MESSAGE_SQL.format(
+        table=quote_name(Message._meta.db_table),
+        body_table=quote_name(MessageBody._meta.db_table),
+        columns=columns,
+    )
+    return Message.objects.db_manager(using).raw(sql, [pk, user.pk, pk])
+
+
+def _read_message_returning(user, pk, using):
+    """
+    Fetch a message and mark it as read with ``READ_MESSAGE_SQL``.
+    """
+    for message in get_read_message_query(user, pk, using):
+        message.body = MessageBody(
+            digest=message.body_id,
+            text=message.body_text,
+            compressed_text=message.body_compressed_text,
+        )
+        if message.marked:
+            message.is_read = True
+        return message, message.marked
+    return None, False
+
+
+def _get_message(model, pk, using):
+    return model.objects.using(using).select_related("body").filter(pk=pk).first()
+
+
+def read_message(user, pk):
+    """
+    Fetch a message and mark it as read if the user is its receiver, updating the
+    mailbox counters.
+
+    The messages that cannot be marked, already read or read by their sender, are
+    only fetched, from a replica when the request may use one. The others are marked
+    on the primary: on PostgreSQL, fetched and marked by a single statement, also
+    used when a replica does not have the message yet. The other databases mark the
+    fetched message with an UPDATE guarded on ``is_read``, so that concurrent reads
+    update the counters once. Messages missing from ``Message`` are looked up in the
+    archive, and never marked. The caller checks that the user may read the message.
+
+    Returns:
+        A ``(message, marked)`` tuple. The message, a Message or an ArchivedMessage,
+        is None if it does not exist, and ``marked`` tells whether this call marked it
+        as read.
+    """
+    using = router.db_for_write(Message)
+    read_using = router.db_for_read(Message)
+    postgresql = connections[using].vendor == "postgresql"
+    message = None
+    if read_using != using or not postgresql:
+        message = _get_message(Message, pk, read_using)
+        if message is not None and (message.receiver_id != user.pk or message.is_read):
+            return message, False
+        if message is None and read_using == using:
+            return _get_message(ArchivedMessage, pk, using), False
+    with transaction.atomic(using=using):
+        if postgresql:
+            message, marked = _read_message_returning(user, pk, using)
+        else:
+            if read_using != using:
+                # The message is unread or missing from the replica.
+                message = _get_message(Message, pk, using)
+            marked = bool(
+                message is not None
+                and message.receiver_id == user.pk
+                and not message.is_read
+                and Message.objects.using(using)
+                .filter(pk=pk, is_read=False)
+                .update(is_read=True)
+            )
+            if marked:
+                message.is_read = True
+        if message is None:
+            message = _get_message(ArchivedMessage, pk, using)
+        if marked:
+            record_mailbox_changes(
+                {message.sender_id, message.receiver_id}, {message.receiver_id: -1}
+            )
+            record_thread_changes({(message.thread_id, message.receiver_id): -1})
+    return message, marked
+
+
+def messages_created(messages):
+    """
+    Update the mailbox counters and the threads after messages have been inserted,
+    and push the new messages to their receivers once the transaction is committed.
+    """
+    if not messages:
+        return
+    user_ids = set()
+    for message in messages:
+        user_ids.update((message.sender_id, message.receiver_id))
+    unread = [message for message in messages if not message.is_read]
+    record_mailbox_changes(user_ids, Counter(m.receiver_id for m in unread))
+    record_thread_changes(
+        Counter((m.thread_id, m.receiver_id) for m in unread),
+        thread_ids={message.thread_id for message in messages},
+        last_message_at=max(message.creation_date for message in messages),
+    )
+    transaction.on_commit(partial(publish_new_messages, messages))
+
+
+def select_messages(user, ids=None, before=None, direction="all", unread_only=False):
+    """
+    Return the messages of the user matching a bulk selection.
+
+    Args:
+        user: The user owning the messages.
+        ids: Restrict the selection to these message ids.
+        before: Restrict the selection to messages created before this date.
+        direction: ``sent``, ``received`` or ``all``.
+        unread_only: Restrict the selection to unread messages.
+    """
+    ownership = {
+        "sent": Q(sender=user),
+        "received": Q(receiver=user),
+        "all": Q(sender=user) | Q(receiver=user),
+    }[direction]
+    queryset = Message.objects.filter(ownership)
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    if before is not None:
+        queryset = queryset.filter(creation_date__lt=before)
+    if unread_only:
+        queryset = queryset.filter(is_read=False)
+    return queryset
+
+
+def _lock_selection(queryset):
+    """
+    Lock the messages of a bulk selection until the end of the transaction.
+
+    Concurrent changes to the same messages wait for the transaction, then skip the
+    messages it changed, so the counters are only updated once per message. The
+    messages matching the selection after the lock are left out.
+
+    Must be called in a transaction.
+
+    Returns:
+        A queryset of the locked messages.
+    """
+    ids = list(queryset.select_for_update().order_by("pk").values_list("pk", flat=True))
+    return Message.objects.filter(pk__in=ids)
+
+
+def mark_messages_read(user, ids=None, before=None):
+    """
+    Mark the selected received messages of the user as read with a single UPDATE.
+
+    Returns:
+        The number of messages marked as read.
+    """
+    queryset = select_messages(
+        user, ids=ids, before=before, direction="received", unread_only=True
+    )
+    with transaction.atomic():
+        queryset = _lock_selection(queryset)
+        # The senders see the read status in their sent messages.
+        senders = set()
+        unread_by_thread = {}
+        rows = (
+            queryset.order_by()
+            .values("sender", "thread")
+            .annotate(count=Count("pk"))
+            .values_list("sender", "thread", "count")
+        )
+        for sender_id, thread_id, count in rows:
+            senders.add(sender_id)
+            unread_by_thread[thread_id, user.pk] = -count
+        updated = queryset.update(is_read=True)
+        if updated:
+            record_mailbox_changes(senders | {user.pk}, {user.pk: -updated})
+            record_thread_changes(unread_by_thread)
+    return updated
+
+
+def delete_messages(user, ids=None, before=None, direction="all", unread_only=False):
+    """
+    Delete the selected messages of the user with a single DELETE.
+
+    Returns:
+        The number of messages deleted.
+    """
+    queryset = select_messages(
+        user, ids=ids, before=before, direction=direction, unread_only=unread_only
+    )
+    with transaction.atomic():
+        queryset = _lock_selection(queryset)
+        user_ids, unread, unread_by_thread = summarize_messages(queryset)
+        deleted, _ = queryset.delete()
+        if deleted:
+            record_mailbox_changes(
+                user_ids, {user_id: -count for user_id, count in unread.items()}
+            )
+            record_thread_changes(
+                {key: -count for key, count in unread_by_thread.items()}
+            )
+    return deleted
+
+
+def _copy_to_archive(queryset):
+    """
+    Copy the messages of the queryset to the archive with an INSERT ... SELECT.
+
+    Returns:
+        The number of messages copied.
+    """
+    fields = ArchivedMessage._meta.concrete_fields
+    select, params = (
+        queryset.order_by()
+        .values_list(*[field.attname for field in fields])
+        .query.sql_with_params()
+    )
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    columns = ", ".join(quote_name(field.column) for field in fields)
+    table = quote_name(ArchivedMessage._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table} ({columns}) {select}", params)
+        return cursor.rowcount
+
+
+def _archive(queryset, remove):
+    """
+    Move the messages of the queryset to the archive and update the mailbox counters.
+
+    Args:
+        queryset: The messages to archive.
+        remove: Called to remove the messages from ``Message`` once copied.
+
+    Returns:
+        The number of messages archived.
+    """
+    with transaction.atomic(using=queryset.db):
+        user_ids, unread, unread_by_thread = summarize_messages(queryset)
+        archived = _copy_to_archive(queryset)
+        remove()
+        if archived:
+            # Archived messages are no longer listed nor counted as unread.
+            record_mailbox_changes(
+                user_ids, {user_id: -count for user_id, count in unread.items()}
+            )
+            record_thread_changes(
+                {key: -count for key, count in unread_by_thread.items()}
+            )
+    return archived
+
+
+def archive_messages(before):
+    """
+    Move the messages created before a date to the archive, see ``ArchivedMessage``.
+
+    When the messages table is partitioned, each monthly partition ending before the
+    date is copied to the archive, then detached and dropped, in its own transaction.
+    The remaining messages created before the date, in the default partition or in a
+    partition ending after the date, are then copied and deleted in a single
+    transaction, as are all the messages of a table that is not partitioned.
+
+    Returns:
+        The number of messages archived.
+    """
+    using = router.db_for_write(Message)
+    connection = connections[using]
+    messages = Message.objects.using(using)
+    archived = 0
+    if is_partitioned(connection):
+        for month, name in get_partitions(connection).items():
+            end = add_months(month, 1)
+            if end > before:
+                break
+            archived += _archive(
+                messages.filter(creation_date__gte=month, creation_date__lt=end),
+                partial(drop_partition, connection, name),
+            )
+    queryset = messages.filter(creation_date__lt=before)
+    return archived + _archive(queryset, queryset.delete)
+
+
+def delete_unused_bodies(batch_size=1000):
+    """
+    Delete the message bodies that no message nor archived message uses anymore.
+
+    Each batch is locked with ``FOR UPDATE SKIP LOCKED`` and checked again for
+    messages in the same transaction. The bodies locked by the sends in progress,
+    see ``MessageBody.store``, are skipped, and a send waiting for the lock of a
+    deleted body inserts it again.
+
+    Returns:
+        The number of bodies deleted.
+    """
+    unused = MessageBody.objects.filter(
+        ~Exists(Message.objects.filter(body=OuterRef("pk"))),
+        ~Exists(ArchivedMessage.objects.filter(body=OuterRef("pk"))),
+    )
+    deleted = 0
+    while True:
+        with transaction.atomic(using=router.db_for_write(MessageBody)):
+            digests = list(
+                unused.select_for_update(skip_locked=True).values_list("pk", flat=True)[
+                    :batch_size
+                ]
+            )
+            if not digests:
+                return deleted
+            deleted += unused.filter(pk__in=digests).delete()[0]
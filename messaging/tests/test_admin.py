@@ -0,0 +1,76 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import ArchivedMessage, Message
+from ..services import archive_messages
+
+
+# The manifest storage needs collectstatic to render the admin pages.
+@override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"
+)
+class MessageAdminTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin", password="password")
+        cls.sender = User.objects.create_user(username="sender", password="password")
+        cls.receiver = User.objects.create_user(
+            username="receiver", password="password"
+        )
+        cls.message = Message.objects.create(
+            sender=cls.sender,
+            receiver=cls.receiver,
+            subject="Subject",
+            message="Original text",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_change_page_shows_the_text(self):
+        url = reverse("admin:messaging_message_change", args=[self.message.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Original text")
+        self.assertContains(response, 'name="sender"')
+        self.assertNotContains(response, 'name="body"')
+
+    def test_change_page_edits_the_text(self):
+        url = reverse("admin:messaging_message_change", args=[self.message.pk])
+        response = self.client.post(
+            url,
+            {
+                "sender": self.sender.pk,
+                "receiver": self.receiver.pk,
+                "subject": "Subject",
+                "message": "  Edited text  ",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        message = Message.objects.get(pk=self.message.pk)
+        self.assertEqual(message.message, "Edited text")
+        self.assertNotEqual(message.body_id, self.message.body_id)
+
+    def test_add_page_stores_the_body(self):
+        response = self.client.post(
+            reverse("admin:messaging_message_add"),
+            {
+                "sender": self.sender.pk,
+                "receiver": self.receiver.pk,
+                "subject": "New",
+                "message": "New text",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Message.objects.get(subject="New").message, "New text")
+
+    def test_archived_message_text_is_read_only(self):
+        archive_messages(timezone.now())
+        archived = ArchivedMessage.objects.get()
+        url = reverse("admin:messaging_archivedmessage_change", args=[archived.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Original text")
+        self.assertNotContains(response, 'name="message"')
@@ -0,0 +1,114 @@
+import base64
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from ..models import Message
+from ..serializers import MessageSerializer
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            "sender", "sender@example.com", "testpassword"
+        )
+        self.receiver = User.objects.create_user(
+            "receiver", "receiver@example.com", "testpassword"
+        )
+        self.message = Message.objects.create(
+            sender=self.sender,
+            receiver=self.receiver,
+            subject="Test Subject",
+            message="Test message content",
+        )
+
+    def basic_auth(self, username, password="testpassword"):
+        credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+        return {"HTTP_AUTHORIZATION": f"Basic {credentials}"}
+
+    def test_list_messages(self):
+        self.client.force_login(self.receiver)
+        response = self.client.get(reverse("messaging:async-user-messages-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["sent_messages"], [])
+        self.assertEqual(
+            data["received_messages"],
+            [MessageSerializer(self.message).data],
+        )
+        self.assertIn("ETag", response)
+
+    def test_list_messages_fields(self):
+        self.client.force_login(self.receiver)
+        response = self.client.get(
+            reverse("messaging:async-user-messages-list"), {"fields": "summary"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(response.json()["received_messages"][0]),
+            MessageSerializer.summary_fields,
+        )
+
+    def test_list_unread_messages_not_modified(self):
+        self.client.force_login(self.receiver)
+        url = reverse("messaging:async-unread-messages-list")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_read_message_marks_it_read(self):
+        url = reverse("messaging:async-read-message", kwargs={"pk": self.message.pk})
+        response = self.client.get(url, **self.basic_auth("receiver"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()["is_read"])
+        self.message.refresh_from_db()
+        self.assertTrue(self.message.is_read)
+
+    def test_read_message_of_another_user(self):
+        User.objects.create_user("other", "other@example.com", "testpassword")
+        url = reverse("messaging:async-read-message", kwargs={"pk": self.message.pk})
+        response = self.client.get(url, **self.basic_auth("other"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_read_missing_message(self):
+        url = reverse("messaging:async-read-message", kwargs={"pk": 999999})
+        response = self.client.get(url, **self.basic_auth("receiver"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json()["error"], "Not Found")
+
+    def test_send_message(self):
+        self.client.force_login(self.sender)
+        response = self.client.post(
+            reverse("messaging:async-send-message"),
+            {
+                "sender": self.sender.id,
+                "receiver": self.receiver.id,
+                "subject": "Async Subject",
+                "message": "Test message content",
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Message.objects.filter(subject="Async Subject").exists())
+
+    def test_send_invalid_message(self):
+        self.client.force_login(self.sender)
+        response = self.client.post(
+            reverse("messaging:async-send-message"),
+            {"sender": self.sender.id, "receiver": self.receiver.id, "subject": " "},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("subject", response.json()["details"])
+
+    def test_unauthenticated(self):
+        response = self.client.get(reverse("messaging:async-user-messages-list"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_credentials(self):
+        response = self.client.get(
+            reverse("messaging:async-user-messages-list"),
+            **self.basic_auth("receiver", "wrong"),
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,270 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import skipIf, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from messaging.mailbox import get_unread_count
+from messaging.models import (
+    ArchivedMessage,
+    MailboxCounter,
+    Message,
+    MessageBody,
+    ThreadMembership,
+)
+from messaging.partitions import add_months, get_partitions, is_partitioned, month_start
+from messaging.search import search_messages
+from messaging.services import create_messages, delete_unused_bodies
+
+
+class ExplainMailboxQueriesCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = User.objects.create_user(username="sender", password="password")
+        cls.receiver = User.objects.create_user(
+            username="receiver", password="password"
+        )
+        Message.objects.create(
+            sender=cls.sender,
+            receiver=cls.receiver,
+            subject="Test Subject",
+            message="Test Message",
+        )
+
+    def test_prints_a_plan_for_each_view(self):
+        out = StringIO()
+        call_command("explain_mailbox_queries", user="receiver", stdout=out)
+        output = out.getvalue()
+        self.assertIn("UserMessagesListView (received), next page", output)
+        self.assertIn("UnreadMessagesListView (received), first page", output)
+
+
+class RebuildUnreadCountersCommandTest(TestCase):
+    def test_rebuilds_counters(self):
+        sender = User.objects.create_user(username="sender", password="password")
+        receiver = User.objects.create_user(username="receiver", password="password")
+        create_messages(
+            [Message(sender=sender, receiver=receiver, subject="s", message="m")]
+        )
+        MailboxCounter.objects.filter(user=receiver).update(unread_count=10)
+        ThreadMembership.objects.filter(user=receiver).update(unread_count=10)
+
+        out = StringIO()
+        call_command("rebuild_unread_counters", stdout=out)
+        self.assertIn(
+            "Corrected 1 mailbox and 1 thread unread counters.", out.getvalue()
+        )
+        self.assertEqual(MailboxCounter.objects.get(user=receiver).unread_count, 1)
+        self.assertEqual(ThreadMembership.objects.get(user=receiver).unread_count, 1)
+
+        out = StringIO()
+        call_command("rebuild_unread_counters", user_ids=[receiver.pk], stdout=out)
+        self.assertEqual(out.getvalue(), "The unread counters are up to date.\n")
+
+
+class SeedMessagesCommandTest(TestCase):
+    def test_seeds_skewed_mailboxes(self):
+        out = StringIO()
+        call_command(
+            "seed_messages", users=10, messages=500, batch_size=200, stdout=out
+        )
+        self.assertIn("Seeded 500 messages between 10 users", out.getvalue())
+        self.assertEqual(
+            User.objects.filter(username__startswith="seed-user-").count(), 10
+        )
+        self.assertEqual(Message.objects.count(), 500)
+        self.assertFalse(Message.objects.filter(sender=F("receiver")).exists())
+
+        most_active, least_active = (
+            User.objects.get(username=f"seed-user-{index}") for index in (0, 9)
+        )
+        self.assertGreater(
+            Message.objects.filter(receiver=most_active).count(),
+            Message.objects.filter(receiver=least_active).count(),
+        )
+        self.assertEqual(
+            MailboxCounter.objects.get(user=most_active).unread_count,
+            Message.objects.filter(receiver=most_active, is_read=False).count(),
+        )
+        self.assertTrue(most_active.check_password("password"))
+
+        # Seeding again reuses the users.
+        call_command("seed_messages", users=10, messages=10, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 10)
+
+
+class PartitionMessagesCommandTest(TestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(username="sender", password="password")
+        self.receiver = User.objects.create_user(
+            username="receiver", password="password"
+        )
+        self.old, self.recent = create_messages(
+            [
+                Message(
+                    sender=self.sender,
+                    receiver=self.receiver,
+                    subject=subject,
+                    message="Test Message",
+                )
+                for subject in ("Old", "Recent")
+            ]
+        )
+        Message.objects.filter(pk=self.old.pk).update(
+            creation_date=timezone.now() - timedelta(days=400)
+        )
+
+    def test_archives_old_messages(self):
+        out = StringIO()
+        call_command("partition_messages", archive_after=12, stdout=out)
+        self.assertIn("Archived 1 messages.", out.getvalue())
+
+        self.assertQuerySetEqual(Message.objects.all(), [self.recent])
+        archived = ArchivedMessage.objects.get()
+        self.assertEqual(
+            (archived.pk, archived.subject, archived.sender_id, archived.thread_id),
+            (self.old.pk, "Old", self.sender.pk, self.old.thread_id),
+        )
+        # Archived messages are no longer counted as unread.
+        self.assertEqual(get_unread_count(self.receiver), 1)
+        self.assertEqual(
+            ThreadMembership.objects.get(user=self.receiver).unread_count, 1
+        )
+
+    @override_settings(MESSAGING={"ARCHIVE_AFTER_MONTHS": 24})
+    def test_archive_after_setting(self):
+        out = StringIO()
+        call_command("partition_messages", stdout=out)
+        self.assertIn("Archived 0 messages.", out.getvalue())
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_nothing_is_archived_by_default(self):
+        out = StringIO()
+        call_command("partition_messages", stdout=out)
+        self.assertEqual(out.getvalue(), "")
+        self.assertFalse(ArchivedMessage.objects.exists())
+
+    @skipIf(connection.vendor == "postgresql", "Partitioning requires PostgreSQL.")
+    def test_partitioning_requires_postgresql(self):
+        with self.assertRaisesMessage(CommandError, "requires PostgreSQL"):
+            call_command("partition_messages", setup=True, stdout=StringIO())
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitioning requires PostgreSQL.")
+class PartitionedMessagesCommandTest(TestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(username="sender", password="password")
+        self.receiver = User.objects.create_user(
+            username="receiver", password="password"
+        )
+        self.old, self.recent = create_messages(
+            [
+                Message(
+                    sender=self.sender,
+                    receiver=self.receiver,
+                    subject=subject,
+                    message="Test Message",
+                )
+                for subject in ("Old", "Recent")
+            ]
+        )
+        self.old_date = timezone.now() - timedelta(days=400)
+        Message.objects.filter(pk=self.old.pk).update(creation_date=self.old_date)
+        out = StringIO()
+        call_command("partition_messages", setup=True, months_ahead=1, stdout=out)
+        self.assertIn("Partitioned the messages table into", out.getvalue())
+
+    def test_messages_are_moved_to_monthly_partitions(self):
+        self.assertTrue(is_partitioned(connection))
+        partitions = get_partitions(connection)
+        month = month_start(timezone.now())
+        self.assertIn(month_start(self.old_date), partitions)
+        self.assertIn(add_months(month, 1), partitions)
+        self.assertQuerySetEqual(
+            Message.objects.order_by("creation_date"), [self.old, self.recent]
+        )
+
+        (message,) = create_messages(
+            [
+                Message(
+                    sender=self.sender,
+                    receiver=self.receiver,
+                    subject="Partitioned",
+                    message="Searchable words",
+                )
+            ]
+        )
+        self.assertGreater(message.pk, self.recent.pk)
+        self.assertEqual(
+            list(search_messages(Message.objects.all(), "searchable")), [message]
+        )
+
+    def test_archive_drops_old_partitions(self):
+        out = StringIO()
+        call_command("partition_messages", archive_after=12, stdout=out)
+        self.assertIn("Archived 1 messages.", out.getvalue())
+        self.assertNotIn(month_start(self.old_date), get_partitions(connection))
+        self.assertQuerySetEqual(Message.objects.all(), [self.recent])
+        self.assertEqual(ArchivedMessage.objects.get().pk, self.old.pk)
+        self.assertEqual(get_unread_count(self.receiver), 1)
+
+    def test_archive_the_default_partition(self):
+        # Older than the first monthly partition.
+        Message.objects.filter(pk=self.recent.pk).update(
+            creation_date=self.old_date - timedelta(days=100)
+        )
+        out = StringIO()
+        call_command("partition_messages", archive_after=12, stdout=out)
+        self.assertIn("Archived 2 messages.", out.getvalue())
+        self.assertFalse(Message.objects.exists())
+
+
+class PurgeMessageBodiesCommandTest(TestCase):
+    def test_deletes_unused_bodies(self):
+        user = User.objects.create_user(username="user", password="password")
+        messages = [
+            Message.objects.create(
+                sender=user, receiver=user, subject="s", message=text
+            )
+            for text in ("Kept", "Deleted", "Deleted")
+        ]
+        messages[1].delete()
+        call_command("purge_message_bodies", stdout=StringIO())
+        self.assertEqual(MessageBody.objects.count(), 2)
+
+        messages[2].delete()
+        out = StringIO()
+        call_command("purge_message_bodies", stdout=out)
+        self.assertIn("Deleted 1 unused bodies.", out.getvalue())
+        self.assertEqual(
+            list(MessageBody.objects.values_list("text", flat=True)), ["Kept"]
+        )
+
+
+@skipUnless(connection.vendor == "postgresql", "Row locks require PostgreSQL.")
+class PurgeMessageBodiesLockTest(TransactionTestCase):
+    def purge_in_another_connection(self):
+        deleted = []
+
+        def purge():
+            try:
+                deleted.append(delete_unused_bodies())
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=purge)
+        thread.start()
+        thread.join()
+        return deleted[0]
+
+    def test_skips_the_bodies_of_the_sends_in_progress(self):
+        with transaction.atomic():
+            MessageBody.store(["Sending"])
+            self.assertEqual(self.purge_in_another_connection(), 0)
+        self.assertEqual(self.purge_in_another_connection(), 1)
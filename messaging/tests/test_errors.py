@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..errors import server_error
+
+
+class ErrorEnvelopeTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+
+    def test_validation_error_envelope(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse("messaging:send-message"), {})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["error"], "Invalid data")
+        self.assertIn("subject", response.json()["details"])
+
+    def test_api_not_found_envelope(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("messaging:read-message", kwargs={"pk": 999999})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            response.json(), {"status": 404, "error": "Not Found", "details": None}
+        )
+
+    def test_unknown_url_envelope(self):
+        response = self.client.get("/does-not-exist/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            response.json(), {"status": 404, "error": "Not Found", "details": None}
+        )
+
+    def test_forbidden_is_not_enveloped(self):
+        response = self.client.get(reverse("messaging:user-messages-list"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIn("detail", response.json())
+
+
+class ServerErrorHandlerTestCase(SimpleTestCase):
+    def test_server_error_envelope(self):
+        response = server_error(RequestFactory().get("/"))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(
+            response.content,
+            b'{"status": 500, "error": "Internal Server Error", "details": null}',
+        )
@@ -0,0 +1,137 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..instrumentation import Histogram
+from ..models import Message
+
+INSTRUMENTED = {"INSTRUMENTATION": True}
+
+
+def parse_server_timing(header):
+    """
+    Return a mapping of metric name to its parameters.
+    """
+    metrics = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+@override_settings(MESSAGING=INSTRUMENTED)
+class InstrumentationMiddlewareTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+        self.other_user = User.objects.create_user(
+            "otheruser", "otheruser@example.com", "testpassword"
+        )
+        Message.objects.create(
+            sender=self.other_user,
+            receiver=self.user,
+            subject="Test Subject",
+            message="Test message content",
+        )
+
+    def test_server_timing_header_and_log_line(self):
+        self.client.login(username="testuser", password="testpassword")
+        url = reverse("messaging:user-messages-list")
+        with self.assertLogs("messaging.instrumentation", "INFO") as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        metrics = parse_server_timing(response["Server-Timing"])
+        self.assertEqual(list(metrics), ["auth", "db", "serialize", "render", "total"])
+        self.assertEqual(
+            metrics["db"]["desc"], f'"{len(queries.captured_queries)} queries"'
+        )
+        for name in ("auth", "db", "serialize", "render"):
+            self.assertGreater(float(metrics[name]["dur"]), 0)
+            self.assertLessEqual(
+                float(metrics[name]["dur"]), float(metrics["total"]["dur"])
+            )
+
+        (line,) = logs.output
+        self.assertIn("view=messaging:user-messages-list method=GET status=200", line)
+        self.assertIn(f"queries={len(queries.captured_queries)} ", line)
+        self.assertEqual(logs.records[0].queries, len(queries.captured_queries))
+
+    def test_async_views_are_instrumented(self):
+        self.client.login(username="testuser", password="testpassword")
+        with self.assertLogs("messaging.instrumentation", "INFO"):
+            response = self.client.get(reverse("messaging:async-user-messages-list"))
+        metrics = parse_server_timing(response["Server-Timing"])
+        self.assertGreater(float(metrics["serialize"]["dur"]), 0)
+        self.assertNotEqual(metrics["db"]["desc"], '"0 queries"')
+
+    async def test_asgi_requests_are_instrumented(self):
+        await self.async_client.aforce_login(self.user)
+        with self.assertLogs("messaging.instrumentation", "INFO"):
+            for name in ("user-messages-list", "async-user-messages-list"):
+                response = await self.async_client.get(reverse(f"messaging:{name}"))
+                metrics = parse_server_timing(response["Server-Timing"])
+                self.assertGreater(float(metrics["db"]["dur"]), 0)
+                self.assertNotEqual(metrics["db"]["desc"], '"0 queries"')
+
+    def test_metrics_endpoint(self):
+        self.client.force_authenticate(user=self.user)
+        with self.assertLogs("messaging.instrumentation", "INFO"):
+            self.client.get(reverse("messaging:unread-count"))
+            response = self.client.get(reverse("messaging:metrics"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = User.objects.create_superuser("admin", password="testpassword")
+        self.client.force_authenticate(user=admin)
+        with self.assertLogs("messaging.instrumentation", "INFO"):
+            response = self.client.get(reverse("messaging:metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn("# TYPE messaging_request_duration_seconds histogram", body)
+        self.assertRegex(
+            body,
+            r'messaging_request_duration_seconds_count\{view="messaging:unread-count",'
+            r'method="GET"\} [1-9]',
+        )
+        self.assertIn(
+            'messaging_request_phase_duration_seconds_bucket{view="messaging:unread-count",'
+            'phase="db",le="+Inf"}',
+            body,
+        )
+
+
+class InstrumentationDisabledTestCase(TestCase):
+    def test_no_header_and_no_metrics(self):
+        user = User.objects.create_superuser("admin", password="testpassword")
+        self.client.force_login(user)
+        response = self.client.get(reverse("messaging:unread-count"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", response)
+        response = self.client.get(reverse("messaging:metrics"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class HistogramTestCase(SimpleTestCase):
+    def test_prometheus_text_format(self):
+        histogram = Histogram("latency_seconds", "Latency.", ("view",), (0.125, 1))
+        for value in (0.0625, 0.125, 0.5, 3):
+            histogram.observe(value, 'a"b')
+        self.assertEqual(
+            histogram.collect(),
+            [
+                "# HELP latency_seconds Latency.",
+                "# TYPE latency_seconds histogram",
+                'latency_seconds_bucket{view="a\\"b",le="0.125"} 2',
+                'latency_seconds_bucket{view="a\\"b",le="1"} 3',
+                'latency_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+                'latency_seconds_sum{view="a\\"b"} 3.6875',
+                'latency_seconds_count{view="a\\"b"} 4',
+            ],
+        )
@@ -0,0 +1,101 @@
+import threading
+import time
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+
+from messaging.mailbox import (
+    get_unread_count,
+    rebuild_unread_counts,
+    record_mailbox_changes,
+)
+from messaging.models import MailboxCounter, Message
+from messaging.services import create_messages, delete_messages, mark_messages_read
+
+
+class UnreadCounterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = User.objects.create_user(username="sender", password="password")
+        cls.receiver = User.objects.create_user(
+            username="receiver", password="password"
+        )
+
+    def test_unread_count_without_counter(self):
+        self.assertEqual(get_unread_count(self.receiver), 0)
+
+    def test_adjust_creates_missing_counters_from_the_messages(self):
+        Message.objects.create(
+            sender=self.sender, receiver=self.receiver, subject="s", message="m"
+        )
+        record_mailbox_changes(unread_deltas={self.sender.pk: 1, self.receiver.pk: 1})
+        self.assertEqual(get_unread_count(self.sender), 0)
+        self.assertEqual(get_unread_count(self.receiver), 1)
+        record_mailbox_changes(unread_deltas={self.receiver.pk: 2})
+        self.assertEqual(get_unread_count(self.receiver), 3)
+
+    def test_adjust_existing_counters_in_a_single_query(self):
+        record_mailbox_changes(unread_deltas={self.sender.pk: 1, self.receiver.pk: 1})
+        with self.assertNumQueries(1):
+            record_mailbox_changes(
+                unread_deltas={self.sender.pk: 1, self.receiver.pk: 1}
+            )
+
+    def test_rebuild_fixes_drift(self):
+        Message.objects.create(
+            sender=self.sender, receiver=self.receiver, subject="s", message="m"
+        )
+        Message.objects.create(
+            sender=self.sender,
+            receiver=self.receiver,
+            subject="s",
+            message="m",
+            is_read=True,
+        )
+        MailboxCounter.objects.create(user=self.sender, unread_count=5)
+        MailboxCounter.objects.create(user=self.receiver, unread_count=7)
+
+        rebuild_unread_counts()
+
+        self.assertEqual(get_unread_count(self.sender), 0)
+        self.assertEqual(get_unread_count(self.receiver), 1)
+
+
+@skipUnless(connection.vendor == "postgresql", "Row locks require PostgreSQL.")
+class BulkChangeLockTest(TransactionTestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(username="sender", password="password")
+        self.receiver = User.objects.create_user(
+            username="receiver", password="password"
+        )
+        (self.message,) = create_messages(
+            [
+                Message(
+                    sender=self.sender,
+                    receiver=self.receiver,
+                    subject="s",
+                    message="m",
+                )
+            ]
+        )
+
+    def test_concurrent_delete_and_read_update_the_counter_once(self):
+        marked = []
+
+        def mark_read():
+            try:
+                marked.append(mark_messages_read(self.receiver, ids=[self.message.pk]))
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=mark_read)
+        with transaction.atomic():
+            self.assertEqual(delete_messages(self.receiver, ids=[self.message.pk]), 1)
+            thread.start()
+            # Let the bulk read wait for the lock of the deleted message.
+            time.sleep(0.2)
+        thread.join()
+        self.assertEqual(marked, [0])
+        self.assertEqual(get_unread_count(self.receiver), 0)
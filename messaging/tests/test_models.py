@@ -1,8 +1,9 @@
 from django.contrib.auth.models import User
 from django.forms import ValidationError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from messaging.models import Message
+from messaging.models import Message, MessageBody
+from messaging.services import create_messages
 
 
 class MessageModelTest(TestCase):
@@ -71,3 +72,59 @@ class MessageModelTest(TestCase):
 
         with self.assertRaises(ValidationError):
             message_with_blank_message.full_clean()
+
+
+class MessageBodyTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = User.objects.create_user(username="sender", password="password")
+        cls.receivers = [
+            User.objects.create_user(username=f"receiver{index}", password="password")
+            for index in range(3)
+        ]
+
+    def send(self, text):
+        return create_messages(
+            [
+                Message(
+                    sender=self.sender, receiver=receiver, subject="s", message=text
+                )
+                for receiver in self.receivers
+            ]
+        )
+
+    def test_messages_with_the_same_text_share_a_body(self):
+        messages = self.send("Same text")
+        self.send("Same text")
+        body = MessageBody.objects.get()
+        self.assertEqual({message.body_id for message in messages}, {body.pk})
+        self.assertEqual(body.text, "Same text")
+        self.assertIsNone(body.compressed_text)
+
+    @override_settings(MESSAGING={"BODY_COMPRESSION_THRESHOLD": 100})
+    def test_long_bodies_are_compressed(self):
+        text = "A long and repetitive message. " * 10
+        (message, *_) = self.send(text)
+        body = MessageBody.objects.get()
+        self.assertIsNone(body.text)
+        self.assertLess(len(body.compressed_text), len(text))
+        message = Message.objects.select_related("body").get(pk=message.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(message.message, text)
+
+    def test_text_is_read_from_the_body_once(self):
+        (message, *_) = self.send("Text")
+        message = Message.objects.get(pk=message.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(message.message, "Text")
+            self.assertEqual(message.message, "Text")
+
+    def test_changing_the_text_stores_a_new_body(self):
+        message = Message.objects.create(
+            sender=self.sender, receiver=self.sender, subject="s", message="Before"
+        )
+        message.message = "After"
+        message.save()
+        message = Message.objects.get(pk=message.pk)
+        self.assertEqual(message.message, "After")
+        self.assertEqual(MessageBody.objects.count(), 2)
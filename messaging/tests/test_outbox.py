@@ -0,0 +1,87 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..models import MailboxCounter, Message, OutboxMessage, ThreadMembership
+from ..services import drain_outbox
+
+
+@override_settings(MESSAGING={"ASYNC_SEND": True})
+class AsyncSendTestCase(APITestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            "sender", "sender@example.com", "testpassword"
+        )
+        self.receiver = User.objects.create_user(
+            "receiver", "receiver@example.com", "testpassword"
+        )
+        self.payload = {
+            "sender": self.sender.id,
+            "receiver": self.receiver.id,
+            "subject": "Test Subject",
+            "message": "Test message content",
+        }
+
+    def test_send_queues_the_message(self):
+        self.client.force_authenticate(user=self.sender)
+        # The validation of the sender and the receiver, and the insert in the outbox.
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse("messaging:send-message"), self.payload)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        queued = OutboxMessage.objects.get()
+        self.assertEqual(response.data["id"], queued.pk)
+        self.assertEqual(response.data["receiver"], self.receiver.pk)
+        self.assertFalse(Message.objects.exists())
+
+        self.assertEqual(drain_outbox(), 1)
+        message = Message.objects.get()
+        self.assertEqual(message.sender, self.sender)
+        self.assertEqual(message.subject, "Test Subject")
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(MailboxCounter.objects.get(user=self.receiver).unread_count, 1)
+        self.assertEqual(
+            ThreadMembership.objects.get(user=self.receiver).unread_count, 1
+        )
+
+    def test_invalid_message_is_rejected(self):
+        self.client.force_authenticate(user=self.sender)
+        response = self.client.post(
+            reverse("messaging:send-message"), {**self.payload, "subject": " "}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_async_view_queues_the_message(self):
+        self.client.force_login(self.sender)
+        response = self.client.post(
+            reverse("messaging:async-send-message"), self.payload, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()["id"], OutboxMessage.objects.get().pk)
+        self.assertFalse(Message.objects.exists())
+
+
+class DrainOutboxCommandTest(TestCase):
+    def test_drains_the_outbox_in_batches(self):
+        sender = User.objects.create_user(username="sender", password="password")
+        receiver = User.objects.create_user(username="receiver", password="password")
+        OutboxMessage.objects.bulk_create(
+            OutboxMessage(
+                sender=sender, receiver=receiver, subject=f"Subject {i}", message="m"
+            )
+            for i in range(5)
+        )
+        out = StringIO()
+        call_command("drain_outbox", batch_size=2, stdout=out)
+        self.assertIn("Sent 5 queued messages", out.getvalue())
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(
+            list(Message.objects.order_by("pk").values_list("subject", flat=True)),
+            [f"Subject {i}" for i in range(5)],
+        )
+        self.assertEqual(MailboxCounter.objects.get(user=receiver).unread_count, 5)
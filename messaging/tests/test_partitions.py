@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta, timezone
+
+from django.test import SimpleTestCase
+
+from ..partitions import add_months, get_partition_name, month_start
+
+
+class MonthTestCase(SimpleTestCase):
+    def test_month_start_is_in_utc(self):
+        date = datetime(2026, 3, 1, 1, 30, tzinfo=timezone(timedelta(hours=2)))
+        self.assertEqual(month_start(date), datetime(2026, 2, 1, tzinfo=timezone.utc))
+
+    def test_add_months(self):
+        month = datetime(2026, 11, 1, tzinfo=timezone.utc)
+        self.assertEqual(
+            add_months(month, 2), datetime(2027, 1, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(
+            add_months(month, -11), datetime(2025, 12, 1, tzinfo=timezone.utc)
+        )
+
+    def test_partition_name(self):
+        month = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        self.assertEqual(get_partition_name(month), "messaging_message_p2026_03")
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..async_views import AsyncMessageStreamView
+from ..models import Message
+from ..pubsub import InProcessBroker, get_broker
+
+
+class InProcessBrokerTestCase(TestCase):
+    async def test_publish_from_another_thread(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(1)
+        other = broker.subscribe(2)
+
+        thread = threading.Thread(
+            target=broker.publish, args=([(1, {"id": 1}), (3, {"id": 2})],)
+        )
+        thread.start()
+        thread.join()
+
+        self.assertEqual(await subscription.get(timeout=1), {"id": 1})
+        with self.assertRaises((TimeoutError, asyncio.TimeoutError)):
+            await other.get(timeout=0.05)
+
+    async def test_closed_subscription_receives_nothing(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(1)
+        subscription.close()
+        broker.publish([(1, {"id": 1})])
+        await asyncio.sleep(0)
+        self.assertTrue(subscription.queue.empty())
+
+
+@override_settings(
+    MESSAGING={"STREAM_HEARTBEAT_INTERVAL": 0.05, "STREAM_MAX_DURATION": 0.5}
+)
+class MessageStreamTestCase(TestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            "sender", "sender@example.com", "testpassword"
+        )
+        self.receiver = User.objects.create_user(
+            "receiver", "receiver@example.com", "testpassword"
+        )
+
+    async def test_new_message_is_pushed(self):
+        stream = AsyncMessageStreamView().stream(self.receiver)
+        self.assertTrue((await anext(stream)).startswith("retry:"))
+
+        next_event = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        get_broker().publish([(self.receiver.pk, {"id": 42, "subject": "Hello"})])
+        event = await next_event
+        await stream.aclose()
+
+        self.assertIn("id: 42\nevent: message\n", event)
+        data = json.loads(event.split("data: ", 1)[1])
+        self.assertEqual(data["subject"], "Hello")
+
+    async def test_idle_stream_sends_keep_alive(self):
+        stream = AsyncMessageStreamView().stream(self.receiver)
+        await anext(stream)
+        self.assertEqual(await anext(stream), ": keep-alive\n\n")
+        await stream.aclose()
+
+    async def test_missed_messages_are_replayed(self):
+        first = await Message.objects.acreate(
+            sender=self.sender, receiver=self.receiver, subject="1", message="m"
+        )
+        second = await Message.objects.acreate(
+            sender=self.sender, receiver=self.receiver, subject="2", message="m"
+        )
+        stream = AsyncMessageStreamView().stream(self.receiver, first.pk)
+        await anext(stream)
+        event = await anext(stream)
+        await stream.aclose()
+        self.assertIn(f"id: {second.pk}\n", event)
+
+    def test_send_publishes_after_commit(self):
+        received = []
+        broker = get_broker()
+        original = broker.publish
+        broker.publish = lambda events: received.extend(events)
+        try:
+            self.client.force_login(self.sender)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse("messaging:send-message"),
+                    {
+                        "sender": self.sender.id,
+                        "receiver": self.receiver.id,
+                        "subject": "Test Subject",
+                        "message": "Test message content",
+                    },
+                )
+        finally:
+            broker.publish = original
+        self.assertEqual(len(received), 1)
+        user_id, event = received[0]
+        self.assertEqual(user_id, self.receiver.pk)
+        self.assertEqual(event["subject"], "Test Subject")
+        self.assertNotIn("message", event)
+
+    async def test_stream_endpoint(self):
+        await self.async_client.aforce_login(self.receiver)
+        response = await self.async_client.get(
+            reverse("messaging:async-message-stream")
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+    def test_stream_endpoint_refuses_wsgi(self):
+        self.client.force_login(self.receiver)
+        response = self.client.get(reverse("messaging:async-message-stream"))
+        self.assertEqual(response.status_code, 501)
@@ -0,0 +1,155 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from .. import urls
+from ..models import Message, ThreadMembership
+from ..services import create_messages
+from ..views import ReadMessageView
+
+# Endpoints without a query budget.
+EXEMPT = {"async-message-stream"}
+
+
+def message_payload(test):
+    return {
+        "sender": test.user.pk,
+        "receiver": test.other_user.pk,
+        "subject": "Test Subject",
+        "message": "Test message content",
+    }
+
+
+# The request sent to each endpoint: method, URL kwargs and body or query string.
+ENDPOINTS = {
+    "send-message": lambda t: ("post", None, message_payload(t)),
+    "bulk-send-messages": lambda t: (
+        "post",
+        None,
+        {"receivers": [t.other_user.pk], "subject": "Subject", "message": "Content"},
+    ),
+    "user-messages-list": lambda t: ("get", None, {}),
+    "unread-messages-list": lambda t: ("get", None, {}),
+    "unread-count": lambda t: ("get", None, {}),
+    "export-messages": lambda t: ("get", None, {}),
+    "bulk-read-messages": lambda t: ("post", None, {"ids": [t.unread_id()]}),
+    "bulk-delete-messages": lambda t: ("post", None, {"ids": [t.unread_id()]}),
+    "search-messages": lambda t: ("get", None, {"q": "subject"}),
+    "metrics": lambda t: ("get", None, {}),
+    "thread-list": lambda t: ("get", None, {}),
+    "thread-messages": lambda t: ("get", {"pk": t.thread_id()}, {}),
+    "read-message": lambda t: ("get", {"pk": t.unread_id()}, {}),
+    "delete-message": lambda t: ("delete", {"pk": t.unread_id()}, None),
+    "async-user-messages-list": lambda t: ("get", None, {}),
+    "async-unread-messages-list": lambda t: ("get", None, {}),
+    "async-send-message": lambda t: ("post", None, message_payload(t)),
+    "async-read-message": lambda t: ("get", {"pk": t.unread_id()}, {}),
+}
+
+
+@override_settings(MESSAGING={"INSTRUMENTATION": True})
+class QueryBudgetTestCase(TestCase):
+    # Number of messages in the mailbox of the user at each round of requests.
+    mailbox_sizes = (1, 25, 100)
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword", is_staff=True
+        )
+        self.other_user = User.objects.create_user(
+            "otheruser", "otheruser@example.com", "testpassword"
+        )
+        # Session authentication costs more queries than HTTP Basic.
+        self.client.login(username="testuser", password="testpassword")
+
+    def fill_mailbox(self, count):
+        create_messages(
+            [
+                Message(
+                    sender=self.other_user if index % 2 else self.user,
+                    receiver=self.user if index % 2 else self.other_user,
+                    subject=f"Subject {index}",
+                    message="Test message content",
+                )
+                for index in range(count)
+            ]
+        )
+
+    def unread_id(self):
+        """
+        Return a new unread message received by the user.
+        """
+        (message,) = create_messages(
+            [
+                Message(
+                    sender=self.other_user,
+                    receiver=self.user,
+                    subject="Test Subject",
+                    message="Test message content",
+                )
+            ]
+        )
+        return message.pk
+
+    def thread_id(self):
+        return ThreadMembership.objects.filter(user=self.user).first().thread_id
+
+    def count_queries(self, name):
+        """
+        Send the request of an endpoint and return its view and number of queries.
+        """
+        method, kwargs, data = ENDPOINTS[name](self)
+        url = reverse(f"messaging:{name}", kwargs=kwargs)
+        with self.assertLogs("messaging.instrumentation", "INFO"):
+            with CaptureQueriesContext(connection) as queries:
+                if method == "get":
+                    response = self.client.get(url, data)
+                else:
+                    response = getattr(self.client, method)(
+                        url, data, content_type="application/json"
+                    )
+                # Streaming responses query the database while they are consumed.
+                b"".join(response)
+        self.assertLess(response.status_code, 400, name)
+        return resolve(url).func.view_class, len(queries.captured_queries)
+
+    def test_every_endpoint_has_a_budget(self):
+        for pattern in urls.urlpatterns:
+            if pattern.name in EXEMPT:
+                continue
+            with self.subTest(endpoint=pattern.name):
+                self.assertIn(pattern.name, ENDPOINTS)
+                self.assertIsNotNone(pattern.callback.view_class.query_budget)
+
+    def test_queries_stay_within_budget_as_the_mailbox_grows(self):
+        counts = defaultdict(set)
+        size = 0
+        for mailbox_size in self.mailbox_sizes:
+            self.fill_mailbox(mailbox_size - size)
+            size = mailbox_size
+            for name in ENDPOINTS:
+                with self.subTest(endpoint=name, mailbox_size=size):
+                    view_class, count = self.count_queries(name)
+                    self.assertLessEqual(count, view_class.query_budget)
+                    counts[name].add(count)
+        for name, endpoint_counts in counts.items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(len(endpoint_counts), 1, sorted(endpoint_counts))
+
+    def test_exceeded_budget_is_logged(self):
+        url = reverse("messaging:read-message", kwargs={"pk": self.unread_id()})
+        original = ReadMessageView.query_budget
+        ReadMessageView.query_budget = 1
+        try:
+            with self.assertLogs("messaging.instrumentation", "WARNING") as logs:
+                self.client.get(url)
+        finally:
+            ReadMessageView.query_budget = original
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn(
+            "view=messaging:read-message exceeded its query budget", logs.output[0]
+        )
@@ -0,0 +1,70 @@
+import io
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from .. import renderers
+from ..renderers import ORJSONParser, ORJSONRenderer
+
+
+class ORJSONRendererTestCase(SimpleTestCase):
+    data = {
+        "utc": datetime(2023, 1, 1, 12, 30, tzinfo=timezone.utc),
+        "local": datetime(2023, 1, 1, 14, 30, 0, 123456, timezone(timedelta(hours=2))),
+        "naive": datetime(2023, 1, 1, 12, 30),
+        "date": date(2023, 1, 1),
+        "decimal": Decimal("12.50"),
+        "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "lazy": gettext_lazy("Not found."),
+        "error": [ErrorDetail("Invalid", code="invalid")],
+        "text": 'Sujet ✉ \u2028\u2029 "quoted"',
+        1: [True, None, 1.5],
+    }
+
+    def test_same_output_as_json_renderer(self):
+        self.assertEqual(
+            ORJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+
+    def test_none(self):
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_indented_output_falls_back(self):
+        self.assertEqual(
+            ORJSONRenderer().render(self.data, "application/json; indent=4"),
+            JSONRenderer().render(self.data, "application/json; indent=4"),
+        )
+
+    def test_without_orjson(self):
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(
+                ORJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+            )
+
+
+class ORJSONParserTestCase(SimpleTestCase):
+    body = '{"subject": "Sujet ✉", "receivers": [1, 2]}'.encode("utf-8")
+
+    def test_same_output_as_json_parser(self):
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(self.body)),
+            JSONParser().parse(io.BytesIO(self.body)),
+        )
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"subject": '))
+
+    def test_other_encoding_falls_back(self):
+        body = '{"subject": "Sujet"}'.encode("utf-16")
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body), None, {"encoding": "utf-16"}),
+            {"subject": "Sujet"},
+        )
@@ -0,0 +1,143 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..models import Message
+from ..pagination import MessageKeysetPagination
+from ..routers import (
+    ReplicaRouter,
+    _read_from_replicas,
+    is_pinned_to_primary,
+    read_from_primary,
+    read_from_replicas,
+)
+from ..services import read_message
+
+REPLICAS = {"READ_REPLICAS": ["replica1", "replica2"]}
+
+
+@override_settings(MESSAGING=REPLICAS)
+class ReplicaRouterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_the_primary_by_default(self):
+        self.assertIsNone(self.router.db_for_read(Message))
+
+    def test_reads_from_replicas(self):
+        with read_from_replicas():
+            self.assertIn(self.router.db_for_read(Message), ["replica1", "replica2"])
+            with read_from_primary():
+                self.assertIsNone(self.router.db_for_read(Message))
+
+    def test_reads_in_a_transaction_use_the_primary(self):
+        with read_from_replicas(), mock.patch.object(
+            connections["default"], "in_atomic_block", True
+        ):
+            self.assertIsNone(self.router.db_for_read(Message))
+
+    @override_settings(MESSAGING={"READ_REPLICAS": []})
+    def test_without_replicas(self):
+        with read_from_replicas():
+            self.assertIsNone(self.router.db_for_read(Message))
+
+    def test_writes_use_the_primary(self):
+        with read_from_replicas():
+            self.assertEqual(self.router.db_for_write(Message), "default")
+
+    def test_migrations_skip_the_replicas(self):
+        self.assertFalse(self.router.allow_migrate("replica1", "messaging"))
+        self.assertIsNone(self.router.allow_migrate("default", "messaging"))
+
+
+@override_settings(MESSAGING={"READ_REPLICAS": ["default"]})
+class ReplicaReadTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+        self.other = User.objects.create_user(
+            "other", "other@example.com", "testpassword"
+        )
+        self.url = reverse("messaging:user-messages-list")
+        self.client.force_authenticate(user=self.user)
+
+    def list_reads_from_replicas(self):
+        used = []
+        paginate_rows = MessageKeysetPagination.paginate_rows
+
+        def spy(paginator, *args, **kwargs):
+            used.append(_read_from_replicas.get())
+            return paginate_rows(paginator, *args, **kwargs)
+
+        with mock.patch.object(MessageKeysetPagination, "paginate_rows", spy):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(_read_from_replicas.get())
+        return used[0]
+
+    def test_list_reads_from_replicas(self):
+        self.assertTrue(self.list_reads_from_replicas())
+
+    def test_read_message_reads_from_replicas(self):
+        message = Message.objects.create(
+            sender=self.other,
+            receiver=self.user,
+            subject="Test Subject",
+            message="Test message content",
+        )
+        used = []
+
+        def spy(user, pk):
+            used.append(_read_from_replicas.get())
+            return read_message(user, pk)
+
+        with mock.patch("messaging.views.read_message", spy):
+            response = self.client.get(
+                reverse("messaging:read-message", kwargs={"pk": message.pk})
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(used, [True])
+
+    def test_read_your_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("messaging:send-message"),
+                {
+                    "sender": self.user.pk,
+                    "receiver": self.other.pk,
+                    "subject": "Test Subject",
+                    "message": "Test message content",
+                },
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(is_pinned_to_primary(self.user))
+        self.assertTrue(is_pinned_to_primary(self.other))
+        self.assertFalse(self.list_reads_from_replicas())
+
+    @override_settings(
+        MESSAGING={"READ_REPLICAS": ["default"], "REPLICA_STICKINESS": 0}
+    )
+    def test_stickiness_disabled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(
+                sender=self.user,
+                receiver=self.other,
+                subject="Test Subject",
+                message="Test message content",
+            )
+            self.client.delete(
+                reverse(
+                    "messaging:delete-message",
+                    kwargs={"pk": Message.objects.get().pk},
+                )
+            )
+        self.assertFalse(is_pinned_to_primary(self.user))
+        self.assertTrue(self.list_reads_from_replicas())
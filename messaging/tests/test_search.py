@@ -0,0 +1,109 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..models import Message, MessageBody
+
+
+class SearchMessagesViewTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+        self.other_user = User.objects.create_user(
+            "otheruser", "otheruser@example.com", "testpassword"
+        )
+        self.url = reverse("messaging:search-messages")
+
+    def create_message(self, sender, receiver, subject, message="Test message content"):
+        return Message.objects.create(
+            sender=sender, receiver=receiver, subject=subject, message=message
+        )
+
+    def search(self, **params):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_search_subject_and_message(self):
+        by_subject = self.create_message(self.other_user, self.user, "Quarterly Report")
+        by_message = self.create_message(
+            self.user, self.other_user, "Hello", "The report is attached"
+        )
+        self.create_message(self.other_user, self.user, "Lunch")
+        response = self.search(q="REPORT")
+        self.assertEqual(
+            [message["id"] for message in response.data["messages"]],
+            [by_message.pk, by_subject.pk],
+        )
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_search_matches_every_word(self):
+        match = self.create_message(
+            self.other_user, self.user, "Quarterly report", "Numbers are up"
+        )
+        self.create_message(self.other_user, self.user, "Quarterly planning")
+        response = self.search(q="quarterly numbers")
+        self.assertEqual(
+            [message["id"] for message in response.data["messages"]], [match.pk]
+        )
+
+    def test_search_is_scoped_to_the_user(self):
+        third_user = User.objects.create_user("thirduser", password="testpassword")
+        self.create_message(self.other_user, third_user, "Report")
+        received = self.create_message(self.other_user, self.user, "Report")
+        sent = self.create_message(self.user, self.other_user, "Report")
+        response = self.search(q="report")
+        self.assertEqual(
+            [message["id"] for message in response.data["messages"]],
+            [sent.pk, received.pk],
+        )
+        response = self.search(q="report", direction="received")
+        self.assertEqual(
+            [message["id"] for message in response.data["messages"]], [received.pk]
+        )
+
+    def test_search_pages_and_fields(self):
+        messages = [
+            self.create_message(self.other_user, self.user, f"Report {i}")
+            for i in range(3)
+        ]
+        response = self.search(q="report", page_size=2, fields="id,subject")
+        self.assertEqual(
+            response.data["messages"],
+            [
+                {"id": messages[2].pk, "subject": "Report 2"},
+                {"id": messages[1].pk, "subject": "Report 1"},
+            ],
+        )
+        response = self.search(q="report", cursor=response.data["next_cursor"])
+        self.assertEqual(
+            [message["id"] for message in response.data["messages"]],
+            [messages[0].pk],
+        )
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_search_requires_a_query(self):
+        self.client.force_authenticate(user=self.user)
+        for params in ({}, {"q": "  "}, {"q": "report", "direction": "spam"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_without_authentication(self):
+        response = self.client.get(self.url, {"q": "report"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(MESSAGING={"BODY_COMPRESSION_THRESHOLD": 20})
+    def test_search_compressed_message(self):
+        match = self.create_message(
+            self.other_user, self.user, "Hello", "The REPORT is attached. " * 5
+        )
+        self.create_message(self.other_user, self.user, "Lunch", "Lunch at noon. " * 5)
+        self.assertIsNone(MessageBody.objects.get(pk=match.body_id).text)
+        response = self.search(q="report attached")
+        self.assertEqual(
+            [message["id"] for message in response.data["messages"]], [match.pk]
+        )
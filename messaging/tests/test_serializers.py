@@ -1,8 +1,11 @@
+from datetime import datetime, timezone
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
 
 from ..models import Message
-from ..serializers import MessageSerializer
+from ..serializers import MessageRowSerializer, MessageSerializer
 
 
 class MessageSerializerTestCase(TestCase):
@@ -75,3 +78,59 @@ class MessageSerializerTestCase(TestCase):
         message = serializer.save()
         self.assertEqual(message.subject, self.serializer_data["subject"])
         self.assertEqual(message.message, self.serializer_data["message"])
+
+
+class MessageRowSerializerTestCase(TestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            "sender", "sender@example.com", "testpassword"
+        )
+        self.receiver = User.objects.create_user(
+            "receiver", "receiver@example.com", "testpassword"
+        )
+        for index, creation_date in enumerate(
+            [
+                datetime(2023, 1, 1, tzinfo=timezone.utc),
+                datetime(2023, 7, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+                datetime(2023, 12, 31, 23, 59, 59, tzinfo=timezone.utc),
+            ]
+        ):
+            message = Message.objects.create(
+                sender=self.sender,
+                receiver=self.receiver,
+                subject=f"Sujet n°{index} ✉",
+                # The last one is long enough to be compressed.
+                message='Test "message" content\n' * (index * 50 + 1),
+                is_read=bool(index % 2),
+            )
+            # creation_date is set by auto_now_add on creation.
+            Message.objects.filter(pk=message.pk).update(creation_date=creation_date)
+        self.queryset = Message.objects.order_by("pk")
+
+    def assertSameOutput(self, fields=None):
+        columns = MessageRowSerializer.get_columns(fields)
+        rows = list(self.queryset.values_list(*columns))
+        expected = MessageSerializer(self.queryset, many=True, fields=fields).data
+        output = MessageRowSerializer(columns, fields).serialize(rows)
+        self.assertEqual(JSONRenderer().render(output), JSONRenderer().render(expected))
+
+    def test_identical_output(self):
+        self.assertSameOutput()
+
+    def test_identical_output_with_fields(self):
+        self.assertSameOutput(["subject", "creation_date"])
+        self.assertSameOutput(MessageSerializer.summary_fields)
+
+    @override_settings(TIME_ZONE="UTC")
+    def test_identical_output_in_utc(self):
+        self.assertSameOutput()
+
+    @override_settings(REST_FRAMEWORK={"DATETIME_FORMAT": "%Y-%m-%d %H:%M"})
+    def test_identical_output_with_custom_datetime_format(self):
+        self.assertSameOutput()
+
+    def test_columns(self):
+        self.assertEqual(
+            MessageRowSerializer.get_columns(["receiver", "subject"]),
+            ["id", "receiver_id", "subject", "creation_date"],
+        )
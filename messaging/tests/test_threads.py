@@ -0,0 +1,204 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..models import Message, Thread, ThreadMembership
+from ..services import create_messages
+
+
+class ThreadsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+        self.alice = User.objects.create_user(
+            "alice", "alice@example.com", "testpassword"
+        )
+        self.bob = User.objects.create_user("bob", "bob@example.com", "testpassword")
+        self.list_url = reverse("messaging:thread-list")
+
+    def send(self, sender, receiver, subject="Test Subject"):
+        self.client.force_authenticate(user=sender)
+        response = self.client.post(
+            reverse("messaging:send-message"),
+            {
+                "sender": sender.pk,
+                "receiver": receiver.pk,
+                "subject": subject,
+                "message": "Test message content",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Message.objects.get(pk=response.data["id"])
+
+    def get_membership(self, thread, user):
+        return ThreadMembership.objects.get(thread=thread, user=user)
+
+    def test_messages_between_two_users_share_a_thread(self):
+        first = self.send(self.user, self.alice)
+        reply = self.send(self.alice, self.user)
+        other = self.send(self.user, self.bob)
+        self.assertEqual(first.thread_id, reply.thread_id)
+        self.assertNotEqual(first.thread_id, other.thread_id)
+        self.assertEqual(Thread.objects.count(), 2)
+        self.assertEqual(
+            first.thread.participant_ids, sorted([self.user.pk, self.alice.pk])
+        )
+
+    def test_unread_counts_and_activity(self):
+        self.send(self.alice, self.user)
+        message = self.send(self.alice, self.user)
+        self.send(self.user, self.alice)
+        thread = message.thread
+        self.assertEqual(self.get_membership(thread, self.user).unread_count, 2)
+        self.assertEqual(self.get_membership(thread, self.alice).unread_count, 1)
+        last = Message.objects.filter(thread=thread).latest("creation_date")
+        self.assertEqual(thread.last_message_at, last.creation_date)
+        self.assertEqual(
+            self.get_membership(thread, self.alice).last_message_at,
+            last.creation_date,
+        )
+
+    def test_list_threads_by_recent_activity(self):
+        alice_thread = self.send(self.alice, self.user).thread_id
+        bob_thread = self.send(self.bob, self.user).thread_id
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [thread["id"] for thread in response.data["threads"]],
+            [bob_thread, alice_thread],
+        )
+        self.assertEqual(
+            response.data["threads"][0]["participants"],
+            sorted([self.user.pk, self.bob.pk]),
+        )
+        self.assertEqual(response.data["threads"][0]["unread_count"], 1)
+
+        self.send(self.alice, self.user)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.list_url, {"page_size": 1})
+        self.assertEqual(
+            [thread["id"] for thread in response.data["threads"]], [alice_thread]
+        )
+        self.assertEqual(response.data["threads"][0]["unread_count"], 2)
+        response = self.client.get(
+            self.list_url, {"page_size": 1, "cursor": response.data["next_cursor"]}
+        )
+        self.assertEqual(
+            [thread["id"] for thread in response.data["threads"]], [bob_thread]
+        )
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_page_through_a_thread(self):
+        messages = [self.send(self.alice, self.user, f"Subject {i}") for i in range(3)]
+        self.send(self.bob, self.user)
+        url = reverse("messaging:thread-messages", kwargs={"pk": messages[0].thread_id})
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(url, {"page_size": 2, "fields": "id,subject"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["thread"]["unread_count"], 3)
+        self.assertEqual(
+            response.data["messages"],
+            [
+                {"id": messages[2].pk, "subject": "Subject 2"},
+                {"id": messages[1].pk, "subject": "Subject 1"},
+            ],
+        )
+        response = self.client.get(url, {"cursor": response.data["next_cursor"]})
+        self.assertEqual(
+            [message["id"] for message in response.data["messages"]],
+            [messages[0].pk],
+        )
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_only_participants_can_read_a_thread(self):
+        thread_id = self.send(self.alice, self.user).thread_id
+        self.client.force_authenticate(user=self.bob)
+        response = self.client.get(
+            reverse("messaging:thread-messages", kwargs={"pk": thread_id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reading_and_deleting_update_unread_counts(self):
+        messages = [self.send(self.alice, self.user) for _ in range(4)]
+        thread = messages[0].thread
+        self.client.force_authenticate(user=self.user)
+
+        self.client.get(
+            reverse("messaging:read-message", kwargs={"pk": messages[0].pk})
+        )
+        self.assertEqual(self.get_membership(thread, self.user).unread_count, 3)
+
+        self.client.post(
+            reverse("messaging:bulk-read-messages"),
+            {"ids": [messages[1].pk]},
+            format="json",
+        )
+        self.assertEqual(self.get_membership(thread, self.user).unread_count, 2)
+
+        self.client.delete(
+            reverse("messaging:delete-message", kwargs={"pk": messages[2].pk})
+        )
+        self.assertEqual(self.get_membership(thread, self.user).unread_count, 1)
+
+        self.client.post(
+            reverse("messaging:bulk-delete-messages"),
+            {"ids": [messages[3].pk]},
+            format="json",
+        )
+        self.assertEqual(self.get_membership(thread, self.user).unread_count, 0)
+
+    def test_bulk_send_creates_the_threads(self):
+        receivers = [
+            User.objects.create_user(f"receiver{i}", password="testpassword")
+            for i in range(5)
+        ]
+        self.send(self.user, receivers[0])
+        create_messages(
+            [
+                Message(
+                    sender=self.user,
+                    receiver=receiver,
+                    subject="Test Subject",
+                    message="Test message content",
+                )
+                for receiver in receivers
+            ]
+        )
+        self.assertEqual(Thread.objects.count(), 5)
+        self.assertEqual(
+            ThreadMembership.objects.filter(user__in=receivers, unread_count=1).count(),
+            4,
+        )
+        self.assertEqual(
+            ThreadMembership.objects.get(user=receivers[0]).unread_count, 2
+        )
+
+
+class RebuildThreadsCommandTest(TestCase):
+    def test_assigns_threads_and_rebuilds_counts(self):
+        sender = User.objects.create_user(username="sender", password="password")
+        receiver = User.objects.create_user(username="receiver", password="password")
+        for _ in range(2):
+            Message.objects.create(
+                sender=sender, receiver=receiver, subject="s", message="m"
+            )
+        out = StringIO()
+        call_command("rebuild_threads", stdout=out)
+        self.assertIn("2 messages assigned", out.getvalue())
+        thread = Thread.objects.get()
+        self.assertEqual(Message.objects.filter(thread=thread).count(), 2)
+        self.assertEqual(
+            ThreadMembership.objects.get(thread=thread, user=receiver).unread_count, 2
+        )
+        self.assertEqual(
+            ThreadMembership.objects.get(thread=thread, user=sender).unread_count, 0
+        )
+        self.assertIsNotNone(thread.last_message_at)
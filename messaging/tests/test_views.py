@@ -1,10 +1,20 @@
+import json
+from datetime import timedelta
+from unittest import mock, skipUnless
+
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from ..models import Message
+from ..exports import iter_json, iter_ndjson
+from ..mailbox import get_unread_count, rebuild_unread_counts
+from ..models import ArchivedMessage, Message, MessageBody
 from ..serializers import MessageSerializer
+from ..services import archive_messages, read_message
 
 
 class SendMessageViewTestCase(APITestCase):
@@ -45,7 +55,11 @@ class SendMessageViewTestCase(APITestCase):
         self.client.force_authenticate(user=self.sender)
         response = self.client.post(self.url, self.invalid_payload)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(set(response.data.keys()), set(["subject", "message"]))
+        self.assertEqual(response.data["status"], 400)
+        self.assertEqual(response.data["error"], "Invalid data")
+        self.assertEqual(
+            set(response.data["details"].keys()), set(["subject", "message"])
+        )
 
     def test_send_message_without_authentication(self):
         response = self.client.post(self.url, self.valid_payload)
@@ -209,6 +223,84 @@ class ReadMessageViewTestCase(APITestCase):
         message.refresh_from_db()
         self.assertEqual(message.is_read, False)
 
+    def test_read_missing_message(self):
+        self.client.force_authenticate(user=self.receiver)
+        url = reverse("messaging:read-message", kwargs={"pk": self.message.pk + 1})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_message_is_marked_as_read_once(self):
+        rebuild_unread_counts()
+        self.client.force_authenticate(user=self.receiver)
+        for _ in range(2):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.data["is_read"])
+        self.assertEqual(get_unread_count(self.receiver), 0)
+
+    def test_message_is_fetched_and_marked_without_querying_it_twice(self):
+        # Missing counters would be rebuilt from the messages.
+        rebuild_unread_counts([self.sender.pk, self.receiver.pk])
+        self.client.force_authenticate(user=self.receiver)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        statements = [
+            query["sql"].split()[0]
+            for query in queries
+            if '"messaging_message"' in query["sql"]
+        ]
+        expected = (
+            ["WITH"] if connection.vendor == "postgresql" else ["SELECT", "UPDATE"]
+        )
+        self.assertEqual(statements, expected)
+
+    def test_message_already_read_is_not_written(self):
+        Message.objects.filter(pk=self.message.pk).update(is_read=True)
+        self.client.force_authenticate(user=self.receiver)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertTrue(response.data["is_read"])
+        statements = {query["sql"].split()[0] for query in queries}
+        self.assertFalse(statements & {"WITH", "UPDATE", "SAVEPOINT"}, statements)
+
+    @skipUnless(connection.vendor == "postgresql", "The statement needs PostgreSQL.")
+    def test_read_message_with_a_single_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            message, marked = read_message(self.receiver, self.message.pk)
+        self.assertTrue(marked)
+        self.assertTrue(message.is_read)
+        self.assertEqual(message.message, "Test message content")
+        statements = [
+            query["sql"].split()[0]
+            for query in queries
+            if '"messaging_message"' in query["sql"]
+        ]
+        self.assertEqual(statements, ["WITH"])
+        self.assertFalse(read_message(self.receiver, self.message.pk)[1])
+
+        message = Message.objects.create(
+            sender=self.sender, receiver=self.receiver, subject="s", message="m"
+        )
+        self.assertEqual(read_message(self.sender, message.pk), (message, False))
+        message.refresh_from_db()
+        self.assertFalse(message.is_read)
+        self.assertEqual(read_message(self.receiver, message.pk + 1), (None, False))
+
+    def test_read_archived_message(self):
+        archive_messages(timezone.now() + timedelta(seconds=1))
+        self.client.force_authenticate(user=self.receiver)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["subject"], "Test Subject")
+        # The archive is read-only.
+        self.assertFalse(response.data["is_read"])
+        self.assertFalse(ArchivedMessage.objects.get().is_read)
+
+        other = User.objects.create_user("other", "other@example.com", "password")
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
 
 class DeleteMessageViewTestCase(APITestCase):
     def setUp(self):
@@ -252,3 +344,699 @@ class DeleteMessageViewTestCase(APITestCase):
         response = self.client.delete(self.url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertTrue(Message.objects.filter(pk=self.message.pk).exists())
+
+
+class MailboxPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+        self.other = User.objects.create_user(
+            "other", "other@example.com", "testpassword"
+        )
+        self.url = reverse("messaging:user-messages-list")
+        self.received = [
+            Message.objects.create(
+                sender=self.other,
+                receiver=self.user,
+                subject=f"Subject {i}",
+                message="Test message content",
+            )
+            for i in range(5)
+        ]
+        Message.objects.create(
+            sender=self.user,
+            receiver=self.other,
+            subject="Sent",
+            message="Test message content",
+        )
+
+    def test_pages_follow_cursor_without_duplicates(self):
+        self.client.force_authenticate(user=self.user)
+        seen = []
+        cursor = None
+        while True:
+            params = {"page_size": 2}
+            if cursor:
+                params["received_cursor"] = cursor
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(m["id"] for m in response.data["received_messages"])
+            cursor = response.data["next_cursors"]["received"]
+            if cursor is None:
+                break
+        expected = [
+            m.pk
+            for m in sorted(
+                self.received, key=lambda m: (m.creation_date, m.pk), reverse=True
+            )
+        ]
+        self.assertEqual(seen, expected)
+
+    def test_streams_are_paginated_independently(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"page_size": 2})
+        self.assertEqual(len(response.data["sent_messages"]), 1)
+        self.assertEqual(len(response.data["received_messages"]), 2)
+        self.assertIsNone(response.data["next_cursors"]["sent"])
+        self.assertIsNotNone(response.data["next_cursors"]["received"])
+
+    def test_messages_with_same_creation_date_are_not_skipped(self):
+        Message.objects.filter(receiver=self.user).update(
+            creation_date=self.received[0].creation_date
+        )
+        self.client.force_authenticate(user=self.user)
+        first = self.client.get(self.url, {"page_size": 3})
+        second = self.client.get(
+            self.url,
+            {"page_size": 3, "received_cursor": first.data["next_cursors"]["received"]},
+        )
+        ids = [m["id"] for m in first.data["received_messages"]]
+        ids += [m["id"] for m in second.data["received_messages"]]
+        self.assertEqual(sorted(ids), sorted(m.pk for m in self.received))
+
+    def test_next_page_is_a_range_on_the_date(self):
+        self.client.force_authenticate(user=self.user)
+        first = self.client.get(self.url, {"page_size": 2})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                self.url,
+                {
+                    "page_size": 2,
+                    "received_cursor": first.data["next_cursors"]["received"],
+                },
+            )
+        (sql,) = [q["sql"] for q in queries.captured_queries if "UNION ALL" in q["sql"]]
+        # The redundant bound lets the index seek to the position of the cursor.
+        self.assertIn('"messaging_message"."creation_date" <= ', sql)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"received_cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ExportMessagesViewTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+        self.other = User.objects.create_user(
+            "other", "other@example.com", "testpassword"
+        )
+        self.url = reverse("messaging:export-messages")
+        self.sent = Message.objects.create(
+            sender=self.user,
+            receiver=self.other,
+            subject="Sent",
+            message="Test message content",
+        )
+        self.received = [
+            Message.objects.create(
+                sender=self.other,
+                receiver=self.user,
+                subject=f"Received {i}",
+                message="Test message content",
+            )
+            for i in range(3)
+        ]
+
+    def test_export_ndjson(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        content = b"".join(response.streaming_content).decode("utf-8")
+        lines = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[0], MessageSerializer(self.sent).data)
+
+    def test_export_json(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"style": "json"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(data["sent_messages"]), 1)
+        self.assertEqual(
+            [m["id"] for m in data["received_messages"]],
+            [m.pk for m in reversed(self.received)],
+        )
+
+    def test_export_archived_messages(self):
+        archive_messages(self.received[0].creation_date + timedelta(microseconds=1))
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"style": "json"})
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(
+            data["archived_sent_messages"], [MessageSerializer(self.sent).data]
+        )
+        self.assertEqual(
+            [m["id"] for m in data["archived_received_messages"]], [self.received[0].pk]
+        )
+        self.assertEqual(len(data["received_messages"]), 2)
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, {"style": "json"})
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(json.loads(content)["received_messages"]), 3)
+
+    def test_export_json_in_small_chunks(self):
+        streams = [("received_messages", Message.objects.filter(receiver=self.user))]
+        data = json.loads(b"".join(iter_json(streams, chunk_size=2)))
+        self.assertEqual(len(data["received_messages"]), 3)
+
+    def test_export_without_server_side_cursors(self):
+        streams = [("received_messages", Message.objects.filter(receiver=self.user))]
+        with mock.patch.dict(
+            connection.settings_dict, {"DISABLE_SERVER_SIDE_CURSORS": True}
+        ), self.assertNumQueries(2):
+            lines = b"".join(iter_ndjson(streams, chunk_size=2)).splitlines()
+        self.assertEqual(
+            [json.loads(line)["id"] for line in lines],
+            [message.pk for message in reversed(self.received)],
+        )
+
+    def test_export_unknown_style(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"style": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_unauthenticated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BulkSendMessageViewTestCase(APITestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            "sender", "sender@example.com", "testpassword"
+        )
+        self.receivers = [
+            User.objects.create_user(
+                f"receiver{i}", f"receiver{i}@example.com", "testpassword"
+            )
+            for i in range(3)
+        ]
+        self.url = reverse("messaging:bulk-send-messages")
+
+    def test_send_to_many_receivers(self):
+        self.client.force_authenticate(user=self.sender)
+        payload = {
+            "receivers": [receiver.id for receiver in self.receivers],
+            "subject": "Test Subject",
+            "message": "Test message content",
+        }
+        response = self.client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual(response.data["errors"], [])
+        self.assertEqual(
+            set(
+                Message.objects.filter(sender=self.sender).values_list(
+                    "receiver", flat=True
+                )
+            ),
+            {receiver.id for receiver in self.receivers},
+        )
+
+    def test_every_send_path_trims_the_message(self):
+        self.client.force_authenticate(user=self.sender)
+        text = "  Test message content\n"
+        self.client.post(
+            reverse("messaging:send-message"),
+            {
+                "sender": self.sender.id,
+                "receiver": self.receivers[0].id,
+                "subject": "Test Subject",
+                "message": text,
+            },
+            format="json",
+        )
+        self.client.post(
+            self.url,
+            {
+                "receivers": [self.receivers[1].id],
+                "subject": "Subject",
+                "message": text,
+            },
+            format="json",
+        )
+        self.client.post(
+            self.url,
+            {
+                "messages": [
+                    {"receiver": self.receivers[2].id, "subject": "S", "message": text}
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(Message.objects.count(), 3)
+        self.assertEqual(MessageBody.objects.get().get_text(), "Test message content")
+
+    def test_invalid_items_do_not_abort_the_batch(self):
+        self.client.force_authenticate(user=self.sender)
+        payload = {
+            "messages": [
+                {
+                    "receiver": self.receivers[0].id,
+                    "subject": "Test Subject",
+                    "message": "Test message content",
+                },
+                {
+                    "receiver": self.receivers[1].id,
+                    "subject": "   ",
+                    "message": "Test message content",
+                },
+                {
+                    "receiver": 999999,
+                    "subject": "Test Subject",
+                    "message": "Test message content",
+                },
+            ]
+        }
+        response = self.client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual([error["index"] for error in response.data["errors"]], [1, 2])
+        self.assertEqual(set(response.data["errors"][0]["errors"]), {"subject"})
+        self.assertEqual(set(response.data["errors"][1]["errors"]), {"receiver"})
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_batch_with_only_invalid_items(self):
+        self.client.force_authenticate(user=self.sender)
+        payload = {
+            "receivers": ["not-an-id", 999999],
+            "subject": "Test Subject",
+            "message": "Test message content",
+        }
+        response = self.client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_receivers_and_messages_are_mutually_exclusive(self):
+        self.client.force_authenticate(user=self.sender)
+        response = self.client.post(
+            self.url, {"receivers": [], "messages": []}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_size_limit(self):
+        self.client.force_authenticate(user=self.sender)
+        payload = {
+            "receivers": [self.receivers[0].id] * 3,
+            "subject": "Test Subject",
+            "message": "Test message content",
+        }
+        with self.settings(MESSAGING={"BULK_SEND_MAX_ITEMS": 2}):
+            response = self.client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_send_without_authentication(self):
+        response = self.client.post(self.url, {"receivers": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BulkReadAndDeleteMessagesViewTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+        self.other = User.objects.create_user(
+            "other", "other@example.com", "testpassword"
+        )
+        self.received = [
+            Message.objects.create(
+                sender=self.other,
+                receiver=self.user,
+                subject=f"Received {i}",
+                message="Test message content",
+            )
+            for i in range(3)
+        ]
+        self.sent = Message.objects.create(
+            sender=self.user,
+            receiver=self.other,
+            subject="Sent",
+            message="Test message content",
+        )
+        self.unrelated = Message.objects.create(
+            sender=self.other,
+            receiver=self.other,
+            subject="Unrelated",
+            message="Test message content",
+        )
+        self.read_url = reverse("messaging:bulk-read-messages")
+        self.delete_url = reverse("messaging:bulk-delete-messages")
+
+    def test_bulk_read_by_ids_in_a_single_update(self):
+        rebuild_unread_counts()
+        self.client.force_authenticate(user=self.user)
+        ids = [self.received[0].pk, self.received[1].pk, self.sent.pk]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.read_url, {"ids": ids}, format="json")
+        message_updates = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('UPDATE "messaging_message"')
+        ]
+        self.assertEqual(len(message_updates), 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"updated": 2})
+        self.sent.refresh_from_db()
+        self.assertFalse(self.sent.is_read)
+        self.received[2].refresh_from_db()
+        self.assertFalse(self.received[2].is_read)
+
+    def test_bulk_read_before_date(self):
+        Message.objects.filter(pk=self.received[0].pk).update(
+            creation_date="2020-01-01T00:00:00Z"
+        )
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            self.read_url, {"before": "2021-01-01T00:00:00Z"}, format="json"
+        )
+        self.assertEqual(response.data, {"updated": 1})
+
+    def test_bulk_read_rejects_the_filters_of_the_bulk_delete(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            self.read_url,
+            {"ids": [self.sent.pk], "direction": "sent", "unread_only": False},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.json()["details"]), {"direction", "unread_only"})
+
+    def test_bulk_read_requires_a_selection(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.read_url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete_only_deletes_own_messages(self):
+        self.client.force_authenticate(user=self.user)
+        ids = [self.received[0].pk, self.sent.pk, self.unrelated.pk]
+        response = self.client.post(self.delete_url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertTrue(Message.objects.filter(pk=self.unrelated.pk).exists())
+
+    def test_bulk_delete_received_unread_before_date(self):
+        self.received[0].is_read = True
+        self.received[0].save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            self.delete_url,
+            {
+                "before": "2999-01-01T00:00:00Z",
+                "direction": "received",
+                "unread_only": True,
+            },
+            format="json",
+        )
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertEqual(
+            set(Message.objects.values_list("pk", flat=True)),
+            {self.received[0].pk, self.sent.pk, self.unrelated.pk},
+        )
+
+    def test_bulk_operations_unauthenticated(self):
+        for url in (self.read_url, self.delete_url):
+            response = self.client.post(url, {"ids": [1]}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class UnreadCountViewTestCase(APITestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            "sender", "sender@example.com", "testpassword"
+        )
+        self.receiver = User.objects.create_user(
+            "receiver", "receiver@example.com", "testpassword"
+        )
+        self.url = reverse("messaging:unread-count")
+
+    def get_count(self):
+        self.client.force_authenticate(user=self.receiver)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["unread_count"]
+
+    def send(self, count=1):
+        self.client.force_authenticate(user=self.sender)
+        for _ in range(count):
+            self.client.post(
+                reverse("messaging:send-message"),
+                {
+                    "sender": self.sender.id,
+                    "receiver": self.receiver.id,
+                    "subject": "Test Subject",
+                    "message": "Test message content",
+                },
+            )
+
+    def test_counter_follows_sends_reads_and_deletes(self):
+        self.assertEqual(self.get_count(), 0)
+        self.send(3)
+        self.assertEqual(self.get_count(), 3)
+
+        first, second, third = Message.objects.filter(receiver=self.receiver)
+        self.client.force_authenticate(user=self.receiver)
+        self.client.get(reverse("messaging:read-message", kwargs={"pk": first.pk}))
+        self.client.get(reverse("messaging:read-message", kwargs={"pk": first.pk}))
+        self.assertEqual(self.get_count(), 2)
+
+        self.client.delete(
+            reverse("messaging:delete-message", kwargs={"pk": second.pk})
+        )
+        self.assertEqual(self.get_count(), 1)
+
+        self.client.post(
+            reverse("messaging:bulk-read-messages"), {"ids": [third.pk]}, format="json"
+        )
+        self.assertEqual(self.get_count(), 0)
+
+    def test_counter_follows_bulk_sends_and_deletes(self):
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(
+            reverse("messaging:bulk-send-messages"),
+            {
+                "receivers": [self.receiver.id] * 4,
+                "subject": "Test Subject",
+                "message": "Test message content",
+            },
+            format="json",
+        )
+        self.assertEqual(self.get_count(), 4)
+
+        self.client.force_authenticate(user=self.sender)
+        ids = list(Message.objects.values_list("pk", flat=True)[:3])
+        self.client.post(
+            reverse("messaging:bulk-delete-messages"), {"ids": ids}, format="json"
+        )
+        self.assertEqual(self.get_count(), 1)
+
+    def test_unread_count_unauthenticated(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            "sender", "sender@example.com", "testpassword"
+        )
+        self.receiver = User.objects.create_user(
+            "receiver", "receiver@example.com", "testpassword"
+        )
+        self.message = Message.objects.create(
+            sender=self.sender,
+            receiver=self.receiver,
+            subject="Test Subject",
+            message="Test message content",
+        )
+        self.list_url = reverse("messaging:user-messages-list")
+        self.read_url = reverse(
+            "messaging:read-message", kwargs={"pk": self.message.pk}
+        )
+
+    def send(self):
+        self.client.force_authenticate(user=self.sender)
+        self.client.post(
+            reverse("messaging:send-message"),
+            {
+                "sender": self.sender.id,
+                "receiver": self.receiver.id,
+                "subject": "Test Subject",
+                "message": "Test message content",
+            },
+        )
+
+    def test_unchanged_mailbox_returns_304_without_querying_messages(self):
+        self.client.force_authenticate(user=self.receiver)
+        response = self.client.get(self.list_url)
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertFalse(
+            any('"messaging_message"' in query["sql"] for query in queries)
+        )
+
+    def test_new_message_invalidates_etag(self):
+        self.send()
+        self.client.force_authenticate(user=self.receiver)
+        etag = self.client.get(self.list_url)["ETag"]
+        self.send()
+        self.client.force_authenticate(user=self.receiver)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_depends_on_cursor(self):
+        self.client.force_authenticate(user=self.receiver)
+        etag = self.client.get(self.list_url)["ETag"]
+        response = self.client.get(
+            self.list_url, {"page_size": 1}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_read_message_conditional(self):
+        self.client.force_authenticate(user=self.receiver)
+        response = self.client.get(self.read_url)
+        self.assertTrue(response.data["is_read"])
+        etag = response["ETag"]
+
+        response = self.client.get(self.read_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_read_by_receiver_invalidates_sender_etag(self):
+        self.send()
+        self.client.force_authenticate(user=self.sender)
+        etag = self.client.get(self.list_url)["ETag"]
+        self.client.force_authenticate(user=self.receiver)
+        self.client.get(self.read_url)
+        self.client.force_authenticate(user=self.sender)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_read_message_of_another_user_is_forbidden_with_etag(self):
+        other = User.objects.create_user("other", "other@example.com", "password")
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.read_url, HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SingleQueryMailboxTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+        self.other = User.objects.create_user(
+            "other", "other@example.com", "testpassword"
+        )
+        self.url = reverse("messaging:user-messages-list")
+        for sender, receiver in [
+            (self.user, self.other),
+            (self.other, self.user),
+            (self.other, self.user),
+            (self.user, self.user),
+        ]:
+            Message.objects.create(
+                sender=sender,
+                receiver=receiver,
+                subject="Test Subject",
+                message="Test message content",
+            )
+
+    def test_both_streams_are_fetched_in_one_query(self):
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        message_queries = [
+            query for query in queries if '"messaging_message"' in query["sql"]
+        ]
+        self.assertEqual(len(message_queries), 1)
+        self.assertEqual(len(response.data["sent_messages"]), 2)
+        self.assertEqual(len(response.data["received_messages"]), 3)
+
+    def test_direction_filter(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"direction": "received"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["sent_messages"], [])
+        self.assertEqual(len(response.data["received_messages"]), 3)
+        self.assertIsNone(response.data["next_cursors"]["sent"])
+
+    def test_unknown_direction(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"direction": "sideways"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SparseFieldsetsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "testuser", "testuser@example.com", "testpassword"
+        )
+        self.other = User.objects.create_user(
+            "other", "other@example.com", "testpassword"
+        )
+        self.url = reverse("messaging:user-messages-list")
+        Message.objects.create(
+            sender=self.other,
+            receiver=self.user,
+            subject="Test Subject",
+            message="Test message content",
+        )
+        Message.objects.create(
+            sender=self.user,
+            receiver=self.other,
+            subject="Test Subject",
+            message="Test message content",
+        )
+
+    def test_requested_fields(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"fields": "subject,id"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data["received_messages"][0]), ["id", "subject"])
+        self.assertEqual(list(response.data["sent_messages"][0]), ["id", "subject"])
+
+    def test_summary_fields(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"fields": "summary"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(response.data["received_messages"][0]),
+            MessageSerializer.summary_fields,
+        )
+
+    def test_only_requested_columns_are_read(self):
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {"fields": "summary"})
+        sql = next(q["sql"] for q in queries if '"messaging_message"' in q["sql"])
+        self.assertNotIn('"messaging_messagebody"', sql)
+        self.assertIn('"messaging_message"."subject"', sql)
+
+    def test_unknown_field(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"fields": "id,body"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", response.data["details"])
+
+    def test_unread_messages_fields(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("messaging:unread-messages-list"), {"fields": "id"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["received_messages"],
+            [{"id": Message.objects.get(receiver=self.user).pk}],
+        )
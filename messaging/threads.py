@@ -0,0 +1,200 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Message, Thread, ThreadMembership
+
+
+def _fetch_threads(keys):
+    """
+    Return a mapping of thread key to thread id for the existing threads.
+    """
+    if not keys:
+        return {}
+    rows = Thread.objects.filter(
+        user_low__in={low for low, _ in keys}, user_high__in={high for _, high in keys}
+    ).values_list("user_low", "user_high", "pk")
+    return {(low, high): pk for low, high, pk in rows if (low, high) in keys}
+
+
+def get_threads(pairs):
+    """
+    Return the threads of the given pairs of users, creating the missing ones.
+
+    Args:
+        pairs: An iterable of ``(user_id, other_user_id)`` pairs, in any order.
+
+    Returns:
+        A mapping of thread key (see ``Thread.get_key``) to thread id.
+    """
+    keys = {Thread.get_key(*pair) for pair in pairs}
+    threads = _fetch_threads(keys)
+    missing = keys - set(threads)
+    if missing:
+        # Threads created concurrently by another request are ignored and fetched.
+        Thread.objects.bulk_create(
+            [Thread(user_low_id=low, user_high_id=high) for low, high in missing],
+            ignore_conflicts=True,
+        )
+        created = _fetch_threads(missing)
+        ThreadMembership.objects.bulk_create(
+            [
+                ThreadMembership(thread_id=thread_id, user_id=user_id)
+                for key, thread_id in created.items()
+                for user_id in set(key)
+            ],
+            ignore_conflicts=True,
+        )
+        threads.update(created)
+    return threads
+
+
+def assign_threads(messages):
+    """
+    Set the thread of unsaved messages, creating the missing threads.
+    """
+    threads = get_threads((m.sender_id, m.receiver_id) for m in messages)
+    for message in messages:
+        message.thread_id = threads[
+            Thread.get_key(message.sender_id, message.receiver_id)
+        ]
+
+
+def record_thread_changes(unread_deltas=None, thread_ids=(), last_message_at=None):
+    """
+    Record a change to the messages of several threads.
+
+    Must be called in the transaction of the change, like ``record_mailbox_changes``.
+
+    Args:
+        unread_deltas: A mapping of ``(thread_id, user_id)`` to the change of the
+            unread count of this participant. Messages without a thread are ignored.
+        thread_ids: Threads that received new messages.
+        last_message_at: The creation date of the last of the new messages.
+    """
+    thread_ids = set(thread_ids) - {None}
+    if thread_ids and last_message_at is not None:
+        # Never move the activity of a thread back in time.
+        activity = Case(
+            When(last_message_at__gt=last_message_at, then=F("last_message_at")),
+            default=Value(last_message_at),
+        )
+        Thread.objects.filter(pk__in=thread_ids).update(last_message_at=activity)
+        ThreadMembership.objects.filter(thread__in=thread_ids).update(
+            last_message_at=activity
+        )
+
+    unread_deltas = {
+        key: delta
+        for key, delta in (unread_deltas or {}).items()
+        if key[0] is not None and delta
+    }
+    if not unread_deltas:
+        return
+    if len(unread_deltas) == 1:
+        # A single membership, such as the receiver of one message, is updated
+        # without reading it first.
+        ((thread_id, user_id), delta) = unread_deltas.popitem()
+        ThreadMembership.objects.filter(thread=thread_id, user=user_id).update(
+            unread_count=F("unread_count") + delta
+        )
+        return
+    memberships = ThreadMembership.objects.filter(
+        thread__in={thread_id for thread_id, _ in unread_deltas},
+        user__in={user_id for _, user_id in unread_deltas},
+    ).values_list("pk", "thread", "user")
+    by_delta = defaultdict(list)
+    for pk, thread_id, user_id in memberships:
+        delta = unread_deltas.get((thread_id, user_id))
+        if delta:
+            by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        ThreadMembership.objects.filter(pk__in=pks).update(
+            unread_count=F("unread_count") + delta
+        )
+
+
+def count_unread_by_thread(queryset):
+    """
+    Return a mapping of ``(thread_id, receiver_id)`` to the number of unread messages
+    in the queryset.
+    """
+    return {
+        (thread_id, receiver_id): count
+        for thread_id, receiver_id, count in queryset.filter(is_read=False)
+        .order_by()
+        .values("thread", "receiver")
+        .annotate(count=Count("pk"))
+        .values_list("thread", "receiver", "count")
+    }
+
+
+def rebuild_threads():
+    """
+    Assign a thread to the messages without one, and recompute the date of the last
+    message and the unread counts of every thread from the messages.
+
+    Messages written by the messaging services get their thread on creation; the
+    others (admin, shell, raw SQL) are picked up by this rebuild.
+
+    Returns:
+        The number of messages that were assigned a thread.
+    """
+    with transaction.atomic():
+        unthreaded = Message.objects.filter(thread__isnull=True)
+        get_threads(unthreaded.order_by().values_list("sender", "receiver").distinct())
+        assigned = unthreaded.update(
+            thread=Subquery(
+                Thread.objects.filter(
+                    user_low=Least(OuterRef("sender"), OuterRef("receiver")),
+                    user_high=Greatest(OuterRef("sender"), OuterRef("receiver")),
+                ).values("pk")[:1]
+            )
+        )
+
+        last_message_at = Subquery(
+            Message.objects.filter(thread=OuterRef("pk"))
+            .order_by("-creation_date")
+            .values("creation_date")[:1]
+        )
+        Thread.objects.update(last_message_at=last_message_at)
+        ThreadMembership.objects.update(
+            last_message_at=Subquery(
+                Thread.objects.filter(pk=OuterRef("thread")).values("last_message_at")
+            ),
+        )
+        rebuild_thread_unread_counts()
+    return assigned
+
+
+def rebuild_thread_unread_counts(user_ids=None):
+    """
+    Recompute the unread counts of the thread memberships from the messages.
+
+    Messages without a thread are not counted, see ``rebuild_threads``.
+
+    Args:
+        user_ids: Restrict the rebuild to the memberships of these users. All the
+            memberships are rebuilt if None.
+
+    Returns:
+        The number of memberships whose count was corrected.
+    """
+    unread_count = Coalesce(
+        Subquery(
+            Message.objects.filter(
+                thread=OuterRef("thread"), receiver=OuterRef("user"), is_read=False
+            )
+            .order_by()
+            .values("thread")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+    memberships = ThreadMembership.objects.exclude(unread_count=unread_count)
+    if user_ids is not None:
+        memberships = memberships.filter(user__in=user_ids)
+    return memberships.update(unread_count=unread_count)
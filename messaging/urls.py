@@ -1,15 +1,57 @@
 # urls.py
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 app_name = "messaging"
 urlpatterns = [
     path("send/", views.SendMessageView.as_view(), name="send-message"),
+    path("send/bulk/", views.BulkSendMessageView.as_view(), name="bulk-send-messages"),
     path("", views.UserMessagesListView.as_view(), name="user-messages-list"),
     path(
         "unread/", views.UnreadMessagesListView.as_view(), name="unread-messages-list"
     ),
+    path("unread/count/", views.UnreadCountView.as_view(), name="unread-count"),
+    path("export/", views.ExportMessagesView.as_view(), name="export-messages"),
+    path("read/bulk/", views.BulkReadMessagesView.as_view(), name="bulk-read-messages"),
+    path(
+        "delete/bulk/",
+        views.BulkDeleteMessagesView.as_view(),
+        name="bulk-delete-messages",
+    ),
+    path("search/", views.SearchMessagesView.as_view(), name="search-messages"),
+    path("metrics/", views.MetricsView.as_view(), name="metrics"),
+    path("threads/", views.ThreadListView.as_view(), name="thread-list"),
+    path(
+        "threads/<int:pk>/",
+        views.ThreadMessagesView.as_view(),
+        name="thread-messages",
+    ),
     path("<int:pk>/", views.ReadMessageView.as_view(), name="read-message"),
     path("<int:pk>/delete/", views.DeleteMessageView.as_view(), name="delete-message"),
+    path(
+        "async/",
+        async_views.AsyncUserMessagesListView.as_view(),
+        name="async-user-messages-list",
+    ),
+    path(
+        "async/unread/",
+        async_views.AsyncUnreadMessagesListView.as_view(),
+        name="async-unread-messages-list",
+    ),
+    path(
+        "async/send/",
+        async_views.AsyncSendMessageView.as_view(),
+        name="async-send-message",
+    ),
+    path(
+        "async/stream/",
+        async_views.AsyncMessageStreamView.as_view(),
+        name="async-message-stream",
+    ),
+    path(
+        "async/<int:pk>/",
+        async_views.AsyncReadMessageView.as_view(),
+        name="async-read-message",
+    ),
 ]
@@ -1,85 +1,287 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Message
-from .serializers import MessageSerializer
-
-
-class SendMessageView(APIView):
+from .conditional import ConditionalMailboxMixin
+from .conf import get_setting
+from .errors import build_error_payload
+from .exports import aiter_chunks, iter_json, iter_ndjson
+from .instrumentation import InstrumentedViewMixin, render_metrics, timer
+from .mailbox import (
+    MailboxQuerysetMixin,
+    get_mailbox_state,
+    get_unread_count,
+    record_mailbox_changes,
+)
+from .models import ArchivedMessage, Message, ThreadMembership
+from .pagination import MessageKeysetPagination, ThreadKeysetPagination
+from .routers import ReplicaReadMixin, read_from_primary
+from .search import search_messages
+from .serializers import (
+    BulkDeleteSelectionSerializer,
+    BulkSelectionSerializer,
+    BulkSendSerializer,
+    MessageRowSerializer,
+    MessageSearchSerializer,
+    MessageSerializer,
+    OutboxMessageSerializer,
+    ThreadSerializer,
+)
+from .services import (
+    create_messages,
+    delete_messages,
+    enqueue_message,
+    get_existing_user_ids,
+    mark_messages_read,
+    read_message,
+    save_message,
+    select_messages,
+)
+from .threads import record_thread_changes
+
+
+class SendMessageView(InstrumentedViewMixin, APIView):
     """
     View for sending a message.
 
     Requires authentication.
 
+    When the ``ASYNC_SEND`` setting is enabled, the validated message is queued in
+    the outbox and the view answers ``202 Accepted`` with the queued message; it is
+    sent by the ``drain_outbox`` management command.
+
     Methods:
     - post: Sends a message with the provided data.
     """
 
+    # Creating the thread of two users costs 3 more queries than reusing it.
+    query_budget = 17
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         serializer = MessageSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save(sender=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer.is_valid(raise_exception=True)
+        if get_setting("ASYNC_SEND"):
+            queued = enqueue_message(serializer, request.user)
+            with timer("serialize"):
+                data = OutboxMessageSerializer(queued).data
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+        save_message(serializer, request.user)
+        with timer("serialize"):
+            data = serializer.data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class BulkSendMessageView(InstrumentedViewMixin, APIView):
+    """
+    View for sending messages in bulk.
 
+    Requires authentication.
+
+    Accepts either ``{"receivers": [...], "subject": ..., "message": ...}`` to send the
+    same message to many users, or ``{"messages": [{"receiver", "subject", "message"}]}``.
+    The batch is validated in one pass, the receivers are resolved with a single query
+    and the messages are inserted with ``bulk_create``. Invalid items are reported in
+    ``errors`` with their index in the batch and do not prevent the others from being sent.
 
-class UserMessagesListView(generics.ListAPIView):
+    Methods:
+    - post: Sends the messages of the batch.
     """
-    API view for retrieving messages for a specific user.
-    Only authenticated users are allowed to access this view.
+
+    query_budget = 16
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkSendSerializer(
+            data=request.data,
+            context={"max_items": get_setting("BULK_SEND_MAX_ITEMS")},
+        )
+        serializer.is_valid(raise_exception=True)
+
+        items, errors = serializer.get_items()
+        receiver_ids = get_existing_user_ids({item["receiver"] for _, item in items})
+
+        messages = []
+        for index, item in items:
+            if item["receiver"] not in receiver_ids:
+                errors.append(
+                    {
+                        "index": index,
+                        "errors": {
+                            "receiver": [
+                                f'Invalid pk "{item["receiver"]}" - object does not exist.'
+                            ]
+                        },
+                    }
+                )
+                continue
+            messages.append(
+                Message(
+                    sender=request.user,
+                    receiver_id=item["receiver"],
+                    subject=item["subject"],
+                    message=item["message"],
+                )
+            )
+        created = create_messages(messages)
+        errors.sort(key=lambda error: error["index"])
+
+        data = {
+            "created": len(created),
+            "ids": [message.pk for message in created],
+            "errors": errors,
+        }
+        if errors and not created:
+            return Response(
+                build_error_payload(status.HTTP_400_BAD_REQUEST, data),
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class MailboxListView(
+    InstrumentedViewMixin,
+    ReplicaReadMixin,
+    MailboxQuerysetMixin,
+    ConditionalMailboxMixin,
+    generics.ListAPIView,
+):
+    """
+    Base API view for listing the sent and received messages of the authenticated user.
+
+    Each stream is paginated independently with keyset pagination. The cursor of the
+    next page of a stream is returned in ``next_cursors`` and is passed back in the
+    ``sent_cursor`` / ``received_cursor`` query parameters. The pages of both streams
+    are fetched in a single query, and ``?direction=sent`` or ``?direction=received``
+    restricts the listing to one of them. Messages are read as rows and serialized
+    with ``MessageRowSerializer``.
+
+    Supports conditional requests: a poll with an up to date ``If-None-Match`` or
+    ``If-Modified-Since`` header is answered with a 304 before any message is queried.
     """
 
+    query_budget = 4
     serializer_class = MessageSerializer
-    permission_classes = [IsAuthenticated]
+    pagination_class = MessageKeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        user = request.user
-        sent_messages = Message.objects.filter(sender=user)
-        received_messages = Message.objects.filter(receiver=user)
+        not_modified = self.check_not_modified(request)
+        if not_modified is not None:
+            return not_modified
 
-        # Serialize the data
-        sent_messages_serializer = self.get_serializer(sent_messages, many=True)
-        received_messages_serializer = self.get_serializer(received_messages, many=True)
-
-        return Response(
-            {
-                "sent_messages": sent_messages_serializer.data,
-                "received_messages": received_messages_serializer.data,
-            }
+        columns = self.get_columns(request)
+        pages = self.paginator.paginate_rows(
+            self.get_mailbox_querysets(request), request, columns, view=self
         )
+        sent_messages, sent_cursor = pages.get("sent", ([], None))
+        received_messages, received_cursor = pages.get("received", ([], None))
+
+        # Serialize the rows with the fast path of MessageSerializer
+        serializer = MessageRowSerializer(columns, self.get_fields(request))
+
+        with timer("serialize"):
+            data = {
+                "sent_messages": serializer.serialize(sent_messages),
+                "received_messages": serializer.serialize(received_messages),
+                "next_cursors": {
+                    "sent": sent_cursor,
+                    "received": received_cursor,
+                },
+            }
+        return Response(data)
+
+
+class UserMessagesListView(MailboxListView):
+    """
+    API view for retrieving messages for a specific user.
+    Only authenticated users are allowed to access this view.
+    """
 
 
-class UnreadMessagesListView(generics.ListAPIView):
+class UnreadMessagesListView(MailboxListView):
     """
     API view to retrieve a list of unread messages for the authenticated user.
     """
 
-    serializer_class = MessageSerializer
+    unread_only = True
+
+
+class UnreadCountView(InstrumentedViewMixin, ReplicaReadMixin, APIView):
+    """
+    API view returning the number of unread messages of the authenticated user.
+
+    The count is read from a maintained counter, so polling it does not touch the
+    messages themselves.
+    """
+
+    query_budget = 3
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, *args, **kwargs):
-        user = request.user
-        sent_messages = Message.objects.filter(sender=user, is_read=False)
-        received_messages = Message.objects.filter(receiver=user, is_read=False)
+    def get(self, request):
+        return Response({"unread_count": get_unread_count(request.user)})
 
-        # Serialize the data
-        sent_messages_serializer = self.get_serializer(sent_messages, many=True)
-        received_messages_serializer = self.get_serializer(received_messages, many=True)
 
-        return Response(
-            {
-                "sent_messages": sent_messages_serializer.data,
-                "received_messages": received_messages_serializer.data,
-            }
-        )
+class ExportMessagesView(InstrumentedViewMixin, ReplicaReadMixin, APIView):
+    """
+    API view for exporting the whole mailbox of the authenticated user.
+
+    The messages are streamed from a server-side cursor and written incrementally,
+    so the memory used does not depend on the size of the mailbox, over WSGI or
+    ASGI. The archived messages, see ``ArchivedMessage``, are exported after the
+    others.
+
+    Query parameters:
+    - style: ``ndjson`` (default) for one message per line, or ``json`` for a single
+      object with ``sent_messages``, ``received_messages``, ``archived_sent_messages``
+      and ``archived_received_messages`` lists.
+    """
 
+    query_budget = 6
+    permission_classes = [IsAuthenticated]
+    styles = {
+        "ndjson": (iter_ndjson, "application/x-ndjson", "messages.ndjson"),
+        "json": (iter_json, "application/json", "messages.json"),
+    }
+
+    def get(self, request):
+        style = request.query_params.get("style", "ndjson")
+        if style not in self.styles:
+            raise ValidationError(
+                {"style": f"Unknown export style, expected one of {list(self.styles)}."}
+            )
+        iter_content, content_type, filename = self.styles[style]
 
-class ReadMessageView(generics.RetrieveAPIView):
+        user = request.user
+        # The export is read after the view returns: pin the database now.
+        messages = Message.objects.using(Message.objects.db)
+        archived = ArchivedMessage.objects.using(ArchivedMessage.objects.db)
+        streams = [
+            ("sent_messages", messages.filter(sender=user)),
+            ("received_messages", messages.filter(receiver=user)),
+            ("archived_sent_messages", archived.filter(sender=user)),
+            ("archived_received_messages", archived.filter(receiver=user)),
+        ]
+        content = iter_content(streams)
+        if isinstance(request._request, ASGIRequest):
+            content = aiter_chunks(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ReadMessageView(
+    InstrumentedViewMixin,
+    ReplicaReadMixin,
+    ConditionalMailboxMixin,
+    generics.RetrieveAPIView,
+):
     """
     View for reading a message.
 
@@ -87,29 +289,44 @@ class ReadMessageView(generics.RetrieveAPIView):
     The receiver of the message can read and mark it as read. The sender can only mark it as read.
     Inherits from RetrieveAPIView class and uses MessageSerializer for serialization.
     Requires authentication for accessing the view.
+    The messages already read are fetched from a replica, and the others fetched
+    and marked as read on the primary, in a single query on PostgreSQL, see
+    ``read_message``. Supports conditional requests once the ownership of the message
+    has been checked, unless the request marked the message as read.
     """
 
+    query_budget = 10
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        message = self.get_object()
+        message, marked = read_message(request.user, self.kwargs["pk"])
+        if message is None:
+            raise NotFound
 
-        if message.receiver != request.user and message.sender != request.user:
+        user_id = request.user.pk
+        if message.receiver_id != user_id and message.sender_id != user_id:
             return Response(
                 {"message": "You can only read messages sent to or by you."},
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        if message.receiver == request.user and not message.is_read:
-            message.is_read = True
-            message.save(update_fields=["is_read"])
+        if marked:
+            # The copy of the client is stale. A replica may not have the change yet.
+            with read_from_primary():
+                self.set_mailbox_validators(request, get_mailbox_state(request.user))
+        else:
+            not_modified = self.check_not_modified(request)
+            if not_modified is not None:
+                return not_modified
 
-        return self.retrieve(request, *args, **kwargs)
+        with timer("serialize"):
+            data = self.get_serializer(message).data
+        return Response(data)
 
 
-class DeleteMessageView(generics.DestroyAPIView):
+class DeleteMessageView(InstrumentedViewMixin, generics.DestroyAPIView):
     """
     View for deleting a message.
 
@@ -127,14 +344,28 @@ class DeleteMessageView(generics.DestroyAPIView):
         delete: Deletes the message if the user is the receiver or sender.
     """
 
+    query_budget = 10
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            record_mailbox_changes(
+                {instance.sender_id, instance.receiver_id},
+                {} if instance.is_read else {instance.receiver_id: -1},
+            )
+            if not instance.is_read:
+                record_thread_changes({(instance.thread_id, instance.receiver_id): -1})
+
     def delete(self, request, *args, **kwargs):
         message = self.get_object()
-        if message.receiver == request.user or message.sender == request.user:
-            return self.destroy(request, *args, **kwargs)
+        user_id = request.user.pk
+        if message.receiver_id == user_id or message.sender_id == user_id:
+            # Like destroy(), without fetching the message a second time.
+            self.perform_destroy(message)
+            return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             return Response(
                 {
@@ -142,3 +373,189 @@ class DeleteMessageView(generics.DestroyAPIView):
                 },
                 status=status.HTTP_403_FORBIDDEN,
             )
+
+
+class BulkReadMessagesView(InstrumentedViewMixin, APIView):
+    """
+    View for marking many received messages as read.
+
+    Requires authentication.
+
+    The messages are selected with ``ids`` and/or ``before`` and are marked as read
+    with a single UPDATE restricted to the messages received by the user. Messages
+    that do not belong to the user are ignored. The ``direction`` and ``unread_only``
+    filters of the bulk delete are rejected.
+
+    Methods:
+    - post: Marks the selected messages as read and returns the number updated.
+    """
+
+    query_budget = 10
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkSelectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        updated = mark_messages_read(
+            request.user,
+            ids=serializer.validated_data.get("ids"),
+            before=serializer.validated_data.get("before"),
+        )
+        return Response({"updated": updated})
+
+
+class BulkDeleteMessagesView(InstrumentedViewMixin, APIView):
+    """
+    View for deleting many messages.
+
+    Requires authentication.
+
+    The messages are selected with ``ids`` and/or ``before``, optionally narrowed with
+    ``direction`` (``sent``, ``received`` or ``all``) and ``unread_only``, and are
+    deleted with a single DELETE restricted to the messages sent or received by the
+    user. Messages that do not belong to the user are ignored.
+
+    Methods:
+    - post: Deletes the selected messages and returns the number deleted.
+    """
+
+    query_budget = 10
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkDeleteSelectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        deleted = delete_messages(request.user, **serializer.validated_data)
+        return Response({"deleted": deleted})
+
+
+class ThreadListView(InstrumentedViewMixin, ReplicaReadMixin, generics.ListAPIView):
+    """
+    API view listing the conversation threads of the authenticated user, most
+    recently active first.
+
+    The threads are read with a single index scan over the memberships of the user,
+    which carry the date of the last message and the unread count of each thread.
+    The cursor of the next page is returned in ``next_cursor`` and passed back in the
+    ``cursor`` query parameter.
+    """
+
+    query_budget = 3
+    serializer_class = ThreadSerializer
+    pagination_class = ThreadKeysetPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ThreadMembership.objects.filter(
+            user=self.request.user, last_message_at__isnull=False
+        ).select_related("thread")
+
+    def get(self, request, *args, **kwargs):
+        threads, next_cursor = self.paginator.paginate_queryset(
+            self.get_queryset(), request, view=self
+        )
+        with timer("serialize"):
+            data = {
+                "threads": self.get_serializer(threads, many=True).data,
+                "next_cursor": next_cursor,
+            }
+        return Response(data)
+
+
+class ThreadMessagesView(
+    InstrumentedViewMixin, ReplicaReadMixin, generics.GenericAPIView
+):
+    """
+    API view paging through the messages of a thread, newest first.
+
+    Only the participants of the thread can read it. Like the mailbox list views, the
+    pages use keyset pagination (``cursor`` query parameter) and the ``fields`` query
+    parameter selects the fields of the messages.
+    """
+
+    query_budget = 4
+    pagination_class = MessageKeysetPagination
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        membership = get_object_or_404(
+            ThreadMembership.objects.select_related("thread"),
+            thread_id=pk,
+            user=request.user,
+        )
+        fields = MessageSerializer.parse_fields(request.query_params.get("fields"))
+        columns = MessageRowSerializer.get_columns(fields)
+        messages, next_cursor = self.paginator.paginate_queryset(
+            Message.objects.filter(thread_id=pk).values_list(*columns, named=True),
+            request,
+            view=self,
+        )
+        with timer("serialize"):
+            data = {
+                "thread": ThreadSerializer(membership).data,
+                "messages": MessageRowSerializer(columns, fields).serialize(messages),
+                "next_cursor": next_cursor,
+            }
+        return Response(data)
+
+
+class SearchMessagesView(
+    InstrumentedViewMixin, ReplicaReadMixin, generics.GenericAPIView
+):
+    """
+    API view searching the subject and the content of the messages sent or received
+    by the authenticated user, newest first.
+
+    The query is passed in the ``q`` query parameter and ``direction`` restricts the
+    search to the ``sent`` or ``received`` messages. Like the mailbox list views, the
+    results use keyset pagination (``cursor`` query parameter) and the ``fields``
+    query parameter selects the fields of the messages.
+    """
+
+    # Without PostgreSQL, the compressed bodies are read with one more query.
+    query_budget = 4
+    pagination_class = MessageKeysetPagination
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = MessageSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        fields = MessageSerializer.parse_fields(request.query_params.get("fields"))
+        columns = MessageRowSerializer.get_columns(fields)
+
+        queryset = search_messages(
+            select_messages(request.user, direction=params.validated_data["direction"]),
+            params.validated_data["q"],
+        )
+        messages, next_cursor = self.paginator.paginate_queryset(
+            queryset.values_list(*columns, named=True), request, view=self
+        )
+        with timer("serialize"):
+            data = {
+                "messages": MessageRowSerializer(columns, fields).serialize(messages),
+                "next_cursor": next_cursor,
+            }
+        return Response(data)
+
+
+class MetricsView(InstrumentedViewMixin, APIView):
+    """
+    API view exposing the request metrics of the process in the Prometheus text
+    format, for admin users.
+
+    The metrics are only collected when the ``INSTRUMENTATION`` setting is enabled;
+    otherwise the view answers 404. Each process keeps its own metrics, so every
+    process serving the API has to be scraped.
+    """
+
+    query_budget = 2
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        if not get_setting("INSTRUMENTATION"):
+            raise NotFound()
+        return HttpResponse(
+            render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )